@@ -1,5 +1,8 @@
 from rdp.grammar import Grammar, GrammarBuilder, ignore
 from rdp.symbols import Terminal, repeat, Regexp, Optional, Lookahead
-from rdp.symbols import epsilon, flatten, drop, keep
+from rdp.symbols import epsilon, cut, flatten, drop, keep
+from rdp.symbols import Operators, prefix, infix, postfix
+from rdp.symbols import recover
 from rdp.parser import Parser
 from rdp.exceptions import ParseError, LeftRecursion, InvalidGrammar, TokenizeError
+from rdp.source import Source
@@ -0,0 +1,196 @@
+"""
+Static analysis of a `Grammar`.
+
+`analyze()` computes the FOLLOW set of every symbol (nullable and FIRST sets
+are already computed by `Grammar`) and checks each rule for choices that
+cannot be made by looking at the next token alone:
+
+- `conflict`: alternatives of a `OneOf` that may start with the same token,
+  or an `Optional`, `Repeat` or `Operators` whose next iteration may start
+  with a token that could also follow it. The parser has to try one way and
+  backtrack, or (for `Optional` and `Repeat`) silently never takes the other.
+- `lookahead`: a `Lookahead`, which always reads ahead and backtracks.
+
+Rules without these findings are LL(1): each choice is decided by the next
+token. The analysis also flags hazards:
+
+- `nullable-repeat`: a `Repeat` whose symbol can match the empty string, so
+  it stops making progress.
+- `unreachable-alternative`: an alternative of a `OneOf` that can never match
+  because an earlier one always matches first.
+- `unreachable-rule`: a rule that cannot be reached from the start symbol.
+"""
+from collections import namedtuple
+
+from rdp.symbols import (Terminal, OneOf, Repeat, Optional, Lookahead, Operators, SymbolProxy, union_first)
+
+
+class EndOfInput(object):
+    def __repr__(self):
+        return '$'
+
+
+end_of_input = EndOfInput()
+
+
+Finding = namedtuple('Finding', ['kind', 'rule', 'symbol', 'message'])
+
+backtracking_kinds = {'conflict', 'lookahead'}
+
+
+def terminal_name(terminal):
+    if terminal is end_of_input:
+        return '$'
+    return terminal.name or repr(terminal.lexeme)
+
+
+def describe_terminals(terminals):
+    if terminals is None:
+        return 'any token'
+    return ' '.join(sorted(terminal_name(terminal) for terminal in terminals)) or 'nothing'
+
+
+def overlap(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a & b
+
+
+class RuleAnalysis(object):
+    def __init__(self, rule, symbols):
+        self.rule = rule
+        # the symbols that are formatted as part of the rule's definition
+        self.symbols = symbols
+        self.findings = []
+
+    @property
+    def deterministic(self):
+        return not any(finding.kind in backtracking_kinds for finding in self.findings)
+
+
+class GrammarAnalysis(object):
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.reachable = list(grammar.start.iter())
+        self.follow = compute_follow_sets(grammar, self.reachable)
+        reachable_ids = {id(symbol) for symbol in self.reachable}
+        self.rules = {}
+        self.findings = []
+        for rule in grammar.rules():
+            analysis = self.rules[rule] = RuleAnalysis(rule, rule_symbols(rule))
+            # terminals may still be used by token transforms such as `ignore()`
+            if id(rule) not in reachable_ids and not isinstance(rule, Terminal):
+                self.report(analysis, 'unreachable-rule', rule, 'not reachable from the start symbol')
+            for symbol in analysis.symbols:
+                self.check(analysis, symbol)
+
+    def follow_set(self, symbol):
+        return self.follow.get(id(symbol), frozenset())
+
+    def report(self, analysis, kind, symbol, message):
+        finding = Finding(kind, analysis.rule, symbol, message)
+        analysis.findings.append(finding)
+        self.findings.append(finding)
+
+    def check(self, analysis, symbol):
+        if isinstance(symbol, OneOf):
+            self.check_oneof(analysis, symbol)
+        elif isinstance(symbol, Repeat):
+            if symbol.symbol.nullable:
+                self.report(analysis, 'nullable-repeat', symbol, 'the repeated symbol can match the empty string')
+            self.check_continuation(analysis, symbol, 'repetition')
+        elif isinstance(symbol, Optional):
+            self.check_continuation(analysis, symbol, 'optional part')
+        elif isinstance(symbol, Lookahead):
+            self.report(analysis, 'lookahead', symbol, 'reads ahead and backtracks')
+        elif isinstance(symbol, Operators):
+            prefixes = frozenset(symbol.tables['prefix'])
+            common = overlap(symbol.operand.first, prefixes)
+            if common is None or common:
+                self.report(analysis, 'conflict', symbol, 'operands and prefix operators may start with {0}'.format(
+                    describe_terminals(common)
+                ))
+
+    def check_continuation(self, analysis, symbol, description):
+        common = overlap(symbol.symbol.first, self.follow_set(symbol))
+        if common is None or common:
+            self.report(analysis, 'conflict', symbol, 'the {0} and what follows may start with {1}'.format(
+                description, describe_terminals(common)
+            ))
+
+    def check_oneof(self, analysis, oneof):
+        alternatives = oneof.symbols
+        for i, alternative in enumerate(alternatives):
+            for j, earlier in enumerate(alternatives[:i]):
+                if earlier.nullable:
+                    reason = 'alternative {0} matches the empty string'.format(j + 1)
+                elif (isinstance(earlier, Terminal) and alternative.first is not None
+                        and alternative.first <= earlier.first):
+                    reason = 'alternative {0} matches every token it could start with'.format(j + 1)
+                else:
+                    continue
+                self.report(analysis, 'unreachable-alternative', oneof, 'alternative {0} is never tried: {1}'.format(
+                    i + 1, reason
+                ))
+                break
+        for i, a in enumerate(alternatives):
+            for j, b in enumerate(alternatives[i + 1:], i + 1):
+                common = overlap(a.first, b.first)
+                if common is None or common:
+                    self.report(analysis, 'conflict', oneof, 'alternatives {0} and {1} may start with {2}'.format(
+                        i + 1, j + 1, describe_terminals(common)
+                    ))
+        follow = self.follow_set(oneof)
+        for i, a in enumerate(alternatives):
+            if not a.nullable:
+                continue
+            for j, b in enumerate(alternatives):
+                common = overlap(b.first, follow)
+                if j != i and (common is None or common):
+                    self.report(analysis, 'conflict', oneof, (
+                        'alternative {0} matches the empty string, and alternative {1} and what follows '
+                        'may start with {2}').format(i + 1, j + 1, describe_terminals(common)))
+
+
+def rule_symbols(rule):
+    """
+    Returns `rule` and the unnamed symbols below it, up to references to
+    other rules.
+    """
+    symbols = [rule]
+    stack = list(rule)
+    visited = {id(rule)}
+    while stack:
+        symbol = stack.pop()
+        if id(symbol) in visited or symbol.name or isinstance(symbol, SymbolProxy):
+            continue
+        visited.add(id(symbol))
+        symbols.append(symbol)
+        stack.extend(symbol)
+    return symbols
+
+
+def compute_follow_sets(grammar, symbols):
+    """
+    Maps the id of each symbol in `symbols` to the set of terminals that may
+    follow it, including `end_of_input`, or `None` if any terminal may.
+    """
+    follow = {id(symbol): frozenset() for symbol in symbols}
+    follow[id(grammar.start)] = frozenset([end_of_input])
+    changed = True
+    while changed:
+        changed = False
+        for symbol in symbols:
+            for child, child_follow in symbol.compute_follow(follow[id(symbol)]):
+                old = follow.get(id(child), frozenset())
+                new = union_first(old, child_follow)
+                if new != old:
+                    follow[id(child)] = new
+                    changed = True
+    return follow
+
+
+def analyze(grammar):
+    return GrammarAnalysis(grammar)
@@ -1,6 +1,79 @@
+from array import array
 
+from rdp.tokenizer import Token
+from rdp.source import Positioned
 
-class Node(object):
+
+def reduce_tree(root, children, reduce):
+    """
+    Computes `reduce(node, values)` for `root` and, first, for every node
+    returned by `children()` below it, where `values` are the results for
+    `children(node)`. Uses an explicit stack, so deep trees do not hit the
+    recursion limit.
+    """
+    values = []
+    stack = [(root, None)]
+    while stack:
+        node, node_children = stack.pop()
+        if node_children is None:
+            node_children = children(node)
+            stack.append((node, node_children))
+            stack.extend((child, None) for child in reversed(node_children))
+        else:
+            start = len(values) - len(node_children)
+            value = reduce(node, values[start:])
+            del values[start:]
+            values.append(value)
+    return values[0]
+
+
+def transform(root, memo=None):
+    """
+    Applies the symbol transforms to the tree below `root`, children first.
+    If `memo` is a dict, results are stored in it by node and reused for
+    nodes that were transformed before, e.g. subtrees shared between trees.
+    """
+    if memo is None:
+        return reduce_tree(
+            root,
+            lambda node: node.symbol.transform_children(node),
+            lambda node, values: node.symbol.apply_transform(node, values),
+        )
+
+    def children(node):
+        if node in memo:
+            return ()
+        return node.symbol.transform_children(node)
+
+    def reduce(node, values):
+        try:
+            return memo[node]
+        except KeyError:
+            value = memo[node] = node.symbol.apply_transform(node, values)
+            return value
+
+    return reduce_tree(root, children, reduce)
+
+
+def transformed(root):
+    """
+    Like `transform()`, but a `ValueNode` below `root` stands for the value
+    of its former subtree.
+    """
+    def children(node):
+        if node.__class__ is ValueNode:
+            return ()
+        return node.symbol.transform_children(node)
+
+    def reduce(node, values):
+        if node.__class__ is ValueNode:
+            return node.value
+        return node.symbol.apply_transform(node, values)
+
+    return reduce_tree(root, children, reduce)
+
+
+class Node(Positioned):
     def __init__(self, symbol, offset, token=None):
         self.symbol = symbol
         self.offset = offset
@@ -31,8 +104,21 @@ class Node(object):
     def __bool__(self):
         return bool(self.token or self.children)
 
-    def transform(self):
-        return self.symbol.apply_transform(self)
+    def transform(self, memo=None):
+        return transform(self, memo)
+
+    @property
+    def position(self):
+        """
+        The `(line, column)` of the first token below this node, see
+        `Token.position`. None for nodes without tokens.
+        """
+        node = self
+        while node.token is None:
+            if not node.children:
+                return None
+            node = node.children[0]
+        return node.token.position
 
     def __len__(self):
         return len(self.children)
@@ -53,15 +139,217 @@ class Node(object):
         return str(self.symbol)
 
     def tuple_tree(self):
-        if self.token:
-            return (self.symbol.name, self.token.lexeme)
-        return (self.symbol.name, [node.tuple_tree() for node in self])
+        def children(node):
+            return () if node.token else node.children
+
+        def reduce(node, values):
+            if node.token:
+                return (node.symbol.name, node.token.lexeme)
+            return (node.symbol.name, values)
+
+        return reduce_tree(self, children, reduce)
 
     def print_tree(self):
         # FIXME: try to use box drawing characters: ┕, ━, ┣, ┃
-        def lines(node, indent):
-            for i, child in enumerate(node):
-                yield '{0}|--- {1}'.format(indent, child)
-                next_indent = '   ' if i == len(node) - 1 else '|  '
-                yield from lines(child, indent + next_indent)
-        print(str(self) + "\n" + "\n".join(lines(self, '')))
+        lines = [str(self)]
+        stack = [(self, None, '')]
+        while stack:
+            node, indent, child_indent = stack.pop()
+            if indent is not None:
+                lines.append('{0}|--- {1}'.format(indent, node))
+            children = node.children
+            for i in reversed(range(len(children))):
+                next_indent = '   ' if i == len(children) - 1 else '|  '
+                stack.append((children[i], child_indent, child_indent + next_indent))
+        print("\n".join(lines))
+
+
+class ValueNode(Node):
+    """
+    Takes the place of a node whose transform has been applied while
+    parsing, see `Parser(transform=True)`. `value` is the transformed value;
+    the children and the token are no longer needed.
+    """
+    token = None
+    children = ()
+    parent = None
+
+    def __init__(self, symbol, offset, value, nonempty):
+        self.symbol = symbol
+        self.offset = offset
+        self.value = value
+        self.nonempty = nonempty
+        # the symbol `value` was computed for, a proxy may rename the node
+        self.transformed_by = symbol
+
+    def __bool__(self):
+        return self.nonempty
+
+    def transform(self, memo=None):
+        return self.value
+
+    def __repr__(self):
+        name = '{0}='.format(self.symbol.name) if self.symbol.name else ''
+        return '<ValueNode {0}{1!r}>'.format(name, self.value)
+
+
+class ErrorNode(Node):
+    """
+    Takes the place of a `Recover` symbol that failed to match in recovery
+    mode. `error` is the `ParseError`, `tokens` are the skipped tokens.
+    """
+    def __init__(self, symbol, offset, error):
+        super().__init__(symbol, offset)
+        self.error = error
+        self.tokens = []
+
+    def __bool__(self):
+        return True
+
+    @property
+    def position(self):
+        return self.error.position
+
+    def __repr__(self):
+        return '<ErrorNode {0}>'.format(self.error)
+
+    def __str__(self):
+        return 'error: {0}'.format(self.error)
+
+
+class ArenaTree(object):
+    """
+    A parse tree stored in flat columns with one row per node, in pre-order:
+    symbol id, parent, first child and next sibling (-1 if absent), token
+    offset, and the start and end of the token in `source` (-1 for nodes
+    without a token). `ArenaNode` views provide the `Node` API on top.
+    """
+    column_names = ('symbol', 'parent', 'first_child', 'next_sibling', 'offset', 'start', 'end')
+
+    def __init__(self, source):
+        self.source = source
+        self.symbols = []
+        self.symbol_ids = {}
+        for name in self.column_names:
+            setattr(self, name, array('i'))
+
+    @classmethod
+    def from_node(cls, root, source):
+        """
+        Copies the tree below `root`. Token lexemes must be slices of `source`
+        or empty.
+        """
+        tree = cls(source)
+        last_child = array('i')
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = tree.add(node, parent)
+            last_child.append(-1)
+            if parent >= 0:
+                if last_child[parent] < 0:
+                    tree.first_child[parent] = index
+                else:
+                    tree.next_sibling[last_child[parent]] = index
+                last_child[parent] = index
+            stack.extend((child, index) for child in reversed(node.children))
+        return tree
+
+    @classmethod
+    def from_columns(cls, source, symbols, columns):
+        tree = cls(source)
+        tree.symbols = list(symbols)
+        tree.symbol_ids = {id(symbol): i for i, symbol in enumerate(tree.symbols)}
+        for name in cls.column_names:
+            setattr(tree, name, columns[name])
+        return tree
+
+    def add(self, node, parent):
+        try:
+            symbol_id = self.symbol_ids[id(node.symbol)]
+        except KeyError:
+            symbol_id = self.symbol_ids[id(node.symbol)] = len(self.symbols)
+            self.symbols.append(node.symbol)
+        token = node.token
+        index = len(self.symbol)
+        self.symbol.append(symbol_id)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.offset.append(node.offset)
+        self.start.append(-1 if token is None else token.start)
+        self.end.append(-1 if token is None else token.end)
+        return index
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def columns(self):
+        return {name: getattr(self, name) for name in self.column_names}
+
+    @property
+    def root(self):
+        return ArenaNode(self, 0)
+
+
+class ArenaNode(Node):
+    """
+    A read-only view of row `index` of an `ArenaTree`.
+    """
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def symbol(self):
+        return self.tree.symbols[self.tree.symbol[self.index]]
+
+    @property
+    def offset(self):
+        return self.tree.offset[self.index]
+
+    @property
+    def token(self):
+        tree, index = self.tree, self.index
+        start = tree.start[index]
+        if start < 0:
+            return None
+        return Token(self.symbol, tree.source[start:tree.end[index]], start)
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return None if parent < 0 else ArenaNode(self.tree, parent)
+
+    @property
+    def children(self):
+        return list(self)
+
+    def append(self, node):
+        raise TypeError('arena trees are read-only')
+
+    def remove(self, node):
+        raise TypeError('arena trees are read-only')
+
+    def __bool__(self):
+        tree, index = self.tree, self.index
+        return tree.end[index] > tree.start[index] or tree.first_child[index] >= 0
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __iter__(self):
+        tree = self.tree
+        child = tree.first_child[self.index]
+        while child >= 0:
+            yield ArenaNode(tree, child)
+            child = tree.next_sibling[child]
+
+    def __getitem__(self, index):
+        return self.children[index]
+
+    def __eq__(self, other):
+        return isinstance(other, ArenaNode) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
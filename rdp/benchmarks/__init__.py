@@ -0,0 +1,12 @@
+"""
+Throughput benchmarks for rdp.
+
+Each benchmark combines a grammar from `rdp.benchmarks.grammars` with a
+generated corpus from `rdp.benchmarks.corpora`, and times tokenizing,
+parsing and transforming separately. Results can be saved as a baseline and
+later runs compared against it::
+
+    python -m rdp.benchmarks --save baseline.json
+    python -m rdp.benchmarks --baseline baseline.json
+"""
+from rdp.benchmarks.runner import Benchmark, benchmarks, run, compare, format_results, load_results, save_results
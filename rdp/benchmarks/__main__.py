@@ -0,0 +1,6 @@
+import sys
+
+from rdp.benchmarks.runner import main
+
+
+sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Deterministic generators for benchmark inputs. Each returns a source of at
+least `size` characters built from many small, independent items.
+"""
+import json
+import random
+
+
+def generate(item, size, seed):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        part = item(rng)
+        parts.append(part)
+        length += len(part)
+    return parts
+
+
+def random_json_value(rng, depth=0):
+    kind = rng.randrange(8 if depth < 4 else 5)
+    if kind == 0:
+        return rng.randrange(100000)
+    if kind == 1:
+        return rng.randrange(100000) / 4
+    if kind == 2:
+        return ''.join(rng.choice('abcdefghij klmnop') for _ in range(rng.randrange(1, 16)))
+    if kind == 3:
+        return rng.choice([True, False, None])
+    if kind == 4:
+        return rng.randrange(10)
+    if kind in (5, 6):
+        return {
+            'key{0}'.format(i): random_json_value(rng, depth + 1) for i in range(rng.randrange(5))
+        }
+    return [random_json_value(rng, depth + 1) for _ in range(rng.randrange(6))]
+
+
+def json_corpus(size, seed=0):
+    """
+    A JSON array of nested objects and arrays.
+    """
+    items = generate(lambda rng: json.dumps(random_json_value(rng), indent=1), size, seed)
+    return '[\n' + ',\n'.join(items) + '\n]\n'
+
+
+names = ['alpha', 'beta', 'gamma', 'delta', 'value', 'result', 'count', 'item', 'ifx', 'define']
+
+
+def random_call(rng, depth=0):
+    args = []
+    for _ in range(rng.randrange(4)):
+        kind = rng.randrange(4 if depth < 2 else 3)
+        if kind == 0:
+            args.append(rng.choice(names))
+        elif kind == 1:
+            args.append(str(rng.randrange(1000)))
+        elif kind == 2:
+            args.append("'{0}'".format(rng.choice(names)))
+        else:
+            args.append(random_call(rng, depth + 1))
+    return '{0}({1})'.format(rng.choice(names), ', '.join(args))
+
+
+def random_block(rng, indention=0, depth=0):
+    lines = []
+    for _ in range(rng.randrange(1, 6)):
+        kind = rng.randrange(4 if depth < 4 else 2)
+        prefix = '    ' * indention
+        if kind == 0:
+            lines.append('{0}{1} = {2}'.format(prefix, rng.choice(names), rng.randrange(1000)))
+        elif kind == 1:
+            lines.append(prefix + random_call(rng))
+        else:
+            header = rng.choice(['def {0}():', 'if {0}:', 'while {0}:']).format(rng.choice(names))
+            lines.append(prefix + header)
+            lines.extend(random_block(rng, indention + 1, depth + 1))
+    return lines
+
+
+def indent_corpus(size, seed=0):
+    """
+    Python-like statements in nested indented blocks.
+    """
+    return '\n'.join(generate(lambda rng: '\n'.join(random_block(rng)), size, seed)) + '\n'
+
+
+def random_expression(rng, level=0, depth=0):
+    # mirrors the precedence levels of `build_arithmetic_grammar()`, and
+    # never chains comparisons, which Python would evaluate differently
+    if level == 2:
+        operand = random_expression(rng, level + 1, depth)
+        return 'not ' + operand if rng.randrange(5) == 0 else operand
+    if level == 9:
+        sign = rng.choice(['', '', '', '-', '~'])
+        return sign + random_expression(rng, level + 1, depth)
+    if level == 10:
+        base = random_expression(rng, level + 1, depth)
+        return base + ' ** ' + str(rng.randrange(3)) if rng.randrange(6) == 0 else base
+    if level == 11:
+        if depth < 3 and rng.randrange(4) == 0:
+            return '(' + random_expression(rng, 0, depth + 1) + ')'
+        return str(rng.randrange(1, 100))
+    operators = [
+        ['or'], ['and'], None, ['==', '!=', '<', '>'], ['|'], ['^'], ['&'], ['+', '-'], ['*'],
+    ][level]
+    count = 1 if rng.randrange(6) == 0 else 0
+    expression = random_expression(rng, level + 1, depth)
+    for _ in range(count):
+        expression += ' {0} {1}'.format(rng.choice(operators), random_expression(rng, level + 1, depth))
+    return expression
+
+
+def arithmetic_corpus(size, seed=0):
+    """
+    Expression statements terminated by `;`, one per line.
+    """
+    return ''.join(generate(lambda rng: random_expression(rng) + ';\n', size, seed))
@@ -0,0 +1,130 @@
+import operator
+import functools
+from copy import copy
+
+from rdp import GrammarBuilder, Optional, flatten, drop, keep, repeat, ignore
+from rdp.symbols import OneOf, Repeat, group
+from rdp.indention import indent, INDENT, DEDENT
+from rdp.utils import const
+from rdp import builtins
+
+
+def unquote(lexeme):
+    return lexeme[1:-1]
+
+
+# shared symbols from `rdp.builtins` are copied before they are named, as
+# naming a symbol twice creates an alias
+
+
+def build_json_grammar():
+    g = GrammarBuilder()
+    g.number = (builtins.float_literal >= float) | (builtins.digits >= int)
+    g.string = builtins.double_quoted_string >= unquote
+    g.array = '[' + flatten(repeat(g.value, separator=',')) + ']' >= list
+    g.member = g.string + ':' + g.value >= tuple
+    g.object_ = '{' + flatten(repeat(g.member, separator=',')) + '}' >= dict
+    g.true = keep('true') >= const(True)
+    g.false = keep('false') >= const(False)
+    g.null = keep('null') >= const(None)
+    g.value = flatten(g.number | g.string | g.array | g.object_ | g.true | g.false | g.null)
+    g.whitespace = copy(builtins.whitespace)
+    return g(start=g.value, tokenize=[ignore(g.whitespace)], drop_terminals=True)
+
+
+def first_tuple(values):
+    return tuple(values[0])
+
+
+def build_indent_grammar():
+    g = GrammarBuilder()
+    g.name = copy(builtins.identifier)
+    g.number = builtins.digits >= int
+    g.string = builtins.single_quoted_string >= unquote
+    g.value = flatten(g.call | g.name | g.number | g.string)
+    g.call = g.name + '(' + flatten(repeat(g.value, separator=',')) + ')' >= tuple
+    g.assignment = g.name + '=' + g.value >= tuple
+    g.header = group(
+        (keep('def') + g.name + '(' + ')' | keep('if') + g.value | keep('while') + g.value) + ':' >= first_tuple
+    )
+    g.block = g.header + drop(INDENT) + Repeat(g.statement) + drop(DEDENT) >= tuple
+    g.statement = flatten(g.block | g.assignment | g.call)
+    g.module = Repeat(g.statement)
+    g.whitespace = copy(builtins.whitespace)
+    return g(
+        start=g.module,
+        tokenize=[indent('(', ')'), ignore(g.whitespace)],
+        drop_terminals=True,
+        literal_dispatch=True,
+    )
+
+
+def logical_or(a, b):
+    return a or b
+
+
+def logical_and(a, b):
+    return a and b
+
+
+# binary operators from the loosest to the tightest binding level, with the
+# same precedence as in Python
+binary_levels = [
+    {'or': logical_or},
+    {'and': logical_and},
+    None,
+    {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '>': operator.gt},
+    {'|': operator.or_},
+    {'^': operator.xor},
+    {'&': operator.and_},
+    {'+': operator.add, '-': operator.sub},
+    {'*': operator.mul},
+]
+
+
+def fold(operators, values):
+    value, tail = values
+    for op, operand in tail:
+        value = operators[op](value, operand)
+    return value
+
+
+def negate(values):
+    return not values[1]
+
+
+def apply_unary(values):
+    return -values[1] if values[0] == '-' else ~values[1]
+
+
+def power(values):
+    if len(values) == 1:
+        return values[0]
+    return values[0] ** values[1]
+
+
+def build_arithmetic_grammar():
+    """
+    One nested rule per precedence level, so every operand passes through
+    all of them.
+    """
+    g = GrammarBuilder()
+    g.number = builtins.digits >= int
+    g.atom = g.number | flatten('(' + g.expr + ')')
+    g.power = g.atom + Optional(flatten('**' + g.atom)) >= power
+    g.unary = ((keep('-') | keep('~')) + g.unary >= apply_unary) | g.power
+    operand = g.unary
+    for index, operators in reversed(list(enumerate(binary_levels))):
+        name = 'level{0}'.format(index)
+        if operators is None:
+            setattr(g, name, (keep('not') + operand >= negate) | operand)
+        else:
+            operator_symbol = OneOf([keep(op) for op in operators])
+            level = operand + Repeat(operator_symbol + operand) >= functools.partial(fold, operators)
+            setattr(g, name, group(level))
+        operand = getattr(g, name)
+    g.expr = operand
+    g.statement = g.expr + ';' >= operator.itemgetter(0)
+    g.program = Repeat(g.statement)
+    g.whitespace = copy(builtins.whitespace)
+    return g(start=g.program, tokenize=[ignore(g.whitespace)], drop_terminals=True, literal_dispatch=True)
@@ -0,0 +1,202 @@
+import gc
+import json
+import argparse
+import platform
+import tracemalloc
+from time import perf_counter
+
+from rdp.parser import Parser
+from rdp.benchmarks import grammars, corpora
+
+
+class Benchmark(object):
+    def __init__(self, name, build_grammar, corpus):
+        self.name = name
+        self.build_grammar = build_grammar
+        self.corpus = corpus
+        self._grammar = None
+
+    @property
+    def grammar(self):
+        if self._grammar is None:
+            self._grammar = self.build_grammar()
+        return self._grammar
+
+
+benchmarks = [
+    Benchmark('json', grammars.build_json_grammar, corpora.json_corpus),
+    Benchmark('indent', grammars.build_indent_grammar, corpora.indent_corpus),
+    Benchmark('arithmetic', grammars.build_arithmetic_grammar, corpora.arithmetic_corpus),
+]
+
+phases = ['tokenize', 'parse', 'transform']
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        result = func()
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def peak_memory(func):
+    """
+    Returns the peak size of the memory allocated while `func` runs, in bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(benchmark, size, repeat=3):
+    """
+    Times `Grammar.tokenize()`, `Parser.run()` on the tokens and
+    `Node.transform()` on the tree separately, each the best of `repeat` runs.
+    Peak memory is measured in an extra run, as tracing slows everything down.
+    """
+    grammar = benchmark.grammar
+    source = benchmark.corpus(size)
+
+    def tokenize():
+        return list(grammar.tokenize(source))
+
+    def parse():
+        return Parser(grammar, source, tokens=tokens).run()
+
+    def transform():
+        return tree.transform()
+
+    results = []
+    tokens = tree = None
+    for phase, func in zip(phases, [tokenize, parse, transform]):
+        seconds, value = best_time(func, repeat)
+        if phase == 'tokenize':
+            tokens = value
+        elif phase == 'parse':
+            tree = value
+        results.append({
+            'benchmark': benchmark.name,
+            'size': len(source),
+            'phase': phase,
+            'tokens': len(tokens),
+            'seconds': seconds,
+            'tokens_per_second': len(tokens) / seconds if seconds else None,
+            'peak_memory': peak_memory(func),
+        })
+    return results
+
+
+def run(names=None, sizes=(10000, 50000), repeat=3):
+    results = []
+    for benchmark in benchmarks:
+        if names and benchmark.name not in names:
+            continue
+        for size in sizes:
+            results.extend(run_benchmark(benchmark, size, repeat=repeat))
+    return results
+
+
+def result_key(result):
+    return result['benchmark'], result['size'], result['phase']
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compares the time and peak memory of `results` to the `baseline` results
+    for the same benchmark, corpus size and phase. Returns a list of
+    `(result, metric, baseline_value, ratio)` for every metric that grew by
+    more than `threshold`, e.g. 10% for 0.1.
+    """
+    baseline = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_memory'):
+            if not old[metric]:
+                continue
+            ratio = result[metric] / old[metric]
+            if ratio > 1 + threshold:
+                regressions.append((result, metric, old[metric], ratio))
+    return regressions
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(), 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def format_results(results, baseline=None):
+    baseline = {result_key(result): result for result in baseline or ()}
+    header = ['benchmark', 'size', 'phase', 'tokens', 'seconds', 'tokens/s', 'peak KiB']
+    if baseline:
+        header += ['time vs baseline', 'memory vs baseline']
+    rows = [header]
+    for result in results:
+        row = [
+            result['benchmark'],
+            str(result['size']),
+            result['phase'],
+            str(result['tokens']),
+            '{0:.4f}'.format(result['seconds']),
+            '{0:.0f}'.format(result['tokens_per_second'] or 0),
+            '{0:.0f}'.format(result['peak_memory'] / 1024),
+        ]
+        if baseline:
+            old = baseline.get(result_key(result))
+            for metric in ('seconds', 'peak_memory'):
+                row.append('{0:+.1%}'.format(result[metric] / old[metric] - 1) if old and old[metric] else '-')
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(cell.ljust(width) if i < 3 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths)))
+        for row in rows
+    )
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        prog='python -m rdp.benchmarks',
+        description='measure tokenizer, parser and transform throughput',
+    )
+    argparser.add_argument('benchmarks', nargs='*', help='benchmarks to run: {0} (default: all)'.format(
+        ', '.join(benchmark.name for benchmark in benchmarks)
+    ))
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000],
+                           help='corpus sizes in characters')
+    argparser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the best one counts')
+    argparser.add_argument('--save', metavar='PATH', help='save the results as a baseline')
+    argparser.add_argument('--baseline', metavar='PATH', help='compare the results to a saved baseline')
+    argparser.add_argument('--threshold', type=float, default=0.1,
+                           help='relative growth of time or memory that counts as a regression')
+    args = argparser.parse_args(argv)
+
+    results = run(args.benchmarks, sizes=args.sizes, repeat=args.repeat)
+    baseline = load_results(args.baseline) if args.baseline else None
+    print(format_results(results, baseline))
+    if args.save:
+        save_results(results, args.save)
+    if baseline:
+        regressions = compare(results, baseline, threshold=args.threshold)
+        for result, metric, old, ratio in regressions:
+            print('regression: {0} {1} {2} {3}: {4:.4g} -> {5:.4g} ({6:+.1%})'.format(
+                result['benchmark'], result['size'], result['phase'], metric, old, result[metric], ratio - 1,
+            ))
+        if regressions:
+            return 1
+    return 0
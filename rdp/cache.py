@@ -0,0 +1,77 @@
+"""
+Caches fully prepared grammars on disk for fast startup.
+
+`cached_grammar(build, path)` calls `build()` once and pickles the resulting
+`Grammar`, including its symbol graph, terminal table, FIRST sets, dispatch
+tables and tokenizer, to `path`. Later processes load it from there instead
+of building it again. The file is keyed by a fingerprint of the source of the
+module that defines `build` and of rdp itself, and is rebuilt when either
+changes.
+
+The fingerprint is taken from source files rather than from the structure of
+the built grammar, which would mean building it on every start. Other modules
+or files that `build` takes symbols or transforms from are not found on their
+own: pass them as `depends`, a list of module objects and file paths.
+
+Transforms and token transforms of a cached grammar must be picklable: module
+level functions or the helpers from `rdp.utils`, not lambdas or closures.
+"""
+import os
+import sys
+import glob
+import pickle
+import hashlib
+import inspect
+import tempfile
+
+
+def source_fingerprint(build, depends=()):
+    rdp_dir = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha1()
+    h.update('{0}:{1}:{2}'.format(sys.version_info[:2], build.__module__, build.__qualname__).encode('utf-8'))
+    filenames = [inspect.getsourcefile(build)]
+    for dep in depends:
+        filenames.append(os.fspath(dep) if isinstance(dep, (str, os.PathLike)) else inspect.getsourcefile(dep))
+    for filename in filenames + sorted(glob.glob(os.path.join(rdp_dir, '*.py'))):
+        with open(filename, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def save_grammar(grammar, path, fingerprint):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(fingerprint, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(grammar, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_grammar(path, fingerprint):
+    """
+    Returns the grammar saved at `path`, or None if there is none or it was
+    saved with a different `fingerprint`.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != fingerprint:
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # written by an incompatible version, treat it as stale
+        return None
+
+
+def cached_grammar(build, path, fingerprint=None, depends=()):
+    if fingerprint is None:
+        fingerprint = source_fingerprint(build, depends)
+    grammar = load_grammar(path, fingerprint)
+    if grammar is None:
+        grammar = build()
+        save_grammar(grammar, path, fingerprint)
+    return grammar
@@ -0,0 +1,438 @@
+"""
+Compiles a `Grammar` into a standalone Python module with one plain function
+per symbol. Terminal checks are inlined as integer comparisons, drop and
+flatten handling is decided at compile time, and `OneOf` alternatives are
+guarded by their FIRST sets.
+
+The generated module imports the grammar it was compiled from to get hold of
+the symbol objects (and therefore their transforms and token transforms), so
+it builds the same `Node` trees as `Grammar.parse()`. A fingerprint of the
+symbol graph is checked on import to catch grammars that changed after
+compilation.
+
+Usage::
+
+    python -m rdp.compiler mypackage.grammars:json_grammar -o json_parser.py
+
+Unlike `Parser.run()`, the generated code uses the Python stack, so very
+deeply nested inputs are limited by `sys.getrecursionlimit()`. Grammars with
+left recursion, `Operators`, `recover()` or `cut` cannot be compiled and
+raise `InvalidGrammar`.
+"""
+import sys
+import argparse
+import hashlib
+
+from rdp.grammar import Grammar
+from rdp.symbols import (describe_expected, Terminal, Epsilon, SymbolProxy, Alias, Optional, Lookahead, NonEmpty,
+    Sequence, Operators, Recover, Cut)
+from rdp.exceptions import InvalidGrammar, ParseError, UnexpectedToken
+from rdp.utils import load_grammar
+
+
+def grammar_symbols(grammar):
+    return list(grammar.start.iter())
+
+
+def fingerprint(symbols):
+    index = {id(symbol): i for i, symbol in enumerate(symbols)}
+    h = hashlib.sha1()
+    for symbol in symbols:
+        lexeme = symbol.lexeme if isinstance(symbol, Terminal) else None
+        children = [index.get(id(child)) for child in symbol]
+        h.update(repr((type(symbol).__name__, symbol.name, lexeme, children)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_symbols(reference, expected_fingerprint):
+    grammar = load_grammar(reference)
+    symbols = grammar_symbols(grammar)
+    if fingerprint(symbols) != expected_fingerprint:
+        raise InvalidGrammar('{0} changed since it was compiled, recompile the parser'.format(reference))
+    return grammar, symbols
+
+
+def node_symbols(symbol, visiting=()):
+    """
+    Returns the possible values of `node.symbol` for nodes produced by
+    `symbol`. Wrappers pass the node of their child through, so this is what
+    `Node.append()` will look at.
+    """
+    if id(symbol) in visiting:
+        return [symbol]
+    visiting += (id(symbol),)
+    if isinstance(symbol, Alias):
+        return [symbol if s == symbol.symbol else s for s in node_symbols(symbol.symbol, visiting)]
+    if isinstance(symbol, Optional):
+        return node_symbols(symbol.symbol, visiting) + [None]
+    if isinstance(symbol, Lookahead):
+        return [None]
+    if isinstance(symbol, (SymbolProxy, NonEmpty)):
+        return node_symbols(symbol.symbol, visiting)
+    if isinstance(symbol, Grammar):
+        return node_symbols(symbol.start, visiting)
+    return [symbol]
+
+
+def left_symbols(symbol):
+    """
+    Returns the symbols `symbol` may try to match at its own offset.
+    """
+    if isinstance(symbol, Grammar):
+        return [symbol.start]
+    if isinstance(symbol, Terminal):
+        return []
+    if isinstance(symbol, Sequence):
+        symbols = []
+        for child in symbol.symbols:
+            symbols.append(child)
+            if not child.nullable:
+                break
+        return symbols
+    return list(symbol)
+
+
+def find_left_recursion(symbols):
+    """
+    Returns a cycle of symbols below `symbols` that may try to match each
+    other at the same offset, or an empty list.
+    """
+    # 1: on the current path, 2: no left recursion below
+    state = {}
+    for root in symbols:
+        if id(root) in state:
+            continue
+        state[id(root)] = 1
+        stack = [(root, iter(left_symbols(root)))]
+        while stack:
+            symbol, children = stack[-1]
+            for child in children:
+                child_state = state.get(id(child))
+                if child_state == 1:
+                    path = [entry[0] for entry in stack]
+                    return path[next(i for i, s in enumerate(path) if s is child):]
+                if child_state is None:
+                    state[id(child)] = 1
+                    stack.append((child, iter(left_symbols(child))))
+                    break
+            else:
+                state[id(symbol)] = 2
+                stack.pop()
+    return []
+
+
+def check_compilable(symbols):
+    for symbol in symbols:
+        if isinstance(symbol, (Operators, Recover, Cut)):
+            raise InvalidGrammar('cannot compile {0}'.format(symbol))
+    cycle = find_left_recursion(symbols)
+    if cycle:
+        names = [symbol.name for symbol in cycle if symbol.is_rule()] or [str(cycle[0])]
+        raise InvalidGrammar('cannot compile left recursion: {0}'.format(' -> '.join(names)))
+
+
+class CompiledParserState(object):
+    def __init__(self, tokens, kinds):
+        self.tokens = tokens
+        self.kinds = kinds
+        self.memo = {}
+        self.farthest = -1
+        self.expected = []
+
+    def fail(self, offset, symbol):
+        # the same failures as `Parser.fail()`, so the errors are the same too
+        if offset > self.farthest:
+            self.farthest = offset
+            self.expected = [symbol]
+        elif offset == self.farthest:
+            self.expected.append(symbol)
+        return None
+
+    def error(self):
+        expected = describe_expected(self.expected)
+        if 0 <= self.farthest < len(self.tokens) - 1:
+            return UnexpectedToken(self.tokens[self.farthest], expected)
+        offset = self.tokens[-2].end if len(self.tokens) > 1 else 0
+        return ParseError('unexpected end of file, expected {0}'.format(expected), offset)
+
+
+def run_compiled_parser(grammar, kind_table, start, source):
+    tokens = list(grammar.tokenize(source))
+    kinds = [kind_table.get(token.symbol, -1) for token in tokens]
+    # a sentinel token that never matches, so terminal checks need no bounds check
+    tokens.append(None)
+    kinds.append(-1)
+    state = CompiledParserState(tokens, kinds)
+    node, end = start(state, 0)
+    if node is None:
+        raise state.error()
+    if end != len(tokens) - 1:
+        if state.farthest >= end:
+            # a failed attempt got further than the end of the match, like
+            # `Parser.junk_error()`
+            raise state.error()
+        junk = tokens[end]
+        raise ParseError('unparsed junk: {0}'.format(junk), junk.start)
+    return node
+
+
+class GrammarCompiler(object):
+    indent = '    '
+
+    def __call__(self, grammar, reference):
+        self.grammar = grammar
+        self.symbols = grammar_symbols(grammar)
+        check_compilable(self.symbols)
+        self.index = {id(symbol): i for i, symbol in enumerate(self.symbols)}
+        self.terminals = []
+        for symbol in self.symbols:
+            if isinstance(symbol, Terminal) and not isinstance(symbol, Epsilon):
+                if self.kind(symbol) is None:
+                    self.terminals.append(symbol)
+        self.functions = {}
+        self.lines = []
+        for symbol in self.symbols:
+            self.function_name(symbol)
+
+        header = [
+            '# generated by rdp.compiler from {0} -- do not edit'.format(reference),
+            'from rdp.ast import Node',
+            'from rdp.symbols import empty_match',
+            'from rdp.compiler import load_symbols, run_compiled_parser',
+            '',
+            'grammar, S = load_symbols({0!r}, {1!r})'.format(reference, fingerprint(self.symbols)),
+            'TERMINALS = [{0}]'.format(', '.join('S[{0}]'.format(self.index[id(t)]) for t in self.terminals)),
+            'KINDS = {terminal: kind for kind, terminal in enumerate(TERMINALS)}',
+            'FAIL = None, -1',
+            '',
+            '',
+        ]
+        footer = [
+            'def parse(source):',
+            '    return run_compiled_parser(grammar, KINDS, {0}, source)'.format(
+                self.function_name(grammar.start)),
+            '',
+        ]
+        return '\n'.join(header + self.lines + footer)
+
+    def function_name(self, symbol):
+        while isinstance(symbol, SymbolProxy) and not isinstance(symbol, Alias):
+            symbol = symbol.symbol
+        try:
+            return self.functions[id(symbol)]
+        except KeyError:
+            pass
+        i = self.index[id(symbol)]
+        if symbol.is_rule() and symbol.name.isidentifier():
+            name = 'rule_{0}_{1}'.format(symbol.name, i)
+        else:
+            name = '_s{0}'.format(i)
+        self.functions[id(symbol)] = name
+        body = self.compile_symbol(symbol)
+        memoize = symbol.is_rule() and not isinstance(symbol, Terminal)
+        self.emit_function(name, i, body, memoize)
+        return name
+
+    def emit_function(self, name, i, body, memoize):
+        lines = ['def {0}(p, pos):'.format(name)]
+        if memoize:
+            lines += [
+                '    key = pos * {0} + {1}'.format(len(self.symbols), i),
+                '    try:',
+                '        return p.memo[key]',
+                '    except KeyError:',
+                '        pass',
+                '    result = _{0}(p, pos)'.format(name),
+                '    if result[0] is not None:',
+                '        p.memo[key] = result',
+                '    return result',
+                '',
+                '',
+                'def _{0}(p, pos):'.format(name),
+            ]
+        lines += ['    kinds, tokens = p.kinds, p.tokens']
+        lines += ['    ' + line for line in body]
+        self.lines += lines + ['', '']
+
+    def compile_symbol(self, symbol):
+        for cls in type(symbol).__mro__:
+            func = getattr(self, 'compile_{0}'.format(cls.__name__.lower()), None)
+            if func:
+                return func(symbol)
+        raise TypeError('cannot compile symbol of type {0}'.format(type(symbol)))
+
+    def kind(self, terminal):
+        # terminals are told apart by equality, just like `Terminal.__call__` does
+        for kind, t in enumerate(self.terminals):
+            if t == terminal:
+                return kind
+        return None
+
+    def ref(self, symbol):
+        return 'S[{0}]'.format(self.index[id(symbol)])
+
+    def match(self, symbol):
+        """
+        Returns lines that bind `c` to the node matched by `symbol` at `pos`
+        (or `None` if it does not match) and `end` to the offset after it.
+        """
+        while isinstance(symbol, SymbolProxy) and not isinstance(symbol, Alias):
+            symbol = symbol.symbol
+        if isinstance(symbol, Epsilon):
+            return ['c, end = Node({0}, pos), pos'.format(self.ref(symbol))]
+        if isinstance(symbol, Terminal):
+            kind = self.kind(symbol)
+            return [
+                'if kinds[pos] == {0}:'.format(kind),
+                '    c, end = Node({0}, pos, tokens[pos]), pos + 1'.format(self.ref(symbol)),
+                'else:',
+                '    c = p.fail(pos, {0})'.format(self.ref(symbol)),
+            ]
+        return ['c, end = {0}(p, pos)'.format(self.function_name(symbol))]
+
+    def append(self, symbol):
+        """
+        Returns lines that add `c` (a node produced by `symbol`) to `node`,
+        the same way `Node.append()` would.
+        """
+        candidates = [s for s in node_symbols(symbol) if s is not None and not s.drop]
+        if not candidates:
+            return []
+        if len(candidates) > 1 or None in node_symbols(symbol):
+            return ['node.append(c)']
+        if candidates[0].flatten:
+            return [
+                'for child in c.children:',
+                '    child.parent = node',
+                'node.children.extend(c.children)',
+            ]
+        return [
+            'node.children.append(c)',
+            'c.parent = node',
+        ]
+
+    def guard(self, symbol):
+        if symbol.first is None or symbol.nullable:
+            return None
+        kinds = sorted({self.kind(t) for t in symbol.first} - {None})
+        if not kinds:
+            return 'False'
+        if len(kinds) == 1:
+            return 'kinds[pos] == {0}'.format(kinds[0])
+        return 'kinds[pos] in {{{0}}}'.format(', '.join(str(kind) for kind in kinds))
+
+    def compile_terminal(self, terminal):
+        kind = self.kind(terminal)
+        return [
+            'if kinds[pos] == {0}:'.format(kind),
+            '    return Node({0}, pos, tokens[pos]), pos + 1'.format(self.ref(terminal)),
+            'p.fail(pos, {0})'.format(self.ref(terminal)),
+            'return FAIL',
+        ]
+
+    def compile_epsilon(self, epsilon):
+        return ['return Node({0}, pos), pos'.format(self.ref(epsilon))]
+
+    def compile_sequence(self, sequence):
+        lines = ['node = Node({0}, pos)'.format(self.ref(sequence))]
+        for symbol in sequence.symbols:
+            lines += self.match(symbol)
+            lines += ['if c is None:', '    return FAIL']
+            lines += self.append(symbol)
+            lines += ['pos = end']
+        return lines + ['return node, pos']
+
+    def compile_oneof(self, oneof):
+        lines = ['node = Node({0}, pos)'.format(self.ref(oneof))]
+        predicted = True
+        for symbol in oneof.symbols:
+            block = self.match(symbol) + ['if c is not None:']
+            block += [self.indent + line for line in self.append(symbol) + ['return node, end']]
+            guard = self.guard(symbol)
+            if guard is None:
+                lines += block
+                predicted = False
+            elif guard != 'False':
+                lines += ['if {0}:'.format(guard)] + [self.indent + line for line in block]
+        if predicted:
+            # no alternative was tried if the next token was not in the FIRST set
+            kinds = sorted({self.kind(t) for t in oneof.first} - {None})
+            lines += ['if kinds[pos] not in {{{0}}}:'.format(', '.join(str(kind) for kind in kinds) or '-1'),
+                      '    p.fail(pos, {0})'.format(self.ref(oneof))]
+        return lines + ['return FAIL']
+
+    def compile_repeat(self, repeat):
+        lines = [
+            'node = Node({0}, pos)'.format(self.ref(repeat)),
+            'n = 0',
+            'while True:',
+        ]
+        body = self.match(repeat.symbol)
+        body += ['if c is None:', '    break', 'n += 1']
+        body += self.append(repeat.symbol)
+        # a nullable body would match forever
+        body += ['if end == pos:', '    break', 'pos = end']
+        lines += [self.indent + line for line in body]
+        if repeat.min_matches:
+            lines += ['if n < {0}:'.format(repeat.min_matches), '    return FAIL']
+        return lines + ['return node, pos']
+
+    def compile_optional(self, optional):
+        return self.match(optional.symbol) + [
+            'if c is None:',
+            '    return empty_match, pos',
+            'return c, end',
+        ]
+
+    def compile_lookahead(self, lookahead):
+        return self.match(lookahead.symbol) + [
+            'if c is None:',
+            '    return FAIL',
+            'return empty_match, pos',
+        ]
+
+    def compile_nonempty(self, nonempty):
+        return self.match(nonempty.symbol) + [
+            'if not c:',
+            '    return FAIL',
+            'return c, end',
+        ]
+
+    def compile_alias(self, alias):
+        return self.match(alias.symbol) + [
+            'if c is None:',
+            '    return FAIL',
+            'if c.symbol == {0}:'.format(self.ref(alias.symbol)),
+            '    c.symbol = {0}'.format(self.ref(alias)),
+            'return c, end',
+        ]
+
+    def compile_grammar(self, grammar):
+        return ['return {0}(p, pos)'.format(self.function_name(grammar.start))]
+
+
+def compile_grammar(grammar, reference):
+    return GrammarCompiler()(grammar, reference)
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        prog='rdp-compile',
+        description='compile an rdp grammar into a standalone parser module',
+    )
+    argparser.add_argument('grammar', help="import path of the grammar, e.g. 'package.module:grammar'")
+    argparser.add_argument('-o', '--output', help='output file (defaults to stdout)')
+    args = argparser.parse_args(argv)
+
+    if '' not in sys.path:
+        sys.path.insert(0, '')
+    source = compile_grammar(load_grammar(args.grammar), args.grammar)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Event-based parsing without a parse tree.
+
+`EventParser` yields `Event`s instead of returning a tree: `enter` and `exit`
+for each match of a named rule, and `token` for each token, in the order
+and with the `drop` and `flatten` rules of `Node.append()` (a flattened
+start symbol has no `enter` and `exit` either). Matches are `EventMatch`
+objects that only hold the events that are not final yet.
+
+Events are final once the parse is committed to them. Those are the events of
+every symbol whose failure would fail the whole parse. Such symbols are the
+start symbol, the children of a `Sequence` or proxy that is committed, and
+the last alternative of a committed `OneOf`. Their events are passed on as
+soon as they are complete. Children of symbols that backtrack, such as the
+items of a `Repeat`, are collected until they match. A top-level list of
+records therefore produces the events of each record when it is complete,
+and memory stays proportional to the largest record.
+"""
+from collections import namedtuple, deque
+
+from rdp.ast import Node
+from rdp.parser import Parser
+from rdp.symbols import Sequence, SymbolProxy, OneOf
+
+
+Event = namedtuple('Event', ['kind', 'symbol', 'token'])
+
+
+class EventMatch(object):
+    """
+    Takes the place of a `Node`. `events` holds the events of its children
+    that have not been passed on yet, and the child matches they are
+    collected from. Matches of committed symbols have a `parser`, and their
+    `parent` is the enclosing committed match.
+    """
+    events = ()
+    size = 0
+    parser = None
+    parent = None
+    # whether the `enter` event has been passed on
+    started = False
+
+    def __init__(self, symbol, offset, token=None):
+        self.symbol = symbol
+        self.offset = offset
+        self.token = token
+        if token is None:
+            self.events = []
+
+    def reported(self):
+        return bool(self.symbol.name) and not self.symbol.flatten
+
+    def remaining_events(self):
+        """
+        Returns the events and matches that are not passed on yet, including
+        `enter` and `exit` for named rules.
+        """
+        if self.token is not None:
+            return [] if self.symbol.flatten else [Event('token', self.symbol, self.token)]
+        if not self.reported():
+            return self.events
+        events = self.events if self.started else [Event('enter', self.symbol, None)] + self.events
+        return events + [Event('exit', self.symbol, None)]
+
+    def append(self, child):
+        symbol = child.symbol
+        if symbol is None or symbol.drop:
+            return
+        self.size += child.size if symbol.flatten else 1
+        parser = self.parser
+        if parser is not None and not parser.heads:
+            # a left recursion may still be parsed again
+            self.flush()
+            if child.token is not None:
+                if not symbol.flatten:
+                    parser.sink.append(Event('token', symbol, child.token))
+            else:
+                parser.sink.extend(expand(child.remaining_events()))
+        elif child.token is not None or child.started:
+            self.events.extend(child.remaining_events())
+        elif child.events or child.reported():
+            self.events.append(child)
+
+    def flush(self):
+        """
+        Passes on the events of this match and of the enclosing committed
+        matches that have not been passed on yet, outermost first.
+        """
+        matches = []
+        match = self
+        while match is not None and (not match.started or match.events):
+            matches.append(match)
+            match = match.parent
+        sink = self.parser.sink
+        for match in reversed(matches):
+            if not match.started:
+                match.started = True
+                if match.reported():
+                    sink.append(Event('enter', match.symbol, None))
+            sink.extend(expand(match.events))
+            match.events = []
+
+    def __bool__(self):
+        return self.token is not None or self.size > 0
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        name = '{0}='.format(self.symbol.name) if self.symbol and self.symbol.name else ''
+        return '<EventMatch {0}{1}>'.format(name, repr(self.token))
+
+
+def expand(events):
+    """
+    Yields `events` with the events of the matches among them in place.
+    """
+    stack = [iter(events)]
+    while stack:
+        for event in stack[-1]:
+            if event.__class__ is EventMatch:
+                stack.append(iter(event.remaining_events()))
+                break
+            yield event
+        else:
+            stack.pop()
+
+
+class EventParser(Parser):
+    # `Optional` and `Lookahead` yield `empty_match`, a `Node`
+    node_types = (EventMatch, Node)
+
+    def __init__(self, grammar, source, **kwargs):
+        super().__init__(grammar, source, **kwargs)
+        self.sink = deque()
+        # the number of stack entries, from the bottom, that are committed,
+        # and their matches as `(depth, entry, match)` tuples
+        self.committed = 0
+        self.matches = []
+
+    def commits_to(self, parent, symbol):
+        """
+        Returns whether `parent` fails if its child `symbol` fails.
+        """
+        if isinstance(parent, Sequence) or type(parent) is SymbolProxy:
+            return True
+        if isinstance(parent, OneOf):
+            alternatives = parent.alternatives(self)
+            return bool(alternatives) and alternatives[-1] is symbol
+        return False
+
+    def push(self, symbol):
+        stack = self.stack
+        depth = len(stack)
+        # entries above `depth` may have been popped since
+        if self.committed >= depth:
+            if not stack or self.commits_to(stack[-1].symbol, symbol):
+                self.committed = depth + 1
+            else:
+                self.committed = depth
+        return super().push(symbol)
+
+    def node(self, symbol, token=None, offset_diff=0):
+        match = EventMatch(symbol, self.tokens.offset + offset_diff, token)
+        if token is not None:
+            return match
+        stack = self.stack
+        depth = len(stack)
+        entry = stack[-1]
+        if self.committed >= depth and entry.symbol is symbol:
+            matches = self.matches
+            # drop the matches of entries that have been popped, or replaced
+            # to parse a left recursion again
+            while matches and (matches[-1][0] >= depth or stack[matches[-1][0] - 1] is not matches[-1][1]):
+                matches.pop()
+            match.parser = self
+            match.parent = matches[-1][2] if matches else None
+            matches.append((depth, entry, match))
+        return match
+
+    def run_events(self, steps=1024):
+        """
+        Parses the input and yields its events, passing them on after every
+        `steps` parse steps. Memo entries that can no longer be used are
+        released whenever the memo has doubled in size.
+        """
+        sink = self.sink
+        self.suspended = self.push, self.grammar.start
+        match = None
+        while self.suspended is not None:
+            match = self.resume(steps)
+            while sink:
+                yield sink.popleft()
+            if self.suspended is not None:
+                self.release_memo(steps)
+        error = self.junk_error()
+        if error is not None:
+            raise error
+        if match.symbol is not None:
+            yield from expand(match.remaining_events())
@@ -1,20 +1,45 @@
 
+from rdp.source import Positioned
+
+
 class InvalidGrammar(Exception):
     pass
 
 
-class ParseError(Exception):
+class ParseError(Exception, Positioned):
+    # the `Source` of the input, set by the parser
+    source = None
+
     def __init__(self, msg, offset):
         msg = '{0} at offset {1}'.format(msg, offset)
         super().__init__(msg)
         self.offset = offset
 
+    @property
+    def position(self):
+        """
+        The `(line, column)` of the error, or None if the source is unknown.
+        """
+        if self.source is None:
+            return None
+        return self.source.position(self.offset)
+
     def __lt__(self, other):
         return self.offset < other.offset
 
     def __le__(self, other):
         return self.offset <= other.offset
 
+    def __reduce__(self):
+        # `args` only holds the formatted message, not the constructor arguments
+        return restore_error, (type(self), self.args), self.__dict__
+
+
+def restore_error(cls, args):
+    error = Exception.__new__(cls)
+    error.args = args
+    return error
+
 
 class UnexpectedToken(ParseError):
     def __init__(self, token, expected):
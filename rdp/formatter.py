@@ -44,6 +44,9 @@ class GrammarFormatter:
     def format_epsilon(self, epsilon):
         return 'ɛ'
 
+    def format_cut(self, cut):
+        return '~'
+
     def format_regexp(self, regexp):
         return 'r' + self.format_terminal(regexp)
 
@@ -55,3 +58,47 @@ class GrammarFormatter:
 
     def format_lookahead(self, lookahead):
         return '(?>{0})'.format(self.format_symbol(lookahead.symbol))
+
+    def format_recover(self, recover):
+        sync = ' / '.join(self.format_symbol(terminal) for terminal in recover.sync)
+        return '({0}) recover at ({1})'.format(self.format_symbol(recover.symbol), sync)
+
+    def format_operators(self, operators):
+        table = ' / '.join(self.format_operator(operator) for operator in operators.operators)
+        return '{0} with ({1})'.format(self.format_symbol(operators.operand), table)
+
+    def format_operator(self, operator):
+        formatted = '{0} {1} {2}'.format(operator.fixity, self.format_symbol(operator.symbol), operator.power)
+        if operator.right:
+            formatted += ' right'
+        return formatted
+
+
+class AnnotatedGrammarFormatter(GrammarFormatter):
+    """
+    Formats each rule followed by the findings of `rdp.analysis.analyze()`:
+    whether it is LL(1) or backtracking, its FIRST and FOLLOW sets, and any
+    conflicts and hazards.
+    """
+    def __call__(self, grammar):
+        from rdp.analysis import analyze, describe_terminals
+        analysis = analyze(grammar)
+        self.depth = 0
+        rules = [(symbol.name, symbol) for symbol in grammar.rules()]
+        maxlen = max(len(name) for name, symbol in rules)
+        rule_format = '{{0:{0}}}{1}{{1}}'.format(maxlen, self.rule_separator)
+        indent = ' ' * (maxlen + len(self.rule_separator))
+        lines = []
+        for name, symbol in rules:
+            rule = analysis.rules[symbol]
+            lines.append(rule_format.format(name, self.format_symbol(symbol)))
+            summary = ['LL(1)' if rule.deterministic else 'backtracking']
+            if symbol.nullable:
+                summary.append('nullable')
+            summary.append('FIRST {0}'.format(describe_terminals(symbol.first)))
+            summary.append('FOLLOW {0}'.format(describe_terminals(analysis.follow_set(symbol))))
+            lines.append('{0}# {1}'.format(indent, ', '.join(summary)))
+            for finding in rule.findings:
+                where = '' if finding.symbol is symbol else ' in {0}'.format(self.format_symbol(finding.symbol))
+                lines.append('{0}# {1}{2}: {3}'.format(indent, finding.kind, where, finding.message))
+        return '\n'.join(lines)
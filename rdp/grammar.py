@@ -1,9 +1,16 @@
+import functools
+from itertools import chain
 from operator import attrgetter
 
-from rdp.tokenizer import Tokenizer
+from rdp.tokenizer import Tokenizer, TokenArray, terminal_kinds
+from rdp.ast import ArenaTree, reduce_tree
 from rdp.exceptions import InvalidGrammar
-from rdp.symbols import to_symbol, Symbol, SymbolProxy, Alias, Terminal, epsilon
+from rdp.symbols import to_symbol, Symbol, SymbolProxy, Alias, Terminal, OneOf, Epsilon, Recover
 from rdp.parser import Parser
+from rdp.profiling import ProfilingParser
+from rdp.events import EventParser
+from rdp.analysis import compute_follow_sets
+from rdp import incremental, parallel
 
 
 class GrammarBuilder(object):
@@ -40,35 +47,121 @@ class GrammarBuilder(object):
         return Grammar(start, symbols=self._symbols.values(), **kwargs)
 
 
+def ignore_tokens(symbols, tokens):
+    for token in tokens:
+        if token.symbol not in symbols:
+            yield token
+
+
 def ignore(*symbols):
-    def ignore_symbols(tokens):
-        for token in tokens:
-            if token.symbol not in symbols:
-                yield token
+    ignore_symbols = functools.partial(ignore_tokens, symbols)
+    ignore_symbols.symbols = symbols
     return ignore_symbols
 
 
 class Grammar(Symbol):
-    def __init__(self, start, terminals=None, symbols=None, tokenize=(), drop_terminals=False):
+    backtracks = False
+
+    def __init__(self, start, terminals=None, symbols=None, tokenize=(), drop_terminals=False, literal_dispatch=False,
+                 ignore=(), chunk_boundary=None):
         self.start = start
         self.terminals = terminals if terminals is not None else []
         self.symbols = set(symbols) if symbols else {start}
         self.drop_terminals = drop_terminals
+        # a pattern that the source may be split after for parallel tokenizing
+        self.chunk_boundary = chunk_boundary
 
+        reachable = {}
         for symbol in self.symbols.copy():
             for s in symbol.iter():
+                reachable[id(s)] = s
                 self.symbols.add(s)
                 if isinstance(s, Terminal):
                     if s.__class__ == Terminal and s.drop is None:
                         s.drop = self.drop_terminals
-                    if s not in self.terminals and s is not epsilon:
+                    if s not in self.terminals and not isinstance(s, Epsilon):
                         self.terminals.append(s)
 
-        self.token_transforms = tokenize
-        self.tokenizer = Tokenizer(self.terminals)
+        # equal terminals are one element of `symbols`, see `kind_ids`
+        self.terminal_objects = [
+            s for s in reachable.values() if isinstance(s, Terminal) and not isinstance(s, Epsilon)
+        ]
+
+        self.compute_first_sets(reachable.values())
+        # the terminals that may follow each `Recover` symbol, kept here as
+        # symbols may be shared by several grammars
+        self.recover_follow = {}
+        recovering = [s for s in reachable.values() if isinstance(s, Recover)]
+        if recovering:
+            follow = compute_follow_sets(self, list(self.start.iter()))
+            for s in recovering:
+                self.recover_follow[s] = follow.get(id(s), frozenset())
+        # leading ignore() transforms see the raw tokens, so the tokenizer
+        # can skip those terminals itself
+        self.ignored = list(ignore)
+        self.token_transforms = list(tokenize)
+        while self.token_transforms and hasattr(self.token_transforms[0], 'symbols'):
+            self.ignored.extend(self.token_transforms.pop(0).symbols)
+        for terminal in self.ignored:
+            if terminal not in self.terminals:
+                self.terminals.append(terminal)
+        # the index of each terminal in `terminals`, see `TokenArray`
+        self.kinds = terminal_kinds(self.terminals)
+        self._kind_ids = None
+        self.tokenizer = Tokenizer(self.terminals, literal_dispatch=literal_dispatch, ignore=self.ignored)
+
+    @property
+    def kind_ids(self):
+        """
+        Like `kinds`, but keyed by the id of each terminal of the grammar,
+        which is faster to look up. Built on first use, as ids are only valid
+        in one process.
+        """
+        if self._kind_ids is None:
+            self._kind_ids = {id(s): self.kinds[s] for s in chain(self.terminal_objects, self.terminals)}
+        return self._kind_ids
+
+    def __getstate__(self):
+        return dict(self.__dict__, _kind_ids=None)
+
+    def compute_first_sets(self, symbols):
+        symbols = list(symbols)
+        changed = True
+        while changed:
+            changed = False
+            for symbol in symbols:
+                first, nullable = symbol.compute_first()
+                if first != symbol.first or nullable != symbol.nullable:
+                    symbol.first, symbol.nullable = first, nullable
+                    changed = True
+        for symbol in symbols:
+            if isinstance(symbol, OneOf):
+                symbol.build_dispatch_table()
 
     def tokenize(self, source):
-        tokens = self.tokenizer.tokenize(source)
+        return self.transform_tokens(self.tokenizer.tokenize(source))
+
+    def tokenize_array(self, source):
+        """
+        Tokenizes the string `source` into a compact `TokenArray`. Token
+        transforms other than `ignore()` must yield tokens whose lexemes are
+        slices of `source` or empty.
+        """
+        ignored = set()
+        for t in self.token_transforms:
+            if not hasattr(t, 'symbols'):
+                return TokenArray.from_tokens(source, self.terminals, self.tokenize(source))
+            ignored.update(t.symbols)
+        return self.tokenizer.tokenize_array(source, ignore=ignored)
+
+    def tokenize_parallel(self, source, **kwargs):
+        """
+        Tokenizes a large string `source` in worker processes, see
+        `rdp.parallel.tokenize()`. Pass the result to `parse()` as `tokens`.
+        """
+        return parallel.tokenize(self, source, **kwargs)
+
+    def transform_tokens(self, tokens):
         for t in self.token_transforms:
             tokens = t(tokens)
         return tokens
@@ -84,10 +177,91 @@ class Grammar(Symbol):
     def __call__(self, parser):
         yield from self.start(parser)
 
+    def compute_first(self):
+        return self.start.first, self.start.nullable
+
+    def compute_follow(self, follow):
+        return [(self.start, follow)]
+
     def pre_transform(self, node):
-        return [child.transform() for child in node]
+        return reduce_tree(
+            node,
+            lambda n: n.children if n is node else n.symbol.transform_children(n),
+            lambda n, values: values if n is node else n.symbol.apply_transform(n, values),
+        )
+
+    def parse(self, source, arena=False, **kwargs):
+        """
+        Parses `source` and returns the root `Node`. With `arena=True` the
+        tree is packed into an `ArenaTree` and its root view is returned.
+        With `transform=True` the transforms are applied while parsing, and
+        the transformed value is returned instead of a tree. If `source` is
+        an `rdp.source.Source`, tokens and nodes have a `line` and `column`.
+        """
+        parser = Parser(self, source, **kwargs)
+        node = parser.run()
+        if arena and not parser.transform:
+            return ArenaTree.from_node(node, parser.source).root
+        return node
+
+    def parse_profiled(self, source, **kwargs):
+        """
+        Parses `source` like `parse()` and returns the root `Node` together
+        with an `rdp.profiling.Profile` of the symbols involved.
+        """
+        parser = ProfilingParser(self, source, **kwargs)
+        return parser.run(), parser.profile
 
-    def parse(self, source, **kwargs):
+    def parse_events(self, source, steps=1024, **kwargs):
+        """
+        Parses `source` without building a tree and yields `rdp.events.Event`s
+        as soon as the parse is committed to them: `enter` and `exit` for
+        each named rule, and `token` for each token.
+        """
+        parser = EventParser(self, source, **kwargs)
+        return parser.run_events(steps)
+
+    def parse_recovering(self, source, **kwargs):
+        """
+        Parses `source` in recovery mode and returns the root `Node` (None if
+        an error was not recovered from) together with the list of all
+        `ParseError`s. Errors are recovered from at `recover()` symbols.
+        """
+        parser = Parser(self, source, **kwargs)
+        return parser.run_recovering()
+
+    def parse_iter(self, source, item=None, **kwargs):
+        """
+        Parses `source` as a sequence of `item` symbols (defaults to the start
+        symbol) and yields each one as soon as it is complete. `source` may be
+        a string, a file-like object or an iterable of strings, which is
+        tokenized incrementally.
+        """
         parser = Parser(self, source, **kwargs)
-        return parser.run()
+        return parser.run_iter(self.start if item is None else item)
+
+    def parse_incremental(self, source):
+        """
+        Parses `source` and returns an `rdp.incremental.ParseResult` that can
+        be passed to `reparse()`.
+        """
+        return incremental.parse(self, source)
+
+    def reparse(self, previous, edits):
+        """
+        Applies text `edits`, a list of `(start, end, new_text)` tuples, to
+        the source of `previous` and parses the result, reusing the tokens
+        and memoized subtrees outside of the edited region.
+        """
+        return incremental.reparse(previous, edits)
 
+    def parse_many(self, sources, workers=None, chunksize=1, ordered=True, transform=True, reference=None):
+        """
+        Parses independent `sources` in a pool of worker processes, see
+        `rdp.parallel.parse_many()`. Yields the results in order, or
+        `(index, result)` pairs in completion order if `ordered` is false.
+        """
+        return parallel.parse_many(
+            self, sources, workers=workers, chunksize=chunksize,
+            ordered=ordered, transform=transform, reference=reference,
+        )
@@ -0,0 +1,490 @@
+"""
+Incremental reparsing after text edits.
+
+Only the region around the edits is relexed, and the token list is patched in
+place. Nodes and tokens are not updated after an edit: their offsets are
+stored together with the number of edits made so far, and are brought up to
+date from the `EditLog` when they are accessed. Likewise memo entries are
+keyed by the token they start at and are only checked against the edits when
+the parser looks them up, so the parser only descends into the parts of the
+tree that cover the edit.
+
+The cost of a reparse is therefore proportional to the size of the edit and
+the depth of the tree, with two exceptions:
+
+- the nodes that have edited children are rebuilt, so a list at the top of
+  the grammar costs one memo hit per item on every reparse;
+- token transforms other than `ignore()`, such as `indent()`, can carry state
+  from anywhere in the input, so with those all tokens are transformed again
+  and compared with the previous ones.
+
+Reused subtrees are shared with the previous result, so a `ParseResult` must
+not be used after it has been passed to a successful `reparse()`. If the
+edited text does not parse, the changes are undone and the previous result
+can still be reparsed with other edits.
+"""
+from rdp.ast import Node
+from rdp.memo import MemoStats
+from rdp.parser import Parser, RandomAccessIterator
+from rdp.tokenizer import Token
+
+
+class EditLog(object):
+    """
+    The edits made to a sequence since it was first parsed, each recorded as
+    `(start, end, delta)`: the items in `[start, end)` were replaced, and the
+    items from `end` on moved by `delta`. An offset that was stored along
+    with the `generation` at the time is brought up to date by `shift()`.
+
+    The edits after `committed` may still be undone by `rollback()`, so
+    offsets are only stored shifted up to there.
+    """
+    def __init__(self):
+        self.edits = []
+        self.generation = 0
+        self.committed = 0
+
+    def record(self, start, end, delta):
+        self.edits.append((start, end, delta))
+        self.generation += 1
+
+    def commit(self):
+        self.committed = self.generation
+
+    def rollback(self):
+        # the edits are replaced by ones that change nothing, as there may be
+        # offsets stored with a later generation
+        edits = self.edits
+        for index in range(self.committed, self.generation):
+            edits[index] = (0, 0, 0)
+        self.committed = self.generation
+
+    def shift(self, offset, generation, until=None):
+        edits = self.edits
+        for index in range(generation, self.generation if until is None else until):
+            start, end, delta = edits[index]
+            if offset >= end:
+                offset += delta
+        return offset
+
+    def shift_range(self, offset, length, generation, until=None):
+        """
+        Like `shift()` for the range `[offset, offset + length)`, or None if
+        an edit replaced or inserted items inside of it.
+        """
+        edits = self.edits
+        for index in range(generation, self.generation if until is None else until):
+            start, end, delta = edits[index]
+            if offset >= end:
+                offset += delta
+            elif offset + length > start:
+                return None
+        return offset
+
+
+class IncrementalToken(Token):
+    """
+    A `Token` whose start is kept up to date with the text edits in `log`.
+    Hashed by identity, as the memo is keyed by tokens.
+    """
+    __hash__ = object.__hash__
+
+    def __init__(self, symbol, lexeme, start, log):
+        self.log = log
+        super().__init__(symbol, lexeme, start)
+
+    @property
+    def start(self):
+        log = self.log
+        if self.generation < log.committed:
+            self._start = log.shift(self._start, self.generation, log.committed)
+            self.generation = log.committed
+        if self.generation != log.generation:
+            return log.shift(self._start, self.generation)
+        return self._start
+
+    @start.setter
+    def start(self, start):
+        self._start = start
+        self.generation = self.log.generation
+
+    def split(self, offset):
+        # the pieces are wrapped by `wrap_tokens()` like any other new token
+        return Token(self.symbol, self.lexeme, self.start).split(offset)
+
+
+class IncrementalNode(Node):
+    """
+    A `Node` whose offset is kept up to date with the token edits in `log`.
+    """
+    def __init__(self, symbol, offset, token, log):
+        self.log = log
+        super().__init__(symbol, offset, token=token)
+
+    @property
+    def offset(self):
+        log = self.log
+        if self.generation < log.committed:
+            self._offset = log.shift(self._offset, self.generation, log.committed)
+            self.generation = log.committed
+        if self.generation != log.generation:
+            return log.shift(self._offset, self.generation)
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset):
+        self._offset = offset
+        self.generation = self.log.generation
+
+
+def wrap_tokens(tokens, log):
+    return [
+        token if token.__class__ is IncrementalToken else IncrementalToken(token.symbol, token.lexeme, token.start, log)
+        for token in tokens
+    ]
+
+
+class TokenListCursor(RandomAccessIterator):
+    """
+    A `RandomAccessIterator` over a list of tokens that also records `high`,
+    one past the highest offset that was read or peeked at.
+    """
+    def __init__(self, tokens):
+        super().__init__(iter(()))
+        self.buffer = tokens
+        self.high = 0
+
+    def __next__(self):
+        offset = self.offset
+        if offset >= self.high:
+            self.high = offset + 1
+        if offset == len(self.buffer):
+            raise StopIteration
+        item = self.last = self.buffer[offset]
+        self.offset = offset + 1
+        return item
+
+    def peek(self):
+        offset = self.offset
+        if offset >= self.high:
+            self.high = offset + 1
+        return self.buffer[offset] if offset < len(self.buffer) else None
+
+    def seek(self, offset):
+        self.offset = offset
+        self.last = self.buffer[offset - 1] if offset > 0 else None
+
+    def release(self, offset):
+        # the whole list is kept for the next reparse
+        pass
+
+
+class IncrementalMemo(object):
+    """
+    Maps `(symbol, offset)` to `(node, end_offset)` like `Memo`, but stores
+    the entries by the token at their offset, together with their extent:
+    the number of tokens the parser had looked at when the entry was stored.
+    An entry only depends on the tokens between its offset and its extent,
+    and is dropped when it is looked up after an edit inside of them.
+    """
+    # the key of the entries at the end of the input
+    end = object()
+
+    def __init__(self, log):
+        self.log = log
+        self.entries = {}
+        self.size = 0
+        # the cursor of the current parse, see `run()`
+        self.tokens = None
+        # the number of parses so far, and the number of hits on entries of
+        # earlier ones and of entries stored in the current parse
+        self.parses = 0
+        self.reused = 0
+        self.stored = 0
+        # the entries stored since the last commit of `log`
+        self.added = []
+
+    def bucket(self, offset):
+        buffer = self.tokens.buffer
+        return self.entries.get(buffer[offset] if offset < len(buffer) else self.end)
+
+    def __getitem__(self, key):
+        symbol, offset = key
+        bucket = self.bucket(offset)
+        if bucket is None:
+            raise KeyError(key)
+        entry = bucket[symbol]
+        node, length, extent, entry_offset, generation, parse = entry
+        log = self.log
+        if generation != log.generation:
+            if generation < log.committed:
+                entry_offset = log.shift_range(entry_offset, extent, generation, log.committed)
+                if entry_offset is not None:
+                    entry[3] = entry_offset
+                    entry[4] = generation = log.committed
+            if entry_offset is None or log.shift_range(entry_offset, extent, generation) != offset:
+                del bucket[symbol]
+                self.size -= 1
+                raise KeyError(key)
+        if parse != self.parses:
+            entry[5] = self.parses
+            self.reused += 1
+        tokens = self.tokens
+        if offset + extent > tokens.high:
+            tokens.high = offset + extent
+        return node, offset + length
+
+    def __setitem__(self, key, value):
+        symbol, offset = key
+        node, end = value
+        buffer = self.tokens.buffer
+        token = buffer[offset] if offset < len(buffer) else self.end
+        bucket = self.entries.setdefault(token, {})
+        if symbol not in bucket:
+            self.size += 1
+        self.stored += 1
+        # an insertion right after the entry invalidates it too, as empty
+        # nodes at its end could not tell if they belong before or after it
+        extent = max(self.tokens.high, end + 1)
+        bucket[symbol] = entry = [node, end - offset, extent - offset, offset, self.log.generation, self.parses]
+        if self.log.committed != self.log.generation:
+            self.added.append((token, symbol, entry))
+
+    def pop(self, key, *default):
+        symbol, offset = key
+        bucket = self.bucket(offset)
+        if bucket is None or symbol not in bucket:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        node, length = bucket.pop(symbol)[:2]
+        self.size -= 1
+        return node, offset + length
+
+    def commit(self):
+        self.log.commit()
+        self.added = []
+
+    def rollback(self):
+        """
+        Drops the entries stored since the last commit, which may depend on
+        the edits that are undone.
+        """
+        self.log.rollback()
+        for token, symbol, entry in self.added:
+            bucket = self.entries.get(token)
+            if bucket is not None and bucket.get(symbol) is entry:
+                del bucket[symbol]
+                self.size -= 1
+                if not bucket:
+                    del self.entries[token]
+        self.added = []
+
+    def forget(self, tokens):
+        """
+        Drops the entries of `tokens`, which were removed by an edit.
+        """
+        for token in tokens:
+            bucket = self.entries.pop(token, None)
+            if bucket is not None:
+                self.size -= len(bucket)
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def release(self, offset):
+        # entries before a cut are still reused by `reparse()`
+        pass
+
+    def stats(self):
+        return MemoStats(size=self.size, peak_size=self.size, evictions=0)
+
+
+class IncrementalParser(Parser):
+    def __init__(self, grammar, source, tokens, memo):
+        super().__init__(grammar, source, memo=memo, buffer_size=None, tokens=())
+        self.tokens = TokenListCursor(tokens)
+        self.log = memo.log
+
+    def node(self, symbol, token=None, offset_diff=0):
+        return IncrementalNode(symbol, self.tokens.offset + offset_diff, token, self.log)
+
+
+class ParseResult(object):
+    def __init__(self, grammar, source, raw_tokens, tokens, memo, tree, chars, reused=0, reparsed=0):
+        self.grammar = grammar
+        self.source = source
+        self.raw_tokens = raw_tokens
+        self.tokens = tokens
+        self.memo = memo
+        self.tree = tree
+        # the text edits, `memo.log` has the token edits
+        self.chars = chars
+        # the memo entries taken from the previous result, and the ones that
+        # had to be parsed again
+        self.reused = reused
+        self.reparsed = reparsed
+
+
+def run(grammar, source, tokens, memo):
+    parser = IncrementalParser(grammar, source, tokens, memo)
+    memo.tokens = parser.tokens
+    memo.reused = memo.stored = 0
+    try:
+        return parser.run()
+    finally:
+        memo.tokens = None
+        memo.parses += 1
+
+
+def filtered_symbols(grammar):
+    """
+    Returns the terminals that the token transforms of `grammar` leave out,
+    or None if there are other transforms.
+    """
+    ignored = set()
+    for t in grammar.token_transforms:
+        if not hasattr(t, 'symbols'):
+            return None
+        ignored.update(t.symbols)
+    return ignored
+
+
+def parse(grammar, source):
+    chars = EditLog()
+    raw_tokens = wrap_tokens(grammar.tokenizer.tokenize(source), chars)
+    ignored = filtered_symbols(grammar)
+    if ignored is None:
+        tokens = wrap_tokens(grammar.transform_tokens(iter(raw_tokens)), chars)
+    else:
+        raw_tokens = tokens = [token for token in raw_tokens if token.symbol not in ignored]
+    memo = IncrementalMemo(EditLog())
+    tree = run(grammar, source, tokens, memo)
+    return ParseResult(grammar, source, raw_tokens, tokens, memo, tree, chars)
+
+
+def apply_edits(source, edits):
+    """
+    Applies `edits` in order, each relative to the text produced by the
+    previous ones. Returns the new text and the damaged region as
+    `(start, old_end, new_end)`, where `[start, old_end)` in the old text
+    was replaced by `[start, new_end)` in the new one.
+    """
+    start = old_end = new_end = None
+    for edit_start, edit_end, text in edits:
+        source = source[:edit_start] + text + source[edit_end:]
+        delta = len(text) - (edit_end - edit_start)
+        if start is None:
+            start, old_end, new_end = edit_start, edit_end, edit_end + delta
+            continue
+        if edit_end > new_end:
+            old_end += edit_end - new_end
+        new_end = max(new_end, edit_end) + delta
+        start = min(start, edit_start)
+    return source, (start, old_end, new_end)
+
+
+def find_start(tokens, start):
+    lo, hi = 0, len(tokens)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if tokens[mid].start < start:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def relex(tokenizer, tokens, source, start, old_end, new_end, ignored=()):
+    """
+    Tokenizes the damaged region of the edited `source`. Returns `(i, j,
+    relexed)`, where the new tokens `relexed` replace `tokens[i:j]`; the
+    tokens around them are unchanged apart from their starts.
+    """
+    delta = new_end - old_end
+    # a token that ends right before the edit may extend into it
+    i = find_start(tokens, start) - 1
+    if i < 0:
+        i, pos = 0, 0
+    else:
+        pos = tokens[i].start
+    relexed = []
+    j = len(tokens)
+    for token in tokenizer.tokenize_string(source, pos):
+        if token.symbol in ignored:
+            continue
+        if token.start >= new_end:
+            k = find_start(tokens, token.start - delta)
+            if k < len(tokens) and tokens[k].start == token.start - delta:
+                # tokenizing is context free, the rest is just shifted
+                j = k
+                break
+        relexed.append(token)
+    # tokens before the edit that came out the same are kept
+    n = 0
+    while n < len(relexed) and i + n < j and tokens[i + n].start < old_end and same_token(tokens[i + n], relexed[n]):
+        n += 1
+    return i + n, j, relexed[n:]
+
+
+def same_token(a, b):
+    return a.symbol == b.symbol and a.lexeme == b.lexeme and a.start == b.start
+
+
+def reparse(previous, edits):
+    grammar = previous.grammar
+    source, (start, old_end, new_end) = apply_edits(previous.source, edits)
+    if start is None:
+        return previous
+    chars, memo = previous.chars, previous.memo
+    ignored = filtered_symbols(grammar)
+    raw_tokens = previous.raw_tokens
+    i, j, relexed = relex(grammar.tokenizer, raw_tokens, source, start, old_end, new_end, ignored or ())
+    # the token lists are patched in place, and the splices are undone if the
+    # new text does not parse, as `(tokens, start, end, removed)`
+    splices = []
+    chars.record(start, old_end, new_end - old_end)
+    try:
+        relexed = wrap_tokens(relexed, chars)
+        if ignored is not None:
+            tokens = raw_tokens
+        else:
+            splices.append((raw_tokens, i, i + len(relexed), raw_tokens[i:j]))
+            raw_tokens[i:j] = relexed
+            # the transforms may depend on any earlier token, so the changed
+            # tokens are found by comparing all of them
+            old_tokens = previous.tokens
+            tokens = wrap_tokens(grammar.transform_tokens(iter(raw_tokens)), chars)
+            limit = min(len(old_tokens), len(tokens))
+            i = 0
+            while i < limit and same_token(old_tokens[i], tokens[i]):
+                tokens[i] = old_tokens[i]
+                i += 1
+            suffix = 0
+            while suffix < limit - i and same_token(old_tokens[-suffix - 1], tokens[-suffix - 1]):
+                tokens[-suffix - 1] = old_tokens[-suffix - 1]
+                suffix += 1
+            j = len(old_tokens) - suffix
+            relexed = tokens[i:len(tokens) - suffix]
+            tokens = old_tokens
+
+        removed_tokens = tokens[i:j]
+        if removed_tokens or relexed:
+            splices.append((tokens, i, i + len(relexed), removed_tokens))
+            tokens[i:j] = relexed
+            memo.log.record(i, j, len(relexed) - (j - i))
+        tree = run(grammar, source, tokens, memo)
+    except Exception:
+        for spliced, splice_start, splice_end, removed in reversed(splices):
+            spliced[splice_start:splice_end] = removed
+        chars.rollback()
+        memo.rollback()
+        raise
+    chars.commit()
+    memo.commit()
+    memo.forget(removed_tokens)
+    return ParseResult(grammar, source, raw_tokens, tokens, memo, tree, chars, reused=memo.reused, reparsed=memo.stored)
@@ -0,0 +1,132 @@
+from collections import namedtuple, OrderedDict
+
+
+MemoStats = namedtuple('MemoStats', ['size', 'peak_size', 'evictions'])
+
+
+class Memo(dict):
+    """
+    Unbounded packrat memo: maps `(symbol, offset)` to `(node, end_offset)`
+    for the lifetime of the parse.
+    """
+    # the largest size before a shrink, in between the memo only grows
+    peak_size = 0
+
+    def record_peak(self):
+        if len(self) > self.peak_size:
+            self.peak_size = len(self)
+
+    def stats(self):
+        return MemoStats(size=len(self), peak_size=max(self.peak_size, len(self)), evictions=0)
+
+    def pop(self, key, *default):
+        self.record_peak()
+        return super().pop(key, *default)
+
+    def __delitem__(self, key):
+        self.record_peak()
+        super().__delitem__(key)
+
+    def clear(self):
+        self.record_peak()
+        super().clear()
+
+    def release(self, offset):
+        """
+        Drops the entries before `offset`, which the parser no longer needs.
+        """
+        live = [(key, value) for key, value in self.items() if key[1] >= offset]
+        self.clear()
+        self.update(live)
+
+
+class LRUMemo(OrderedDict):
+    """
+    Keeps at most `max_size` entries and evicts the least recently used one
+    when full.
+    """
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+        self.peak_size = 0
+        self.evictions = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+            self.evictions += 1
+        elif len(self) > self.peak_size:
+            self.peak_size = len(self)
+
+    def stats(self):
+        return MemoStats(size=len(self), peak_size=self.peak_size, evictions=self.evictions)
+
+    def release(self, offset):
+        for key in [key for key in self if key[1] < offset]:
+            del self[key]
+
+
+class WindowMemo(dict):
+    """
+    Evicts entries that start more than `window` tokens behind the farthest
+    offset an entry was stored for. Re-entering an evicted region after
+    backtracking that far re-parses it.
+    """
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self.buckets = {}
+        self.low = 0
+        self.high = 0
+        self.peak_size = 0
+        self.evictions = 0
+
+    def __setitem__(self, key, value):
+        offset = key[1]
+        if offset < self.low:
+            return
+        if key not in self:
+            self.buckets.setdefault(offset, []).append(key)
+        super().__setitem__(key, value)
+        if offset > self.high:
+            self.high = offset
+            self.evict(offset - self.window)
+        if len(self) > self.peak_size:
+            self.peak_size = len(self)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.buckets[key[1]].remove(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def evict(self, offset):
+        while self.low < offset:
+            for key in self.buckets.pop(self.low, ()):
+                super().__delitem__(key)
+                self.evictions += 1
+            self.low += 1
+
+    def release(self, offset):
+        self.evict(offset)
+
+    def clear(self):
+        super().clear()
+        self.buckets.clear()
+        self.low = self.high = 0
+
+    def stats(self):
+        return MemoStats(size=len(self), peak_size=self.peak_size, evictions=self.evictions)
@@ -0,0 +1,209 @@
+"""
+Parses many independent sources in worker processes.
+
+The grammar is sent to each worker once, when the worker starts. Grammars
+whose transforms and token transforms are module level functions (or the
+helpers from `rdp.utils`) are pickled. Other grammars, e.g. ones that use
+lambdas, can be shipped by reference instead: pass `reference` as
+`'package.module:name'`, and each worker imports the grammar from there.
+
+Workers send back transformed values, or the columns of an `ArenaTree` with
+symbols encoded as indices into the grammar's symbol table, never pickled
+`Node` graphs.
+
+`tokenize()` lexes one large source in parallel chunks instead. Its workers
+only get the terminal patterns, so any grammar can be used.
+"""
+import os
+import re
+import pickle
+import itertools
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from rdp.ast import ArenaTree
+from rdp.tokenizer import TokenArray, compile_patterns, scan
+from rdp.utils import load_grammar
+
+
+worker_grammar = None
+worker_symbols = None
+worker_match = None
+worker_group_kinds = None
+
+
+def symbol_table(grammar):
+    # `Symbol.iter()` visits symbols in an order that only depends on the
+    # structure of the grammar, so it is the same in every process
+    return list(grammar.start.iter())
+
+
+def init_worker(grammar_data, reference):
+    global worker_grammar, worker_symbols
+    if reference is not None:
+        worker_grammar = load_grammar(reference)
+    else:
+        worker_grammar = pickle.loads(grammar_data)
+    worker_symbols = {id(symbol): i for i, symbol in enumerate(symbol_table(worker_grammar))}
+
+
+def parse_chunk(sources, transform):
+    results = []
+    for source in sources:
+        node = worker_grammar.parse(source)
+        if transform:
+            results.append(node.transform())
+        else:
+            tree = ArenaTree.from_node(node, source)
+            symbols = [worker_symbols[id(symbol)] for symbol in tree.symbols]
+            results.append((symbols, tree.columns()))
+    return results
+
+
+def chunks(iterable, size):
+    iterator = enumerate(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_many(grammar, sources, workers=None, chunksize=1, ordered=True, transform=True, reference=None):
+    """
+    Parses each string in `sources` in a pool of `workers` processes, sending
+    them `chunksize` sources at a time. Yields the transformed value of each
+    parse, or the root of an `ArenaTree` if `transform` is false.
+
+    The two modes yield different shapes: with `ordered` the results come in
+    the order of `sources` and are yielded as they are; otherwise they come
+    in the order they complete, so each is yielded as an `(index, result)`
+    pair, where `index` is the position of its source. A `ParseError` is
+    raised when the result of the failed source is reached.
+    """
+    if reference is None:
+        try:
+            grammar_data = pickle.dumps(grammar, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            raise TypeError(
+                'cannot pickle the grammar ({0}), use module level transforms or pass a reference'.format(e)
+            ) from e
+    else:
+        grammar_data = None
+    table = symbol_table(grammar)
+
+    def results(chunk, values):
+        for (index, source), value in zip(chunk, values):
+            if not transform:
+                symbols, columns = value
+                value = ArenaTree.from_columns(source, [table[i] for i in symbols], columns).root
+            yield index, value
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # bounds the number of sources and results held in memory at a time
+    window = 2 * workers
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(grammar_data, reference)) as executor:
+        def submit(chunk):
+            return executor.submit(parse_chunk, [source for index, source in chunk], transform)
+
+        if ordered:
+            pending = deque()
+            for chunk in chunks(sources, chunksize):
+                pending.append((submit(chunk), chunk))
+                if len(pending) >= window:
+                    future, done_chunk = pending.popleft()
+                    for index, value in results(done_chunk, future.result()):
+                        yield value
+            for future, chunk in pending:
+                for index, value in results(chunk, future.result()):
+                    yield value
+        else:
+            pending = {}
+            for chunk in chunks(sources, chunksize):
+                pending[submit(chunk)] = chunk
+                if len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from results(pending.pop(future), future.result())
+            for future in as_completed(pending):
+                yield from results(pending[future], future.result())
+
+
+def init_tokenizer_worker(pattern, literals, group_kinds):
+    global worker_match, worker_group_kinds
+    worker_match = compile_patterns(pattern, literals).match
+    worker_group_kinds = group_kinds
+
+
+def tokenize_chunk(text, base, limit):
+    # errors are left to the sequential fallback, the chunk may not start
+    # on a token boundary
+    columns = array('i'), array('i'), array('i')
+    stop = scan(worker_match, worker_group_kinds, text, 0, limit, columns, base=base, final=False)
+    return columns + (base + stop,)
+
+
+def split(source, chunk_size, boundary):
+    bounds = []
+    start = 0
+    while start < len(source):
+        match = boundary.search(source, start + chunk_size)
+        end = match.end() if match is not None and match.end() > start else len(source)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def tokenize(grammar, source, workers=None, chunk_size=1 << 20, overlap=4096, boundary=None):
+    """
+    Tokenizes the string `source` into a `TokenArray`, lexing chunks of
+    about `chunk_size` characters in a pool of `workers` processes. Chunks
+    end after a match of `boundary`, a pattern that defaults to the grammar's
+    `chunk_boundary` or a newline. Each worker also sees `overlap` characters
+    past its chunk to finish the last token.
+
+    A boundary is only trusted if lexing the previous chunk ended exactly on
+    it. Otherwise the tokens after it are lexed again here until they line
+    up with the tokens of the next chunk.
+    """
+    tokenizer = grammar.tokenizer
+    boundary = re.compile(boundary or grammar.chunk_boundary or r'\n')
+    bounds = split(source, chunk_size, boundary)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    columns = kinds, starts, ends = array('i'), array('i'), array('i')
+    # the workers only get the pattern sources and the kinds of their groups,
+    # the terminals (and their transforms) stay here
+    initargs = (tokenizer.pattern, tokenizer.literals, tokenizer.group_kinds())
+    with ProcessPoolExecutor(workers, initializer=init_tokenizer_worker, initargs=initargs) as executor:
+        results = executor.map(
+            tokenize_chunk,
+            (source[start:end + overlap] for start, end in bounds),
+            (start for start, end in bounds),
+            (end - start for start, end in bounds),
+        )
+        pos = 0
+        for (start, end), (chunk_kinds, chunk_starts, chunk_ends, stop) in zip(bounds, results):
+            synced = pos == start
+            index = 0
+            while not synced and pos < stop:
+                index = bisect_left(chunk_starts, pos)
+                if index < len(chunk_starts) and chunk_starts[index] == pos:
+                    synced = True
+                else:
+                    pos = tokenizer.scan(source, pos, pos + 1, columns)
+            if synced:
+                kinds.extend(chunk_kinds[index:])
+                starts.extend(chunk_starts[index:])
+                ends.extend(chunk_ends[index:])
+                pos = stop
+    if pos < len(source):
+        tokenizer.scan(source, pos, len(source), columns)
+    kinds.append(-1)
+    tokens = TokenArray(source, grammar.terminals, kinds, starts, ends)
+    if grammar.token_transforms:
+        tokens = TokenArray.from_tokens(source, grammar.terminals, grammar.transform_tokens(iter(tokens)))
+    return tokens
@@ -1,58 +1,358 @@
-from collections import namedtuple
+from collections import namedtuple, deque
 
-from rdp.ast import Node
-from rdp.exceptions import ParseError, LeftRecursion
+from rdp.ast import Node, ErrorNode, ValueNode, transformed
+from rdp.memo import Memo
+from rdp.source import Source
+from rdp.exceptions import ParseError, UnexpectedToken, LeftRecursion
+from rdp.symbols import no_match, describe_expected, OneOf
+from rdp.tokenizer import TokenArray
+from rdp.utils import identity
 
 
 class RandomAccessIterator(object):
+    """
+    Buffers the items of `iterator` so that they can be revisited by offset.
+    `buffer[0]` is the item at offset `base`; items before it have been
+    released and can no longer be seeked to.
+    """
     def __init__(self, iterator):
         self.iterator = iterator
-        self.buffer = []
+        self.buffer = deque()
+        self.base = 0
         self.offset = 0
         self.last = None
 
     @property
     def position(self):
-        return self.last.end if self.last else 0
+        return self.last.end if self.last is not None else 0
 
     def __next__(self):
-        if self.offset == len(self.buffer):
+        index = self.offset - self.base
+        if index == len(self.buffer):
             item = next(self.iterator)
             self.buffer.append(item)
         else:
-            item = self.buffer[self.offset]
+            item = self.buffer[index]
         self.offset += 1
-        self.last = None
+        self.last = item
         return item
 
+    def peek(self):
+        index = self.offset - self.base
+        if index == len(self.buffer):
+            try:
+                self.buffer.append(next(self.iterator))
+            except StopIteration:
+                return None
+        return self.buffer[index]
+
+    def peek_symbol(self):
+        item = self.peek()
+        return None if item is None else item.symbol
+
     def tell(self):
         return self.offset
 
     def seek(self, offset):
-        if offset < len(self.buffer):
+        index = offset - self.base
+        if index < 0:
+            raise IndexError('cannot seek to released offset {0}'.format(offset))
+        if index < len(self.buffer):
             self.offset = offset
-            self.last = self.buffer[offset - 1] if offset > 0 else None
+            self.last = self.buffer[index - 1] if index > 0 else None
         else:
             while self.offset != offset:
-                self.last = next(self)
+                next(self)
+
+    def release(self, offset):
+        """
+        Drops buffered items before `offset`. The item right before it is
+        kept, so that `seek(offset)` still knows the last item.
+        """
+        buffer = self.buffer
+        count = min(offset - 1 - self.base, len(buffer))
+        for _ in range(count):
+            buffer.popleft()
+        if count > 0:
+            self.base += count
+
+
+class TokenArrayCursor(object):
+    """
+    Provides the `RandomAccessIterator` interface over a `TokenArray` and
+    matches terminals by comparing their kinds, looked up by terminal id in
+    `kind_ids`.
+    """
+    def __init__(self, tokens, kind_ids):
+        self.tokens = tokens
+        self.kinds = tokens.kinds
+        self.kind_ids = kind_ids
+        self.length = len(tokens)
+        self.base = 0
+        self.offset = 0
+
+    @property
+    def last(self):
+        return self.tokens[self.offset - 1] if self.offset else None
+
+    @property
+    def position(self):
+        return self.tokens.ends[self.offset - 1] if self.offset else 0
+
+    def __next__(self):
+        offset = self.offset
+        if offset == self.length:
+            raise StopIteration
+        self.offset = offset + 1
+        return self.tokens[offset]
+
+    def read_terminal(self, terminal):
+        offset = self.offset
+        if self.kinds[offset] != self.kind_ids.get(id(terminal)):
+            return None
+        self.offset = offset + 1
+        return self.tokens[offset]
+
+    def peek(self):
+        return self.tokens[self.offset] if self.offset < self.length else None
+
+    def peek_symbol(self):
+        kind = self.kinds[self.offset]
+        return None if kind < 0 else self.tokens.terminals[kind]
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, offset):
+        self.offset = offset
+
+    def release(self, offset):
+        pass
+
+
+def located_tokens(tokens, source):
+    """
+    Yields `tokens` with their `source` set, see `Token.position`.
+    """
+    for token in tokens:
+        token.source = source
+        yield token
 
 
 class Parser(object):
     StackEntry = namedtuple('StackEntry', ['symbol', 'generator', 'offset'])
+    # what symbols yield as a match, anything else is a symbol to match
+    node_types = (Node,)
 
-    def __init__(self, grammar, source, detect_left_recursion=False):
+    def __init__(self, grammar, source, detect_left_recursion=False, memo=None, buffer_size=1024, tokens=None, compact=False,
+                 transform=False):
         self.grammar = grammar
+        # tokens only get positions if `source` is a `Source`, errors always
+        located = isinstance(source, Source)
+        if located:
+            self.located_source = source
+            source = source.buffer
+        else:
+            self.located_source = Source(source) if isinstance(source, str) else None
         self.source = source
         self.stack = []
-        self.tokens = RandomAccessIterator(grammar.tokenize(source))
-        self._cache = {}
+        if tokens is None:
+            tokens = grammar.tokenize_array(source) if compact else grammar.tokenize(source)
+        if located:
+            if isinstance(tokens, TokenArray):
+                tokens.token_source = self.located_source
+            else:
+                tokens = located_tokens(tokens, self.located_source)
+        if isinstance(tokens, TokenArray):
+            self.tokens = TokenArrayCursor(tokens, grammar.kind_ids)
+            self.read_terminal = self.tokens.read_terminal
+            buffer_size = None
+        else:
+            self.tokens = RandomAccessIterator(iter(tokens))
+        self.buffer_size = buffer_size
+        self.release_threshold = buffer_size
+        self._cache = Memo() if memo is None else memo
         self.detect_left_recursion = detect_left_recursion
+        # `(symbol, offset)` pairs on the stack, and the heads of left
+        # recursions that are currently being grown
+        self.active = set()
+        self.heads = {}
+        # the stack indices of the `OneOf` entries that a cut committed to
+        # their current alternative, innermost last, see `commit()`
+        self.cuts = []
+        self.failure_offset = -1
+        self.expected = []
+        self.raised_error = None
+        # set by `run_recovering()`
+        self.recovering = False
+        self.errors = []
+        # the next step of an interrupted parse, see `resume()`
+        self.suspended = None
+        # whether transforms are applied as soon as a node is complete
+        self.transform = transform
+        # the memo size above which `release_memo()` releases entries
+        self.memo_threshold = 0
 
     def read(self):
+        tokens = self.tokens
+        if self.buffer_size is not None and len(tokens.buffer) > self.release_threshold:
+            self.release_tokens()
         try:
-            return next(self.tokens)
+            return next(tokens)
         except StopIteration:
-            raise ParseError('unexpected end of file', self.tokens.offset)
+            return None
+
+    def read_terminal(self, terminal):
+        """
+        Reads the next token and returns it if it is a `terminal`, or None.
+        """
+        token = self.read()
+        if token is None or token.symbol != terminal:
+            return None
+        return token
+
+    def backtrack_offset(self):
+        """
+        Returns the lowest token offset the parser may still seek back to:
+        the start of the lowest stack entry whose failure would be handled by
+        its parent instead of failing the whole parse, or of the outermost
+        entry that seeks back after success, such as a `Lookahead`.
+        """
+        stack = self.stack
+        cuts = self.cuts
+        for index, parent in enumerate(stack):
+            if parent.symbol.seeks_back:
+                return parent.offset
+            if index + 1 == len(stack):
+                break
+            if (parent.symbol, parent.offset) in self.heads:
+                # a left recursion is grown by reparsing from its start
+                return parent.offset
+            if parent.symbol.backtracks and index not in cuts:
+                return stack[index + 1].offset
+        return self.tokens.offset
+
+    def release_tokens(self):
+        self.tokens.release(self.backtrack_offset())
+        self.release_threshold = len(self.tokens.buffer) + self.buffer_size
+
+    def release_memo(self, steps):
+        """
+        Called between chunks of `steps` parse steps. Releases the memo
+        entries before `backtrack_offset()` whenever the memo has doubled in
+        size, since releasing copies the entries that are kept.
+        """
+        memo = self._cache
+        release = getattr(memo, 'release', None)
+        if release is not None and len(memo) > self.memo_threshold:
+            release(self.backtrack_offset())
+            self.memo_threshold = 2 * len(memo) + steps
+
+    def fail(self, expected, offset):
+        """
+        Records that `expected` did not match at token `offset` and returns
+        `no_match`. Only the farthest failures are kept, they are turned into
+        a `ParseError` if the whole parse fails.
+        """
+        if offset > self.failure_offset:
+            self.failure_offset = offset
+            self.expected = [expected]
+        elif offset == self.failure_offset:
+            self.expected.append(expected)
+        return no_match
+
+    def error(self):
+        if not self.expected and self.raised_error:
+            return self.locate(self.raised_error)
+        expected = describe_expected(self.expected)
+        self.tokens.seek(max(self.failure_offset, 0))
+        token = self.peek()
+        if token is not None:
+            return self.locate(UnexpectedToken(token, expected))
+        last = self.tokens.last
+        return self.locate(ParseError('unexpected end of file, expected {0}'.format(expected), last.end if last is not None else 0))
+
+    def locate(self, error):
+        """
+        Gives `error` the source, for its `line` and `column`.
+        """
+        if error.source is None:
+            error.source = self.located_source
+        return error
+
+    def commit(self):
+        """
+        Called by `cut`. Commits the innermost `OneOf` on the stack to its
+        current alternative: if the alternative fails, the `OneOf` fails too
+        instead of trying the others. The commit ends when the `OneOf` entry
+        is popped. Memo entries and buffered tokens before
+        `backtrack_offset()`, which nothing can seek back to any more, are
+        released. Cuts inside a `Lookahead` or a left recursion, which seek
+        back after success, do not commit.
+        """
+        if self.heads:
+            return
+        stack = self.stack
+        for index in range(len(stack) - 1, -1, -1):
+            symbol = stack[index].symbol
+            if symbol.seeks_back:
+                return
+            if isinstance(symbol, OneOf):
+                break
+        else:
+            return
+        cuts = self.cuts
+        if cuts and cuts[-1] == index:
+            return
+        cuts.append(index)
+        offset = self.backtrack_offset()
+        release = getattr(self._cache, 'release', None)
+        if release is not None:
+            release(offset)
+        if self.buffer_size is not None:
+            self.tokens.release(offset)
+
+    def recover(self, symbol, offset):
+        """
+        Called by the `Recover` `symbol` in recovery mode after its child
+        failed to match at token `offset`. Records the error, skips to the
+        next sync terminal and returns an `ErrorNode`, or `no_match` if the
+        child is simply not there. The sync token is skipped as well unless
+        it may follow `symbol`.
+        """
+        follow = self.grammar.recover_follow.get(symbol)
+        if self.failure_offset <= offset:
+            terminal = self.peek_symbol()
+            if terminal is None or follow is None or terminal in follow:
+                return no_match
+            self.failure_offset, self.expected = offset, [symbol.symbol]
+        error = self.error()
+        self.errors.append(error)
+        node = ErrorNode(symbol, offset, error)
+        while True:
+            token = self.peek()
+            if token is None:
+                break
+            sync = symbol.synchronizes(token.symbol)
+            if sync and follow is not None and token.symbol in follow:
+                # a separator, which is left for the enclosing symbol
+                break
+            node.tokens.append(self.read())
+            if sync:
+                break
+        self.failure_offset = -1
+        self.expected = []
+        self.raised_error = None
+        return node
+
+    def peek(self):
+        return self.tokens.peek()
+
+    def peek_symbol(self):
+        """
+        Returns the terminal of the next token, or None at the end of input.
+        """
+        return self.tokens.peek_symbol()
 
     def backtrack(self, node):
         self.tokens.seek(node.offset)
@@ -64,55 +364,267 @@ class Parser(object):
     def node(self, symbol, token=None, offset_diff=0):
         return Node(symbol, self.tokens.offset + offset_diff, token=token)
 
-    def push(self, symbol):
-        if self.stack and self.detect_left_recursion:
-            for entry in self.stack:
-                if entry.offset == self.tokens.tell() and entry.symbol == symbol:
-                    raise LeftRecursion()
+    def complete(self, node):
+        """
+        Applies the transform of the complete `node` to the values of its
+        children and returns a `ValueNode` in its place. Token nodes are
+        kept and transformed with their parent. So are nodes of dropped
+        symbols, and nodes of flattened symbols, whose children are added to
+        the parent instead.
+        """
+        symbol = node.symbol
+        if node.token is not None or symbol is None or symbol.flatten or symbol.drop:
+            return node
+        if node.__class__ is ValueNode:
+            if node.transformed_by is not symbol:
+                # renamed by an `Alias`, which transforms the value of its symbol
+                node.value = symbol.transform(node.value)
+                node.transformed_by = symbol
+            return node
+        values = []
+        for child in symbol.transform_children(node):
+            if child.__class__ is ValueNode:
+                values.append(child.value)
+            elif child.token is not None:
+                values.append(child.symbol.apply_transform(child, ()))
+            else:
+                values.append(transformed(child))
+        return ValueNode(symbol, node.offset, symbol.apply_transform(node, values), bool(node))
 
-        #print("push", symbol)
+    def result(self, node):
+        return transformed(node) if self.transform else node
+
+    def push(self, symbol):
+        offset = self.tokens.tell()
+        self.active.add((symbol, offset))
         entry = self.StackEntry(
             symbol=symbol,
             generator=symbol(self),
-            offset=self.tokens.tell(),
+            offset=offset,
         )
         self.stack.append(entry)
-        #print('stack =\n  -', '\n  - '.join(str(e.symbol) for e in self.stack))
+        return next(entry.generator)
+
+    def pop(self, node):
+        """
+        Removes the top stack entry after it yielded `node`, or `no_match`.
+        """
+        top = self.stack.pop()
+        self.active.discard((top.symbol, top.offset))
+        cuts = self.cuts
+        if cuts and cuts[-1] == len(self.stack):
+            cuts.pop()
+        return top
+
+    def recurse(self, key):
+        """
+        Called when `key` is requested while it is already being parsed at
+        the same offset, i.e. on left recursion. Makes `key` the head of the
+        recursion and returns its current seed, initially `no_match`. Every
+        rule between the head and the recursive call depends on the seed.
+        """
+        if self.detect_left_recursion:
+            raise LeftRecursion()
+        head = self.heads.get(key)
+        if head is None:
+            head = self.heads[key] = LeftRecursionHead()
+        self.involve(head, key)
+        return head.seed
+
+    def involve(self, head, key):
+        for entry in reversed(self.stack):
+            if (entry.symbol, entry.offset) == key:
+                break
+            head.involved.add(entry.symbol)
+
+    def recall(self, key):
+        # a memoized rule that depends on a seed makes its callers depend on
+        # it too
+        for head_key, head in self.heads.items():
+            if head_key[1] == key[1] and key[0] in head.involved:
+                self.involve(head, head_key)
+
+    def grow(self, top):
+        """
+        Reparses the head `top` of a left recursion after its seed was
+        updated, with the results that depend on the old seed forgotten.
+        """
+        head = self.heads[top.symbol, top.offset]
+        for symbol in head.involved:
+            self._cache.pop((symbol, top.offset), None)
+        self.tokens.seek(top.offset)
+        entry = self.StackEntry(
+            symbol=top.symbol,
+            generator=top.symbol(self),
+            offset=top.offset,
+        )
+        self.stack[-1] = entry
         return next(entry.generator)
 
     def run(self, limit=None):
-        func, arg = self.push, self.grammar.start
+        if self.transform and limit is None:
+            node = self.parse_releasing(self.grammar.start)
+        else:
+            node = self.parse(self.grammar.start, limit=limit)
+        error = self.junk_error()
+        if error is not None:
+            raise error
+        return self.result(node)
+
+    def junk_error(self):
+        junk = self.read()
+        if junk is None:
+            return None
+        if self.failure_offset >= self.tokens.offset - 1:
+            # a failed attempt got further than the end of the match
+            return self.error()
+        return self.locate(ParseError('unparsed junk: {0}'.format(junk), junk.start))
+
+    def run_recovering(self):
+        """
+        Parses in recovery mode, where `Recover` symbols replace failed
+        matches with `ErrorNode`s, and returns the root node together with
+        the list of all errors. The root node is None if an error was not
+        recovered from.
+        """
+        self.recovering = True
+        try:
+            node = self.parse(self.grammar.start)
+        except ParseError as error:
+            self.errors.append(error)
+            return None, self.errors
+        error = self.junk_error()
+        if error is not None:
+            self.errors.append(error)
+        return self.result(node), self.errors
+
+    def run_iter(self, symbol):
+        """
+        Parses `symbol` repeatedly until the input is exhausted and yields
+        each match as soon as it is complete. Memo entries and tokens of
+        finished matches are released.
+        """
+        while self.peek() is not None:
+            offset = self.tokens.offset
+            node = self.parse(symbol)
+            if self.tokens.offset == offset:
+                junk = self.read()
+                raise self.locate(ParseError('unparsed junk: {0}'.format(junk), junk.start))
+            yield self.result(node)
+            self._cache.clear()
+            self.tokens.release(self.tokens.offset)
+            self.failure_offset = -1
+            self.expected = []
+
+    def parse(self, symbol, limit=None):
+        """
+        Matches `symbol` at the current offset and returns its node.
+
+        Left recursion is handled by growing a seed (Warth et al.): the
+        recursive call first fails, then the head is parsed again with its
+        previous result as the recursive match for as long as the match gets
+        longer.
+        """
+        self.suspended = self.push, symbol
+        return self.resume(limit)
+
+    def parse_releasing(self, symbol, steps=1024):
+        """
+        Like `parse()`, but releases memo entries that can no longer be used
+        after every `steps` parse steps. Only worthwhile if the matches do not
+        keep their children alive anyway, as with `transform=True`.
+        """
+        self.suspended = self.push, symbol
+        node = self.resume(steps)
+        while self.suspended is not None:
+            self.release_memo(steps)
+            node = self.resume(steps)
+        return node
+
+    def resume(self, limit=None):
+        """
+        Continues the parse started by `parse()`. If it is interrupted after
+        `limit` steps, `suspended` holds the next step, otherwise it is None.
+        """
+        heads = self.heads
+        node_types = self.node_types
+        transform = self.transform
+        func, arg = self.suspended
         n = 0
         while limit is None or n < limit:
             n += 1
             try:
                 arg, offset = func(arg), self.tokens.tell()
             except ParseError as error:
-                self.tokens.seek(self.stack[-1].offset)
-                self.stack.pop()
-                if not self.stack:
-                    raise
-                func, arg = self.stack[-1].generator.throw, error
-                continue
+                # custom symbols may still raise instead of yielding no_match
+                self.raised_error = error
+                arg = no_match
+
+            if arg is no_match:
+                top = self.stack[-1]
+                head = heads.pop((top.symbol, top.offset), None) if heads else None
+                if head is not None and head.seed is not no_match:
+                    # growing the seed failed, the last seed is the result
+                    arg, offset = head.seed
+                    self.tokens.seek(offset)
+                else:
+                    self.pop(no_match)
+                    if not self.stack:
+                        raise self.error()
+                    self.tokens.seek(top.offset)
+                    if self.cuts and self.cuts[-1] == len(self.stack) - 1:
+                        # the parent is committed to the alternative that
+                        # failed, so it fails as well
+                        func, arg = identity, no_match
+                        continue
+                    func = self.stack[-1].generator.send
+                    continue
 
-            if isinstance(arg, Node):
+            if isinstance(arg, node_types):
+                if transform:
+                    arg = self.complete(arg)
                 top = self.stack[-1]
-                self._cache[top.symbol, top.offset] = arg, offset
-                self.stack.pop()
+                key = top.symbol, top.offset
+                head = heads.get(key) if heads else None
+                if head is not None:
+                    if head.seed is no_match or offset > head.seed[1]:
+                        head.seed = arg, offset
+                        func, arg = self.grow, top
+                        continue
+                    del heads[key]
+                    arg, offset = head.seed
+                    self.tokens.seek(offset)
+                self._cache[key] = arg, offset
+                self.pop(arg)
                 if not self.stack:
                     break
             else:
+                key = arg, offset
                 try:
-                    arg, offset = self._cache[arg, offset]
+                    arg, offset = self._cache[key]
                 except KeyError:
-                    func = self.push
-                    continue
+                    if key not in self.active:
+                        func = self.push
+                        continue
+                    arg = self.recurse(key)
+                    if arg is no_match:
+                        func = self.stack[-1].generator.send
+                        continue
+                    arg, offset = arg
+                else:
+                    if heads:
+                        self.recall(key)
                 self.tokens.seek(offset)
             func = self.stack[-1].generator.send
+        self.suspended = (func, arg) if self.stack else None
+        return arg
 
-        try:
-            junk = self.read()
-        except ParseError:
-            return arg
-        raise ParseError('unparsed junk: {0}'.format(junk), junk.start)
 
+class LeftRecursionHead(object):
+    """
+    The state of a left recursion that is being grown: the longest match so
+    far as `(node, end_offset)`, and the symbols whose results depend on it.
+    """
+    def __init__(self):
+        self.seed = no_match
+        self.involved = set()
@@ -0,0 +1,138 @@
+"""
+Per-rule profiling of a parse.
+
+`ProfilingParser` is a `Parser` that counts, for each symbol, how often it
+was invoked, matched and failed, how often its memo entries were found or
+missing, how many tokens it gave back when it failed, and the time spent in
+it. The plain `Parser` has none of this bookkeeping.
+"""
+from time import perf_counter
+
+from rdp.formatter import GrammarFormatter
+from rdp.memo import Memo
+from rdp.parser import Parser
+from rdp.symbols import no_match
+
+
+class RuleProfile(object):
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.invocations = 0
+        self.successes = 0
+        self.failures = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        # tokens consumed before failing, which are read again by whatever
+        # is tried next
+        self.backtracked_tokens = 0
+        # time between push and pop, not counting recursive invocations twice
+        self.time = 0.0
+
+    @property
+    def name(self):
+        if self.symbol.name:
+            return self.symbol.name
+        formatter = GrammarFormatter()
+        formatter.depth = 0
+        try:
+            return formatter.format_symbol(self.symbol)
+        except TypeError:
+            return repr(self.symbol)
+
+    def __repr__(self):
+        return '<RuleProfile {0} invocations={1} time={2:.6f}>'.format(self.name, self.invocations, self.time)
+
+
+class Profile(object):
+    columns = ['invocations', 'successes', 'failures', 'memo_hits', 'memo_misses', 'backtracked_tokens', 'time']
+
+    def __init__(self):
+        self.rules = {}
+
+    def rule(self, symbol):
+        try:
+            return self.rules[symbol]
+        except KeyError:
+            rule = self.rules[symbol] = RuleProfile(symbol)
+            return rule
+
+    def report(self, key='time'):
+        """
+        Returns the `RuleProfile` of each symbol, most expensive first by the
+        column `key`.
+        """
+        return sorted(self.rules.values(), key=lambda rule: getattr(rule, key), reverse=True)
+
+    def format(self, key='time', limit=None):
+        rows = [[rule.name] + [str(getattr(rule, column)) for column in self.columns[:-1]] + [
+            '{0:.6f}'.format(rule.time)
+        ] for rule in self.report(key)[:limit]]
+        header = ['symbol'] + self.columns
+        widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+        return '\n'.join(
+            '  '.join(cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths)))
+            for row in [header] + rows
+        )
+
+
+class ProfilingMemo(object):
+    """
+    Counts lookups in `memo` as hits or misses of the looked up symbol.
+    """
+    def __init__(self, memo, profile):
+        self.memo = memo
+        self.profile = profile
+
+    def __getitem__(self, key):
+        try:
+            value = self.memo[key]
+        except KeyError:
+            self.profile.rule(key[0]).memo_misses += 1
+            raise
+        self.profile.rule(key[0]).memo_hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self.memo[key] = value
+
+    def __contains__(self, key):
+        return key in self.memo
+
+    def __len__(self):
+        return len(self.memo)
+
+    def __iter__(self):
+        return iter(self.memo)
+
+    def __getattr__(self, name):
+        return getattr(self.memo, name)
+
+
+class ProfilingParser(Parser):
+    def __init__(self, grammar, source, memo=None, **kwargs):
+        self.profile = Profile()
+        memo = ProfilingMemo(Memo() if memo is None else memo, self.profile)
+        super().__init__(grammar, source, memo=memo, **kwargs)
+        self.started = []
+        self.depths = {}
+
+    def push(self, symbol):
+        rule = self.profile.rule(symbol)
+        rule.invocations += 1
+        self.depths[symbol] = self.depths.get(symbol, 0) + 1
+        self.started.append(perf_counter())
+        return super().push(symbol)
+
+    def pop(self, node):
+        top = super().pop(node)
+        elapsed = perf_counter() - self.started.pop()
+        rule = self.profile.rule(top.symbol)
+        if node is no_match:
+            rule.failures += 1
+            rule.backtracked_tokens += self.tokens.offset - top.offset
+        else:
+            rule.successes += 1
+        depth = self.depths[top.symbol] = self.depths[top.symbol] - 1
+        if not depth:
+            rule.time += elapsed
+        return top
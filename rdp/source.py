@@ -1,46 +1,120 @@
+import re
+from array import array
+from bisect import bisect_right
+from functools import partial
+from itertools import repeat
+from operator import methodcaller, add, sub
+
 
 class Source:
+    """
+    A source string with a line index, which is built on first use. Parse a
+    `Source` instead of a string to get the `line` and `column` of tokens
+    and nodes.
+    """
     def __init__(self, s):
         if hasattr(s, 'read'):
             s = s.read()
         self.buffer = s
-        self.line_numbers = LineNumberTable(s)
+        self._line_numbers = None
+
+    @property
+    def line_numbers(self):
+        if self._line_numbers is None:
+            self._line_numbers = LineNumberTable(self.buffer)
+        return self._line_numbers
+
+    def position(self, offset):
+        return self.line_numbers.position(offset)
+
+    def positions(self, offsets):
+        return self.line_numbers.positions(offsets)
+
+    def token_positions(self, tokens):
+        """
+        Returns the lines and the columns of the starts of `tokens`, a list of
+        tokens or a `TokenArray`, as two arrays.
+        """
+        starts = getattr(tokens, 'starts', None)
+        if starts is None:
+            starts = array('i', [token.start for token in tokens])
+        return self.positions(starts)
+
+    def __len__(self):
+        return len(self.buffer)
 
     def __str__(self):
         return self.buffer
 
 
+class Positioned:
+    """
+    Provides `line` and `column` for classes with a `position` property that
+    returns `(line, column)`, or None if the source is unknown.
+    """
+    @property
+    def line(self):
+        position = self.position
+        return None if position is None else position[0]
+
+    @property
+    def column(self):
+        position = self.position
+        return None if position is None else position[1]
+
+
 class LineNumberTable:
+    """
+    The start offset of each line of a string, stored in an array. Lines and
+    columns are numbered from 1.
+    """
     def __init__(self, s):
         self.size = len(s)
-        self.table = []
-        start = 0
-        while True:
-            end = s.find('\n', start) + 1
-            if not end:
-                break
-            self.table.append(range(start, end))
-            start = end
+        self.starts = array('i', [0])
+        self.starts.extend(map(methodcaller('end'), re.finditer('\n', s)))
 
-    def get_line(self, offset):
-        if not (0 <= offset < self.size):
+    def __len__(self):
+        return len(self.starts)
+
+    def check(self, offset):
+        # the end of the source is a valid position, e.g. for errors at EOF
+        if not (0 <= offset <= self.size):
             raise IndexError("offset outside source: {0}".format(offset))
 
-        lo, hi = 0, len(self.table)
-        index, line = -1, range(0)
-        while lo < hi:
-            index = (lo + hi) // 2
-            line = self.table[index]
-            if offset >= line.stop:
-                lo = index
-            elif offset < line.start:
-                hi = index
-            elif offset in line:
-                return index, line
-            else:
-                assert False
+    def get_line(self, offset):
+        """
+        Returns the index of the line containing `offset` and the range of its
+        offsets, including the newline.
+        """
+        self.check(offset)
+        index = bisect_right(self.starts, offset) - 1
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else self.size
+        return index, range(self.starts[index], end)
 
-    def __getitem__(self, offset):
-        index, line = self.get_line(offset)
-        return index + 1
+    def position(self, offset):
+        """
+        Returns the `(line, column)` of `offset`.
+        """
+        self.check(offset)
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+    def positions(self, offsets):
+        """
+        Returns the lines and the columns of all `offsets` as two arrays. The
+        lookups run in C, without a Python call per offset. Offsets are not
+        checked.
+        """
+        if not isinstance(offsets, array):
+            offsets = array('i', offsets)
+        # `bisect` on a list does not create an int object for every probe
+        starts = self.starts.tolist()
+        lines = array('i', map(partial(bisect_right, starts), offsets))
+        # the offset before column 1, by line number
+        bases = [0]
+        bases.extend(map(add, starts, repeat(-1)))
+        columns = array('i', map(sub, offsets, map(bases.__getitem__, lines)))
+        return lines, columns
 
+    def __getitem__(self, offset):
+        return self.position(offset)[0]
@@ -1,11 +1,15 @@
 import re
 import abc
+import sys
+import pickle
+import inspect
+import functools
 from collections import deque
 from copy import copy
 
 from rdp.ast import Node
-from rdp.exceptions import ParseError, UnexpectedToken
-from rdp.utils import chain
+from rdp.exceptions import InvalidGrammar
+from rdp.utils import chain, identity
 
 
 def to_symbol(str_or_symbol, copy_if_not_created=False):
@@ -42,13 +46,63 @@ def group(symbol):
     return symbol
 
 
+class NoMatch(object):
+    """
+    Sent to and yielded by symbols in place of a node when a match fails.
+    """
+    def __repr__(self):
+        return '<no match>'
+
+
+no_match = NoMatch()
+
+
+def describe_expected(symbols):
+    names = set()
+    for symbol in symbols:
+        if isinstance(symbol, Terminal) or symbol.name:
+            names.add(str(symbol))
+        elif symbol.first:
+            names.update(str(terminal) for terminal in symbol.first)
+    return ' or '.join(sorted(names)) or 'a match'
+
+
+def union_first(a, b):
+    # `None` stands for "any terminal" and absorbs everything else
+    if a is None or b is None:
+        return None
+    return a | b
+
+
 class Symbol(metaclass=abc.ABCMeta):
+    # whether the symbol may try something else after a child failed to
+    # match, instead of failing itself
+    backtracks = True
+    # whether the symbol seeks back to its start after a child matched
+    seeks_back = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        apply_transform = cls.__dict__.get('apply_transform')
+        if apply_transform is not None and len(inspect.signature(apply_transform).parameters) == 2:
+            # an override of the older `apply_transform(node)`, which
+            # transforms the children itself
+            @functools.wraps(apply_transform)
+            def apply_node_transform(self, node, values):
+                return apply_transform(self, node)
+
+            cls.apply_transform = apply_node_transform
+            if 'transform_children' not in cls.__dict__:
+                cls.transform_children = Symbol.transform_children
+
     def __init__(self, name=None):
         self.flatten = False
-        self.transform = lambda x: x
+        self.transform = identity
         self.drop = None
         self.position = -1
         self._name = name
+        self.first = frozenset()
+        self.nullable = False
 
     def named(self, name):
         if self._name:
@@ -91,22 +145,54 @@ class Symbol(metaclass=abc.ABCMeta):
         return NonEmpty(self)
 
     def iter(self):
+        # symbols are visited by identity: terminals and proxies compare equal
+        # to distinct symbols that may carry different flags
         visited = set()
         next_symbols = deque([self])
         while next_symbols:
             next_symbol = next_symbols.popleft()
-            if next_symbol in visited:
+            if id(next_symbol) in visited:
                 continue
             yield next_symbol
-            visited.add(next_symbol)
+            visited.add(id(next_symbol))
             next_symbols.extend(next_symbol)
 
     def terminals(self):
         return (symbol for symbol in self.iter() if isinstance(symbol, Terminal))
 
-    def apply_transform(self, node):
+    def transform_children(self, node):
+        """
+        Returns the children of `node` whose transformed values are passed
+        to `apply_transform()`.
+        """
+        return ()
+
+    def apply_transform(self, node, values):
+        """
+        Returns the transformed value of `node`, given the `values` of the
+        children from `transform_children()`. Subclasses may still override
+        it as `apply_transform(self, node)`, then no values are passed and
+        the override calls `child.transform()` itself.
+        """
         return self.transform(node)
 
+    def compute_first(self):
+        """
+        Returns a `(first, nullable)` pair computed from the current estimates
+        of the child symbols. `first` is `None` if the symbol may start with
+        any terminal, which is the safe answer for unknown symbol types.
+        """
+        return None, True
+
+    def compute_follow(self, follow):
+        """
+        Returns `(child, follow)` pairs: the terminals that may follow each
+        child symbol, given the terminals in `follow` that may follow this
+        one. `None` stands for "any terminal", which is the safe answer for
+        unknown symbol types.
+        """
+        return [(symbol, None) for symbol in self]
+
     def is_rule(self):
         return bool(self.name)
 
@@ -116,19 +202,25 @@ class Terminal(Symbol):
         super(Terminal, self).__init__(name=name)
         self.lexeme = lexeme
         self.priority = -1
+        self.first = frozenset([self])
 
     @property
     def pattern(self):
         return re.escape(self.lexeme)
 
-    def apply_transform(self, node):
+    def apply_transform(self, node, values):
         return self.transform(node.token.lexeme)
 
+    def compute_first(self):
+        return frozenset([self]), False
+
     def __call__(self, parser):
-        token = parser.read()
-        if token.symbol != self:
-            raise UnexpectedToken(token, self)
-        yield parser.node(self, token, -1)
+        offset = parser.offset
+        token = parser.read_terminal(self)
+        if token is None:
+            yield parser.fail(self, offset)
+        else:
+            yield parser.node(self, token, -1)
 
     def __pos__(self):
         return self
@@ -152,6 +244,17 @@ class Terminal(Symbol):
     def __hash__(self):
         return hash(self.lexeme)
 
+    def __reduce_ex__(self, protocol):
+        # terminals are hashed by lexeme, so it has to be set before they are
+        # added to sets and dicts while unpickling cyclic grammars
+        return restore_terminal, (type(self), self.lexeme), self.__dict__
+
+
+def restore_terminal(cls, lexeme):
+    terminal = cls.__new__(cls)
+    terminal.lexeme = lexeme
+    return terminal
+
 
 class Marker(Terminal):
     def __init__(self, name):
@@ -164,16 +267,59 @@ class Marker(Terminal):
     def __pos__(self):
         raise InvalidGrammar('Marker symbols cannot be non-empty')
 
+    def __reduce_ex__(self, protocol):
+        # token transforms create tokens for module level markers, so those
+        # are pickled by reference to stay the same objects
+        module = sys.modules.get(pickle.whichmodule(self, self.name))
+        if self.name and getattr(module, self.name, None) is self:
+            return self.name
+        return super().__reduce_ex__(protocol)
+
 
 
 class Epsilon(Marker):
+    def __init__(self, name):
+        super().__init__(name)
+        self.first = frozenset()
+        self.nullable = True
+
+    def compute_first(self):
+        return frozenset(), True
+
     def __call__(self, parser):
         yield parser.node(self)
 
+    def __reduce_ex__(self, protocol):
+        if self is epsilon:
+            return 'epsilon'
+        return super().__reduce_ex__(protocol)
+
 epsilon = Epsilon('')
 empty_match = Node(None, None)
 
 
+class Cut(Epsilon):
+    """
+    Matches the empty string and commits the innermost enclosing `OneOf` to
+    the current alternative: if the rest of it fails, the `OneOf` fails as
+    well instead of trying the other alternatives, see `Parser.commit()`.
+    """
+    def __init__(self, name):
+        super().__init__(name)
+        self.drop = True
+
+    def __call__(self, parser):
+        parser.commit()
+        yield parser.node(self)
+
+    def __reduce_ex__(self, protocol):
+        if self is cut:
+            return 'cut'
+        return super().__reduce_ex__(protocol)
+
+cut = Cut('')
+
+
 class Regexp(Terminal):
     def __init__(self, pattern):
         if re.match(pattern, ''):
@@ -207,43 +353,101 @@ class CompoundSymbol(Symbol):
             self.repr_sep.join(repr(symbol) for symbol in self.symbols),
         )
 
-    def apply_transform(self, node):
-        return self.transform([child.transform() for child in node])
+    def transform_children(self, node):
+        return node.children
+
+    def apply_transform(self, node, values):
+        return self.transform(values)
 
 
 class OneOf(CompoundSymbol):
     repr_sep = ' | '
 
+    def __init__(self, symbols):
+        super().__init__(symbols)
+        self.dispatch = None
+        self.fallback = None
+
+    def compute_first(self):
+        first, nullable = frozenset(), False
+        for symbol in self.symbols:
+            first = union_first(first, symbol.first)
+            nullable = nullable or symbol.nullable
+        return first, nullable
+
+    def compute_follow(self, follow):
+        return [(symbol, follow) for symbol in self.symbols]
+
+    def build_dispatch_table(self):
+        """
+        Maps each terminal to the alternatives that can match a token of that
+        terminal, in their original order. Tokens that are not in the table
+        (and the end of input, keyed as `None`) can only be matched by the
+        `fallback` alternatives: those that are nullable or unpredictable.
+        """
+        self.fallback = [s for s in self.symbols if s.first is None or s.nullable]
+        self.dispatch = {None: self.fallback}
+        for symbol in self.symbols:
+            for terminal in symbol.first or ():
+                if terminal not in self.dispatch:
+                    self.dispatch[terminal] = [
+                        s for s in self.symbols if s.first is None or s.nullable or terminal in s.first
+                    ]
+
+    def alternatives(self, parser):
+        if self.dispatch is None:
+            return self.symbols
+        return self.dispatch.get(parser.peek_symbol(), self.fallback)
+
     def __call__(self, parser):
         node = parser.node(self)
-        longest_match_error = None
-        for symbol in self.symbols:
-            try:
-                child = yield symbol
+        symbols = self.alternatives(parser)
+        if not symbols:
+            yield parser.fail(self, parser.offset)
+        for symbol in symbols:
+            child = yield symbol
+            if child is not no_match:
                 node.append(child)
                 yield node
-            except ParseError as e:
-                if not longest_match_error or longest_match_error < e:
-                    longest_match_error = e
-                continue
-        raise longest_match_error
+        yield no_match
 
     def __or__(self, other):
         if self.grouped:
             return super().__or__(other)
         return self.__class__(self.symbols + [to_symbol(other)])
 
-    def apply_transform(self, node):
-        return self.transform(node.children[0].transform())
+    def transform_children(self, node):
+        return node.children[:1]
+
+    def apply_transform(self, node, values):
+        return self.transform(values[0])
 
 
 class Sequence(CompoundSymbol):
     repr_sep = ' + '
+    backtracks = False
+
+    def compute_first(self):
+        first = frozenset()
+        for symbol in self.symbols:
+            first = union_first(first, symbol.first)
+            if not symbol.nullable:
+                return first, False
+        return first, True
+
+    def compute_follow(self, follow):
+        pairs = []
+        for symbol in reversed(self.symbols):
+            pairs.append((symbol, follow))
+            follow = union_first(symbol.first, follow) if symbol.nullable else symbol.first
+        return pairs
 
     def __call__(self, parser):
         node = parser.node(self)
         for symbol in self.symbols:
             value = yield symbol
+            if value is no_match:
+                yield no_match
             node.append(value)
         yield node
 
@@ -262,6 +466,12 @@ class Repeat(Symbol):
     def __iter__(self):
         yield self.symbol
 
+    def compute_first(self):
+        return self.symbol.first, self.min_matches == 0 or self.symbol.nullable
+
+    def compute_follow(self, follow):
+        return [(self.symbol, union_first(self.symbol.first, follow))]
+
     def __pos__(self):
         if self.min_matches > 0:
             return self
@@ -273,18 +483,20 @@ class Repeat(Symbol):
         node = parser.node(self)
         n = 0
         while True:
-            try:
-                child = yield self.symbol
-                n += 1
-                node.append(child)
-            except ParseError:
+            child = yield self.symbol
+            if child is no_match:
                 break
+            n += 1
+            node.append(child)
         if n < self.min_matches:
-            raise ParseError("too few {0}".format(self.symbol))
+            yield no_match
         yield node
 
-    def apply_transform(self, node):
-        return self.transform([child.transform() for child in node])
+    def transform_children(self, node):
+        return node.children
+
+    def apply_transform(self, node, values):
+        return self.transform(values)
 
 
 def repeat(symbol, separator=None, leading=False, trailing=False, min_matches=0):
@@ -303,6 +515,8 @@ def repeat(symbol, separator=None, leading=False, trailing=False, min_matches=0)
 
 
 class SymbolWrapper(Symbol):
+    backtracks = False
+
     def __init__(self, symbol, name=''):
         super().__init__(name=name)
         self.symbol = None if symbol is None else to_symbol(symbol)
@@ -310,8 +524,17 @@ class SymbolWrapper(Symbol):
     def __iter__(self):
         yield self.symbol
 
-    def apply_transform(self, node):
-        return self.transform(self.symbol.transform())
+    def compute_first(self):
+        return self.symbol.first, self.symbol.nullable
+
+    def compute_follow(self, follow):
+        return [(self.symbol, follow)]
+
+    def transform_children(self, node):
+        return self.symbol.transform_children(node)
+
+    def apply_transform(self, node, values):
+        return self.transform(self.symbol.apply_transform(node, values))
 
 
 class SymbolProxy(SymbolWrapper):
@@ -353,23 +576,36 @@ class Alias(SymbolProxy):
 
     def __call__(self, parser):
         node = yield self.symbol
-        if node.symbol == self.symbol:
+        if node is not no_match and node.symbol == self.symbol:
             node.symbol = self
         yield node
 
 
 class Optional(SymbolWrapper):
+    backtracks = True
+
+    def compute_first(self):
+        return self.symbol.first, True
+
     def __call__(self, parser):
-        try:
-            node = yield self.symbol
-        except ParseError:
+        node = yield self.symbol
+        if node is no_match:
             node = empty_match
         yield node
 
 
 class Lookahead(SymbolWrapper):
+    seeks_back = True
+
+    def compute_first(self):
+        # the lookahead does not consume its match, so whatever follows may
+        # contribute to the FIRST set of an enclosing sequence
+        return self.symbol.first, True
+
     def __call__(self, parser):
         node = yield self.symbol
+        if node is no_match:
+            yield no_match
         parser.backtrack(node)
         yield empty_match
 
@@ -380,6 +616,187 @@ class Lookahead(SymbolWrapper):
 class NonEmpty(SymbolWrapper):
     def __call__(self, parser):
         node = yield self.symbol
-        if not node:
-            raise ParseError('non-empty match expected')
+        if node is no_match or not node:
+            yield no_match
+        yield node
+
+
+class Recover(SymbolWrapper):
+    """
+    Matches `symbol`. In recovery mode (see `Parser.run_recovering()`) a
+    failure is recorded instead, the tokens up to the next `sync` terminal
+    are skipped, and an `ErrorNode` takes the place of the match. The sync
+    token is skipped too, unless it may follow this symbol
+    (i.e. it is a separator rather than a terminator). A failure that does
+    not get past the first token, at a token that may follow this symbol, is
+    not an error: `symbol` is simply not there.
+    """
+    backtracks = True
+
+    def __init__(self, symbol, sync):
+        super().__init__(symbol)
+        self.sync = [to_symbol(terminal) for terminal in sync]
+
+    def synchronizes(self, terminal):
+        # markers all have an empty lexeme and compare equal
+        return any(
+            terminal is sync if isinstance(sync, Marker) else terminal == sync
+            for sync in self.sync
+        )
+
+    def __call__(self, parser):
+        offset = parser.offset
+        node = yield self.symbol
+        if node is no_match and parser.recovering:
+            node = parser.recover(self, offset)
+        yield node
+
+    def transform_children(self, node):
+        # matches are the nodes of `symbol`, only error nodes get here
+        return ()
+
+    def apply_transform(self, node, values):
+        return self.transform(node)
+
+
+def recover(symbol, *sync):
+    return Recover(symbol, sync)
+
+
+class Operator(SymbolWrapper):
+    """
+    An entry of an `Operators` table: the terminal `symbol` used as a
+    prefix, infix or postfix operator with binding power `power`. Its nodes
+    have the operands and the operator token as children, in source order.
+    """
+    def __init__(self, symbol, fixity, power, right=False):
+        super().__init__(symbol, name=None)
+        if not isinstance(self.symbol, Terminal):
+            raise InvalidGrammar('operators must be terminals, got {0!r}'.format(symbol))
+        self.fixity = fixity
+        self.power = power
+        self.right = right
+
+    def __call__(self, parser):
+        node = yield self.symbol
+        yield node
+
+    def binds(self, power):
+        """
+        Whether an operand between this operator and one with binding power
+        `power` on its right belongs to this operator.
+        """
+        return self.power > power or self.power == power and not self.right
+
+    def transform_children(self, node):
+        return node.children
+
+    def apply_transform(self, node, values):
+        return self.transform(values)
+
+
+def prefix(symbol, power):
+    return Operator(symbol, 'prefix', power)
+
+
+def infix(symbol, power, right=False):
+    return Operator(symbol, 'infix', power, right=right)
+
+
+def postfix(symbol, power):
+    return Operator(symbol, 'postfix', power)
+
+
+class Operators(Symbol):
+    """
+    Parses expressions of `operand` and the `operators` created by
+    `prefix()`, `infix()` and `postfix()` by precedence climbing, in a single
+    frame instead of one nested rule per precedence level. Operators with a
+    higher `power` bind tighter, infix operators with `right=True` are right
+    associative. Prefix operators are read whenever an operand is expected,
+    so their terminals should not also start an operand. Infix and postfix
+    operators are both read after an operand, so a terminal cannot be both.
+    """
+    backtracks = False
+
+    def __init__(self, operand, operators):
+        super().__init__()
+        self.operand = to_symbol(operand)
+        self.operators = list(operators)
+        self.tables = {'prefix': {}, 'infix': {}, 'postfix': {}}
+        for operator in self.operators:
+            table = self.tables[operator.fixity]
+            if operator.symbol in table:
+                raise InvalidGrammar('duplicate {0} operator {1}'.format(operator.fixity, operator.symbol))
+            table[operator.symbol] = operator
+        for symbol in self.tables['infix']:
+            if symbol in self.tables['postfix']:
+                raise InvalidGrammar('{0} cannot be both an infix and a postfix operator'.format(symbol))
+
+    def __iter__(self):
+        yield self.operand
+        yield from self.operators
+
+    def compute_first(self):
+        first = self.operand.first
+        for operator in self.tables['prefix'].values():
+            first = union_first(first, operator.symbol.first)
+        return first, self.operand.nullable
+
+    def compute_follow(self, follow):
+        prefixes = frozenset(self.tables['prefix'])
+        continuations = frozenset(self.tables['infix']) | frozenset(self.tables['postfix'])
+        operand_first = union_first(self.operand.first, prefixes)
+        pairs = [(self.operand, union_first(follow, continuations))]
+        for operator in self.operators:
+            if operator.fixity == 'postfix':
+                pairs.append((operator, union_first(follow, continuations)))
+            else:
+                pairs.append((operator, operand_first))
+        return pairs
+
+    def read_operator(self, parser, operator):
+        return parser.node(operator.symbol, parser.read_terminal(operator.symbol), -1)
+
+    def __call__(self, parser):
+        node = parser.node(self)
+        prefixes, infixes, postfixes = self.tables['prefix'], self.tables['infix'], self.tables['postfix']
+        # pending operators, with the operand left of each infix operator
+        pending = []
+        while True:
+            operator = prefixes.get(parser.peek_symbol())
+            if operator is not None:
+                pending.append((operator, None, self.read_operator(parser, operator)))
+                continue
+            operand = yield self.operand
+            if operand is no_match:
+                yield no_match
+            while True:
+                symbol = parser.peek_symbol()
+                operator = postfixes.get(symbol) or infixes.get(symbol)
+                power = -sys.maxsize if operator is None else operator.power
+                while pending and pending[-1][0].binds(power):
+                    operand = self.apply(parser, *pending.pop(), operand)
+                if operator is None or operator.fixity == 'infix':
+                    break
+                operand = self.apply(parser, operator, operand, self.read_operator(parser, operator), None)
+            if operator is None:
+                break
+            pending.append((operator, operand, self.read_operator(parser, operator)))
+        node.append(operand)
         yield node
+
+    def apply(self, parser, operator, left, operator_node, right):
+        first = left if left is not None else operator_node
+        node = parser.node(operator)
+        node.offset = first.offset
+        for child in (left, operator_node, right):
+            if child is not None:
+                node.append(child)
+        return node
+
+    def transform_children(self, node):
+        return node.children[:1]
+
+    def apply_transform(self, node, values):
+        return self.transform(values[0])
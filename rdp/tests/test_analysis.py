@@ -0,0 +1,86 @@
+import textwrap
+import unittest
+
+from rdp import GrammarBuilder, Regexp, Optional, Lookahead, epsilon, repeat, ignore, Operators, prefix, infix
+from rdp.symbols import Repeat, group
+from rdp.analysis import analyze, end_of_input
+from rdp.formatter import AnnotatedGrammarFormatter
+
+
+class AnalysisTest(unittest.TestCase):
+    def findings(self, grammar):
+        return [(finding.kind, finding.rule.name) for finding in analyze(grammar).findings]
+
+    def test_ll1_grammar(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.whitespace = Regexp(r'\s+')
+        g.array = '[' + repeat(g.value, separator=',') + ']'
+        g.value = g.number | g.array
+        grammar = g(start=g.value, tokenize=[ignore(g.whitespace)])
+
+        analysis = analyze(grammar)
+        self.assertEqual(analysis.findings, [])
+        self.assertTrue(all(rule.deterministic for rule in analysis.rules.values()))
+        self.assertEqual(
+            {t.lexeme for t in analysis.follow_set(g.number) if t is not end_of_input},
+            {',', ']'},
+        )
+        self.assertIn(end_of_input, analysis.follow_set(g.number))
+
+    def test_conflicts(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.call = g.name + '(' + ')'
+        g.index = g.name + '[' + ']'
+        g.args = Optional(g.name) + Optional(g.name)
+        g.peek = Lookahead(g.name) + g.call
+        g.expr = g.call | g.index | g.args | g.peek
+        analysis = analyze(g(start=g.expr))
+
+        self.assertFalse(analysis.rules[g.expr].deterministic)
+        self.assertFalse(analysis.rules[g.args].deterministic)
+        self.assertFalse(analysis.rules[g.peek].deterministic)
+        self.assertTrue(analysis.rules[g.call].deterministic)
+        messages = [finding.message for finding in analysis.rules[g.expr].findings]
+        self.assertIn('alternatives 1 and 2 may start with name', messages)
+        self.assertEqual(
+            [finding.message for finding in analysis.rules[g.args].findings],
+            ['the optional part and what follows may start with name'],
+        )
+        self.assertEqual([finding.kind for finding in analysis.rules[g.peek].findings], ['lookahead'])
+
+    def test_hazards(self):
+        g = GrammarBuilder()
+        g.item = Optional('x')
+        g.items = Repeat(g.item) + ';'
+        g.choice = group('a' | epsilon | 'b' + 'c')
+        g.start = g.items | g.choice + 'a'
+        g.unused = Regexp('[0-9]+') + 'u'
+        self.assertEqual(sorted(set(self.findings(g(start=g.start)))), [
+            ('conflict', 'choice'),
+            ('conflict', 'item'),
+            ('nullable-repeat', 'items'),
+            ('unreachable-alternative', 'choice'),
+            ('unreachable-rule', 'unused'),
+        ])
+
+    def test_operators(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.expr = Operators(g.number | '-', [infix('-', 1), prefix('-', 2)])
+        self.assertEqual(self.findings(g(start=g.expr)), [('conflict', 'expr')])
+
+    def test_annotated_format(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.items = repeat(g.name, separator=',')
+        g.start = 'x' | g.items + Optional(';')
+        self.assertEqual(AnnotatedGrammarFormatter()(g(start=g.start)), textwrap.dedent("""
+            name   ::=  r'[a-z]+'
+                        # LL(1), FIRST name, FOLLOW $ ',' ';'
+            items  ::=  name, {',', name} / ɛ
+                        # LL(1), nullable, FIRST name, FOLLOW $ ';'
+            start  ::=  'x' / items, (';')?
+                        # LL(1), nullable, FIRST ';' 'x' name, FOLLOW $
+        """).strip())
@@ -0,0 +1,142 @@
+import contextlib
+import io
+import sys
+import textwrap
+import unittest
+
+from rdp import GrammarBuilder, Regexp, repeat, drop, flatten, ignore
+from rdp.symbols import Sequence
+from rdp.ast import ArenaTree, ArenaNode
+
+
+class ArenaTreeTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.string = Regexp(r'"[^"]*"') >= (lambda s: s[1:-1])
+        g.array = '[' + flatten(repeat(g.value, separator=drop(','))) + ']' >= list
+        g.pair = g.string + drop(':') + g.value >= tuple
+        g.object_ = '{' + flatten(repeat(g.pair, separator=drop(','))) + '}' >= dict
+        g.value = flatten(g.number | g.string | g.array | g.object_)
+        g.whitespace = Regexp(r'\s+')
+        self.grammar = g(start=g.value, tokenize=[ignore(g.whitespace)], drop_terminals=True)
+        self.source = '{"a": [1, 2, {"b": "c"}], "d": [], "e": 3}'
+
+    def test_node_api(self):
+        node = self.grammar.parse(self.source)
+        view = self.grammar.parse(self.source, arena=True)
+        self.assertIsInstance(view, ArenaNode)
+        self.assertEqual(view.tuple_tree(), node.tuple_tree())
+        self.assertEqual(view.transform(), {'a': [1, 2, {'b': 'c'}], 'd': [], 'e': 3})
+
+        pairs = view[0]
+        self.assertEqual(pairs.symbol.name, 'object_')
+        self.assertEqual(len(pairs), 3)
+        self.assertEqual([child.symbol.name for child in pairs], ['pair'] * 3)
+        self.assertEqual(pairs[-1][0].token.lexeme, '"e"')
+        self.assertEqual(pairs[-1][0].token.start, node[0][-1][0].token.start)
+        self.assertEqual(pairs[1].parent, pairs)
+        self.assertIsNone(view.parent)
+        self.assertFalse(pairs[1][1])
+        self.assertTrue(pairs[1][0])
+
+    def test_columns(self):
+        tree = ArenaTree.from_node(self.grammar.parse('[1, "x"]'), '[1, "x"]')
+        columns = tree.columns()
+        self.assertEqual(len(tree), 4)
+        self.assertEqual(list(columns['parent']), [-1, 0, 1, 1])
+        self.assertEqual(list(columns['first_child']), [1, 2, -1, -1])
+        self.assertEqual(list(columns['next_sibling']), [-1, -1, 3, -1])
+        self.assertEqual(list(columns['start']), [-1, -1, 1, 4])
+        self.assertEqual(list(columns['end']), [-1, -1, 2, 7])
+        self.assertEqual([tree.symbols[i].name for i in columns['symbol']], ['value', 'array', 'number', 'string'])
+
+    def test_read_only(self):
+        view = self.grammar.parse('[]', arena=True)
+        with self.assertRaises(TypeError):
+            view.append(view[0])
+
+
+class TransformTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.array = '[' + flatten(repeat(g.value, separator=drop(','))) + ']' >= list
+        g.value = flatten(g.number | g.array)
+        self.grammar = g(start=g.value, drop_terminals=True)
+
+    def test_deep_tree(self):
+        depth = 5 * sys.getrecursionlimit()
+        node = self.grammar.parse('[' * depth + '1' + ']' * depth)
+        value = node.transform()
+        for _ in range(depth):
+            self.assertEqual(len(value), 1)
+            value = value[0]
+        self.assertEqual(value, 1)
+        name, (tree,) = node.tuple_tree()
+        for _ in range(depth):
+            self.assertEqual(tree[0], 'array')
+            (tree,) = tree[1]
+        self.assertEqual(tree, ('number', '1'))
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            node.print_tree()
+        self.assertEqual(len(out.getvalue().splitlines()), depth + 2)
+
+    def test_print_tree(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.grammar.parse('[[1],2]').print_tree()
+        self.assertEqual(out.getvalue(), textwrap.dedent("""\
+            <value>
+            |--- <array>
+               |--- <array>
+               |  |--- <number> '1'
+               |--- <number> '2'
+        """))
+
+    def test_memo(self):
+        calls = []
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= (lambda s: calls.append(s) or int(s))
+        g.numbers = repeat(g.number, separator=drop(','))
+        grammar = g(start=g.numbers, drop_terminals=True)
+        node = grammar.parse('1,2,3')
+
+        memo = {}
+        self.assertEqual(node.transform(memo), 1)
+        self.assertEqual(node[1].transform(memo), 2)
+        self.assertEqual(calls, ['1', '2'])
+        self.assertEqual(node.transform(), 1)
+        self.assertEqual(calls, ['1', '2', '1'])
+
+    def test_alias(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.answer = g.number
+        g.start = g.answer + drop('!') >= (lambda values: values[0] * 2)
+        grammar = g(start=g.start)
+        self.assertEqual(grammar.parse('21!').transform(), 42)
+
+    def test_pre_transform(self):
+        depth = 5 * sys.getrecursionlimit()
+        node = self.grammar.parse('[' * depth + '1' + ']' * depth)
+        self.assertEqual(len(self.grammar.pre_transform(node)), 1)
+        node = self.grammar.parse('[1,[2]]')
+        self.assertEqual(self.grammar.pre_transform(node), [child.transform() for child in node])
+
+    def test_node_only_apply_transform(self):
+        # overrides without the `values` argument transform the children
+        # themselves
+        class Pair(Sequence):
+            def apply_transform(self, node):
+                return tuple(child.transform() for child in node)
+
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.pair = Pair([g.number, drop(','), g.number, drop(';')])
+        g.pairs = repeat(g.pair) >= list
+        grammar = g(start=g.pairs)
+        self.assertEqual(grammar.parse('1,2;3,4;').transform(), [(1, 2), (3, 4)])
+        self.assertEqual(grammar.parse('1,2;3,4;', transform=True), [(1, 2), (3, 4)])
@@ -0,0 +1,51 @@
+import json
+import unittest
+
+from rdp.benchmarks import grammars, corpora, run, compare
+
+
+class BenchmarkGrammarTest(unittest.TestCase):
+    def test_json(self):
+        source = corpora.json_corpus(3000, seed=1)
+        self.assertEqual(grammars.build_json_grammar().parse(source).transform(), json.loads(source))
+
+    def test_arithmetic(self):
+        source = corpora.arithmetic_corpus(2000, seed=1)
+        # the grammar has Python's operator precedence
+        expected = [eval(line.rstrip(';')) for line in source.splitlines()]
+        self.assertEqual(grammars.build_arithmetic_grammar().parse(source).transform(), expected)
+
+    def test_indent(self):
+        grammar = grammars.build_indent_grammar()
+        source = 'x = 1\ndef f():\n    if x:\n        g(x, 2)\n    y = h()\nf()\n'
+        self.assertEqual(grammar.parse(source).transform(), [
+            ('x', 1),
+            (('def', 'f'), [
+                (('if', 'x'), [('g', 'x', 2)]),
+                ('y', ('h',)),
+            ]),
+            ('f',),
+        ])
+        self.assertTrue(grammar.parse(corpora.indent_corpus(3000, seed=1)).transform())
+
+    def test_corpus_sizes(self):
+        for corpus in (corpora.json_corpus, corpora.indent_corpus, corpora.arithmetic_corpus):
+            self.assertEqual(corpus(1000), corpus(1000))
+            self.assertGreaterEqual(len(corpus(1000)), 1000)
+            self.assertGreater(len(corpus(4000)), len(corpus(1000)))
+
+
+class BenchmarkRunnerTest(unittest.TestCase):
+    def test_run_and_compare(self):
+        results = run(['json'], sizes=[500], repeat=1)
+        self.assertEqual([result['phase'] for result in results], ['tokenize', 'parse', 'transform'])
+        for result in results:
+            self.assertGreater(result['tokens'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+
+        self.assertEqual(compare(results, results), [])
+        baseline = [dict(result, seconds=result['seconds'] / 2) for result in results]
+        regressions = compare(results, baseline, threshold=0.5)
+        self.assertEqual([(result['phase'], metric) for result, metric, old, ratio in regressions], [
+            ('tokenize', 'seconds'), ('parse', 'seconds'), ('transform', 'seconds'),
+        ])
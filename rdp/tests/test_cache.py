@@ -0,0 +1,96 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from rdp import GrammarBuilder, Regexp, repeat, drop, flatten, ignore, keep, epsilon
+from rdp.cache import cached_grammar, save_grammar, load_grammar, source_fingerprint
+from rdp.indention import indent, INDENT, DEDENT
+from rdp.utils import const
+
+
+builds = []
+
+
+def unquote(s):
+    return s[1:-1]
+
+
+def build_json_grammar():
+    builds.append(1)
+    g = GrammarBuilder()
+    g.number = Regexp(r'-?[0-9]+') >= int
+    g.string = Regexp(r'"[^"]*"') >= unquote
+    g.array = '[' + flatten(repeat(g.value, separator=drop(','))) + ']' >= list
+    g.pair = g.string + drop(':') + g.value >= tuple
+    g.object_ = '{' + flatten(repeat(g.pair, separator=drop(','))) + '}' >= dict
+    g.null = keep('null') >= const(None)
+    g.value = flatten(g.number | g.string | g.array | g.object_ | g.null)
+    g.whitespace = Regexp(r'\s+')
+    return g(start=g.value, tokenize=[ignore(g.whitespace)], drop_terminals=True)
+
+
+class GrammarCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'grammar.cache')
+        del builds[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cached_grammar(self):
+        source = '{"a": [1, null, -3], "b": {}}'
+        grammar = cached_grammar(build_json_grammar, self.path)
+        cached = cached_grammar(build_json_grammar, self.path)
+        self.assertEqual(len(builds), 1)
+        self.assertIsNot(cached, grammar)
+        self.assertEqual(cached.parse(source).transform(), {'a': [1, None, -3], 'b': {}})
+        self.assertEqual(cached.parse(source).tuple_tree(), grammar.parse(source).tuple_tree())
+        self.assertEqual(cached.parse(source, compact=True).transform(), {'a': [1, None, -3], 'b': {}})
+        self.assertEqual(cached.start.first, grammar.start.first)
+
+    def test_stale_fingerprint(self):
+        cached_grammar(build_json_grammar, self.path, fingerprint='a')
+        cached_grammar(build_json_grammar, self.path, fingerprint='a')
+        self.assertEqual(len(builds), 1)
+        cached_grammar(build_json_grammar, self.path, fingerprint='b')
+        self.assertEqual(len(builds), 2)
+        with open(self.path, 'wb') as f:
+            f.write(b'junk')
+        cached_grammar(build_json_grammar, self.path, fingerprint='b')
+        self.assertEqual(len(builds), 3)
+        self.assertEqual(source_fingerprint(build_json_grammar), source_fingerprint(build_json_grammar))
+
+    def test_depends(self):
+        dependency = os.path.join(self.directory, 'terminals.py')
+        with open(dependency, 'w') as f:
+            f.write('number = r"[0-9]+"\n')
+        cached_grammar(build_json_grammar, self.path, depends=[dependency, unittest])
+        cached_grammar(build_json_grammar, self.path, depends=[dependency, unittest])
+        self.assertEqual(len(builds), 1)
+        with open(dependency, 'w') as f:
+            f.write('number = r"[0-9]+(?:\\.[0-9]*)?"\n')
+        cached_grammar(build_json_grammar, self.path, depends=[dependency, unittest])
+        self.assertEqual(len(builds), 2)
+        self.assertNotEqual(source_fingerprint(build_json_grammar), source_fingerprint(build_json_grammar, [unittest]))
+
+    def test_markers(self):
+        g = GrammarBuilder()
+        g.whitespace = Regexp(r'\s+')
+        g.label = Regexp(r'\w+')
+        g.expr = g.label + (INDENT + repeat(g.expr) + DEDENT | drop(epsilon))
+        grammar = g(start=g.expr, tokenize=[indent(), ignore(g.whitespace)])
+        save_grammar(grammar, self.path, 'x')
+        cached = load_grammar(self.path, 'x')
+        source = 'foo\n    bar\n    baz'
+        self.assertEqual(cached.parse(source).tuple_tree(), grammar.parse(source).tuple_tree())
+
+    def test_lambda_transforms(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= (lambda s: int(s))
+        grammar = g(start=g.number)
+        with self.assertRaises((pickle.PicklingError, AttributeError)):
+            save_grammar(grammar, self.path, 'x')
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,143 @@
+import os
+import types
+import tempfile
+import unittest
+import textwrap
+from operator import itemgetter
+
+from rdp import (GrammarBuilder, flatten, repeat, Regexp, Optional, Lookahead, ParseError, InvalidGrammar, ignore, keep,
+    Operators, infix, recover, cut)
+from rdp.compiler import compile_grammar, main
+from rdp.indention import indent, INDENT, DEDENT
+from rdp.utils import product, uncurry, const
+
+
+def build_json_grammar():
+    g = GrammarBuilder()
+    g.number_literal = Regexp(r'-?(?:[1-9]\d*|0)(?:\.\d*)?(?:[eE][+-]?\d+)?') >= float
+    g.string_literal = Regexp(r'"(?:[^"]|\\(?:["\\nbfrt]|u[0-9a-fA-F]{4}))*"') >= (lambda s: s[1:-1])
+    g.array = '[' + flatten(repeat(g.expr, separator=',')) + ']' >= list
+    g.object_item = g.string_literal + ':' + g.expr >= tuple
+    g.object_ = '{' + flatten(repeat(g.object_item, separator=',')) + '}' >= dict
+    g.boolean = keep('true') | keep('false') >= (lambda s: s == 'true')
+    g.null = keep('null') >= const(None)
+    g.expr = flatten(g.number_literal | g.string_literal | g.array | g.object_ | g.boolean | g.null)
+    g.whitespace = Regexp('\\s+')
+    return g(start=g.expr, tokenize=[ignore(g.whitespace)], drop_terminals=True)
+
+
+def build_calculator_grammar():
+    signed = uncurry(lambda ops, x: x * product(-1 for s in ops if s == '-'))
+    g = GrammarBuilder()
+    g.number = Regexp(r'\d+') >= float
+    g.atom = g.number | flatten('(' + g.expr + ')' >= itemgetter(0))
+    g.signed = repeat(keep('+') | keep('-')) + g.atom >= signed
+    g.product_expr = +repeat(g.signed, separator='*') >= product
+    g.sum_expr = g.product_expr + Optional(keep('+') + g.sum_expr)
+    g.expr = Lookahead(g.signed) + g.sum_expr
+    g.whitespace = Regexp(r'[ \t]+')
+    return g(start=g.expr, tokenize=[ignore(g.whitespace)], drop_terminals=True)
+
+
+def build_block_grammar():
+    g = GrammarBuilder()
+    g.whitespace = Regexp(r'\s+')
+    g.block = INDENT + repeat(g.expr) + DEDENT
+    g.label = Regexp(r'\w+')
+    g.expr = g.label + '(' + g.expr + ')' | g.label + Optional(g.block)
+    g.exprs = repeat(g.expr)
+    return g(start=g.exprs, tokenize=[indent('(', ')'), ignore(g.whitespace)])
+
+
+json_grammar = build_json_grammar()
+calculator_grammar = build_calculator_grammar()
+block_grammar = build_block_grammar()
+
+
+def load(name):
+    module = types.ModuleType(name)
+    exec(compile_grammar(globals()[name], '{0}:{1}'.format(__name__, name)), module.__dict__)
+    return module
+
+
+def tree(node):
+    if node.token:
+        return (node.symbol, node.token.lexeme)
+    return (node.symbol, [tree(child) for child in node])
+
+
+class CompilerTest(unittest.TestCase):
+    def assert_same_parse(self, grammar, compiled, source):
+        expected = grammar.parse(source)
+        node = compiled.parse(source)
+        self.assertEqual(tree(node), tree(expected))
+        self.assertEqual(node.transform(), expected.transform())
+
+    def test_json(self):
+        compiled = load('json_grammar')
+        for source in ['42', '"foo"', '[]', '[1, 2, [3, "x"]]', '{"a": [true, false, null], "b": {}}']:
+            self.assert_same_parse(json_grammar, compiled, source)
+
+    def test_calculator(self):
+        compiled = load('calculator_grammar')
+        for source in ['42', '-+-42', '6 * 7', '(3 + 4) * 6', '6 + -6 * -6 + 1']:
+            self.assert_same_parse(calculator_grammar, compiled, source)
+
+    def test_indention(self):
+        compiled = load('block_grammar')
+        source = textwrap.dedent("""
+        foo
+            bar(x)
+            baz
+                boo
+        qux
+        """).strip()
+        expected = block_grammar.parse(source)
+        self.assertEqual(tree(compiled.parse(source)), tree(expected))
+
+    def test_errors(self):
+        compiled = load('json_grammar')
+        with self.assertRaises(ParseError):
+            compiled.parse('[1, 2')
+        with self.assertRaises(ParseError):
+            compiled.parse('[1, }')
+        with self.assertRaises(ParseError):
+            compiled.parse('[1] 2')
+
+    def test_same_errors(self):
+        cases = [
+            ('json_grammar', ['[1, 2', '[1, }', '[1] 2', '{"a" 1}', '[1, [2, {"b": ]]', '']),
+            ('calculator_grammar', ['(1 + 2', '1 + * 2', '1 2', '(1) (2)', '-']),
+            ('block_grammar', ['foo(bar', 'foo(bar) )', 'a b(c d', 'a\n  b c(d\n    \n  ']),
+        ]
+        for name, sources in cases:
+            compiled = load(name)
+            for source in sources:
+                with self.assertRaises(ParseError) as expected:
+                    globals()[name].parse(source)
+                with self.assertRaises(ParseError) as error:
+                    compiled.parse(source)
+                self.assertEqual((str(error.exception), error.exception.offset),
+                    (str(expected.exception), expected.exception.offset), source)
+
+    def test_unsupported_grammars(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.sum = g.sum + '+' + g.number | g.number
+        g.a = Optional('x') + g.b + 'y' | 'z'
+        g.b = g.a | 'w'
+        g.ops = Operators(g.number, [infix('+', 10)])
+        g.recovered = recover(g.number + ';', ';')
+        g.committed = 'let' + cut + g.number | g.number
+        for start in [g.sum, g.a, g.ops, g.recovered, g.committed]:
+            with self.assertRaises(InvalidGrammar):
+                compile_grammar(g(start=start), 'test')
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'json_parser.py')
+            main(['{0}:json_grammar'.format(__name__), '-o', path])
+            module = types.ModuleType('json_parser')
+            with open(path) as f:
+                exec(f.read(), module.__dict__)
+        self.assertEqual(module.parse('{"a": [1, 2]}').transform(), {'a': [1.0, 2.0]})
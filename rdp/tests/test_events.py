@@ -0,0 +1,93 @@
+import unittest
+
+from rdp import GrammarBuilder, Regexp, ParseError, repeat, flatten, drop
+from rdp.events import Event, EventParser
+from rdp.benchmarks import grammars, corpora
+
+
+def tree_events(node):
+    events = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Event):
+            events.append((node.kind, node.symbol.name))
+        elif node.token is not None:
+            events.append(('token', node.token.lexeme))
+        else:
+            if node.symbol.name and not node.symbol.flatten:
+                events.append(('enter', node.symbol.name))
+                stack.append(Event('exit', node.symbol, None))
+            stack.extend(reversed(node.children))
+    return events
+
+
+def simple_events(events):
+    return [(event.kind, event.token.lexeme if event.kind == 'token' else event.symbol.name) for event in events]
+
+
+class EventParserTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.pair = g.name + drop('=') + g.name
+        g.item = flatten(g.pair | g.name)
+        g.items = repeat(g.item, separator=drop(','))
+        g.list = '[' + g.items + ']'
+        self.grammar = g(start=g.list, ignore=[g.whitespace])
+
+    def test_events(self):
+        events = list(self.grammar.parse_events('[a = b, c]'))
+        self.assertTrue(all(isinstance(event, Event) for event in events))
+        self.assertEqual(simple_events(events), [
+            ('enter', 'list'),
+            ('token', '['),
+            ('enter', 'items'),
+            ('enter', 'pair'), ('token', 'a'), ('token', 'b'), ('exit', 'pair'),
+            ('token', 'c'),
+            ('exit', 'items'),
+            ('token', ']'),
+            ('exit', 'list'),
+        ])
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            list(self.grammar.parse_events('[a = , b]'))
+        with self.assertRaises(ParseError):
+            list(self.grammar.parse_events('[a] b'))
+
+    def test_left_recursion(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.sum = g.sum + '+' + g.number | g.number
+        grammar = g(start=g.sum)
+        source = '1+2+3'
+        events = simple_events(grammar.parse_events(source, steps=2))
+        self.assertEqual(events, tree_events(grammar.parse(source)))
+        self.assertEqual(events.count(('enter', 'sum')), 3)
+
+    def test_benchmark_grammars(self):
+        for build, corpus in [
+            (grammars.build_json_grammar, corpora.json_corpus),
+            (grammars.build_indent_grammar, corpora.indent_corpus),
+            (grammars.build_arithmetic_grammar, corpora.arithmetic_corpus),
+        ]:
+            grammar, source = build(), corpus(2000, seed=3)
+            expected = tree_events(grammar.parse(source))
+            for steps in (7, 1024):
+                self.assertEqual(simple_events(grammar.parse_events(source, steps=steps)), expected)
+
+    def test_streaming(self):
+        grammar = grammars.build_indent_grammar()
+        source = corpora.indent_corpus(50000, seed=1)
+        parser = EventParser(grammar, source)
+        events = parser.run_events(steps=100)
+        next(events)
+        # the first statement is passed on long before the end of the input
+        self.assertLess(parser.tokens.offset, 1000)
+        memo_sizes = []
+        for i, event in enumerate(events):
+            if i % 100 == 0:
+                memo_sizes.append(len(parser._cache))
+        self.assertLess(max(memo_sizes), 2000)
@@ -2,7 +2,7 @@ import unittest
 from operator import itemgetter
 
 from rdp import (GrammarBuilder, Grammar, flatten, drop, epsilon, repeat, Terminal,
-    Regexp, Parser, LeftRecursion, ParseError, Optional, Lookahead, ignore, keep)
+    Regexp, Parser, LeftRecursion, ParseError, Optional, Lookahead, ignore, keep, recover)
 from rdp.formatter import GrammarFormatter
 from rdp import builtins
 from rdp.utils import product, uncurry
@@ -24,3 +24,85 @@ class GrammarBuilderTest(unittest.TestCase):
         
         grammar = g(start=g.start2, tokenize=[ignore(g.whitespace)])
         self.assertEqual(grammar.parse("foo").tuple_tree(), ('start2', [('foo2', 'foo')]))
+
+
+class FirstSetTest(unittest.TestCase):
+    def test_first_sets(self):
+        g = GrammarBuilder()
+        g.a = Terminal('a')
+        g.b = Terminal('b')
+        g.opt = Optional(g.a)
+        g.seq = g.opt + g.b
+        g.items = repeat(g.seq)
+        g.start = g.items + 'c'
+        grammar = g(start=g.start)
+
+        self.assertEqual(g.opt.first, {Terminal('a')})
+        self.assertTrue(g.opt.nullable)
+        self.assertEqual(g.seq.first, {Terminal('a'), Terminal('b')})
+        self.assertFalse(g.seq.nullable)
+        self.assertTrue(g.items.nullable)
+        self.assertEqual(g.start.first, {Terminal('a'), Terminal('b'), Terminal('c')})
+        self.assertFalse(g.start.nullable)
+
+    def test_recursive_first_sets(self):
+        g = GrammarBuilder()
+        g.atom = Terminal('x') | '(' + g.expr + ')'
+        g.expr = g.atom + Optional('+' + g.expr)
+        grammar = g(start=g.expr)
+
+        self.assertEqual(g.expr.first, {Terminal('x'), Terminal('(')})
+        self.assertFalse(g.expr.nullable)
+
+    def test_dispatch_table(self):
+        g = GrammarBuilder()
+        g.x = Terminal('x')
+        g.xy = Terminal('x') + 'y'
+        g.z = Terminal('z')
+        g.start = g.x | g.xy | g.z | epsilon
+        grammar = g(start=g.start)
+
+        self.assertEqual(g.start.dispatch[Terminal('x')], [g.x, g.xy, epsilon])
+        self.assertEqual(g.start.dispatch[Terminal('z')], [g.z, epsilon])
+        self.assertEqual(g.start.dispatch[None], [epsilon])
+        self.assertEqual(g.start.fallback, [epsilon])
+
+
+class SharedSymbolTest(unittest.TestCase):
+    def test_shared_terminals(self):
+        # terminal kinds belong to the grammar, not to the terminals
+        first = Grammar(
+            start=repeat(builtins.double_quoted_string, separator=','),
+            tokenize=[ignore(builtins.whitespace)],
+        )
+        second = Grammar(
+            start=Regexp(r'[0-9]+') + ':' + builtins.double_quoted_string,
+            tokenize=[ignore(builtins.whitespace)],
+        )
+        for grammar, source in [(first, '"a", "b"'), (second, '1: "a"')]:
+            self.assertEqual(grammar.parse(source, compact=True).tuple_tree(), grammar.parse(source).tuple_tree())
+
+    def test_shared_ignored_terminal(self):
+        # a terminal that one grammar ignores and another one parses
+        comment = Regexp(r'#[a-z]*')
+        name = Regexp(r'[a-z]+')
+        second = Grammar(start=repeat(comment | name), ignore=[builtins.whitespace])
+        first = Grammar(start=repeat(name), ignore=[builtins.whitespace, comment])
+        source = 'a #b c'
+        self.assertEqual(len(first.parse(source, compact=True).children), 2)
+        self.assertEqual(second.parse(source, compact=True).tuple_tree(), second.parse(source).tuple_tree())
+
+    def test_shared_recover(self):
+        # so do the terminals that may follow a `Recover` symbol
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.number = Regexp(r'[0-9]+')
+        g.whitespace = Regexp(r'\s+')
+        g.item = recover(g.name, ',')
+        g.list_ = '[' + repeat(g.item, separator=',') + ']'
+        g.items = repeat(g.item)
+        grammar = g(start=g.list_, ignore=[g.whitespace])
+        g(start=g.items, ignore=[g.whitespace])
+        node, errors = grammar.parse_recovering('[a, 1, b]')
+        self.assertEqual([error.offset for error in errors], [4])
+        self.assertEqual(len(node.children[1].children), 5)
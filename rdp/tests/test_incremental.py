@@ -0,0 +1,154 @@
+import random
+import unittest
+
+from rdp import GrammarBuilder, Regexp, repeat, drop, flatten, ignore, ParseError, TokenizeError
+from rdp.incremental import apply_edits
+from rdp.indention import indent, INDENT, DEDENT
+
+
+def tree(node):
+    if node.token:
+        return (node.symbol, node.offset, node.token.lexeme, node.token.start)
+    return (node.symbol, node.offset, [tree(child) for child in node])
+
+
+class ApplyEditsTest(unittest.TestCase):
+    def test_damaged_region(self):
+        source, region = apply_edits('abcdefgh', [(2, 4, 'XYZ'), (0, 1, '')])
+        self.assertEqual(source, 'bXYZefgh')
+        self.assertEqual(region, (0, 4, 4))
+
+        source, region = apply_edits('abcdefgh', [(1, 2, ''), (5, 7, 'Q')])
+        self.assertEqual(source, 'acdefQ')
+        self.assertEqual(region, (1, 8, 6))
+
+
+class IncrementalParseTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.number = Regexp(r'[0-9]+') >= int
+        g.list_ = '(' + flatten(repeat(g.value, separator=drop(','))) + ')'
+        g.value = g.number | g.name | g.list_
+        g.statement = g.name + drop('=') + g.value + drop(';')
+        g.statements = repeat(g.statement)
+        g.whitespace = Regexp(r'\s+')
+        self.grammar = g(start=g.statements, tokenize=[ignore(g.whitespace)])
+        self.source = self.statements(100)
+
+    def statements(self, count):
+        return '\n'.join('x{0} = ({1}, y, (2, 3));'.format('abc'[i % 3], i) for i in range(count))
+
+    def assert_reparse(self, result, edits):
+        result = self.grammar.reparse(result, edits)
+        self.assertEqual(tree(result.tree), tree(self.grammar.parse(result.source)))
+        return result
+
+    def test_edit_inside_statement(self):
+        result = self.grammar.parse_incremental(self.source)
+        offset = self.source.index('42')
+        result = self.assert_reparse(result, [(offset, offset + 2, '4242, z')])
+        # the other statements are memo hits
+        self.assertGreaterEqual(result.reused, 99)
+        self.assertLess(result.reparsed, 20)
+
+    def test_edit_cost(self):
+        # the work per edit does not grow with the size of the input
+        results = []
+        for count in (100, 2000):
+            source = self.statements(count)
+            result = self.grammar.parse_incremental(source)
+            offset = source.index('(1,') + 1
+            results.append(self.assert_reparse(result, [(offset, offset + 1, '7')]))
+        self.assertEqual(results[0].reparsed, results[1].reparsed)
+        self.assertEqual(results[1].reused - results[0].reused, 1900)
+
+    def test_whitespace_edits(self):
+        result = self.grammar.parse_incremental(self.source)
+        statements = result.tree.children
+        result = self.assert_reparse(result, [(0, 0, '  ')])
+        result = self.assert_reparse(result, [(22, 22, '\n\n')])
+        # only the root is parsed again
+        self.assertEqual(result.reparsed, 1)
+        for a, b in zip(result.tree.children, statements):
+            self.assertIs(a, b)
+
+    def test_insert_and_delete_statements(self):
+        result = self.grammar.parse_incremental(self.source)
+        result = self.assert_reparse(result, [(0, 0, 'first = 1; ')])
+        end = len(result.source)
+        result = self.assert_reparse(result, [(end, end, ' last = (1);')])
+        offset = result.source.index('xb = (49')
+        end = result.source.index(';', offset) + 1
+        result = self.assert_reparse(result, [(offset, end, '')])
+
+    def test_token_merging_edits(self):
+        result = self.grammar.parse_incremental('a = 1; b = 2;')
+        result = self.assert_reparse(result, [(4, 5, '12'), (6, 7, '3;')])
+        self.assertEqual(result.source, 'a = 123; b = 2;')
+        result = self.assert_reparse(result, [(0, 4, 'ab=')])
+        self.assertEqual(result.source, 'ab=123; b = 2;')
+
+    def test_random_edits(self):
+        rnd = random.Random(42)
+        result = self.grammar.parse_incremental(self.source)
+        for i in range(30):
+            # replace a random statement, keeping the source valid
+            start = result.source.index(';', rnd.randrange(len(result.source) // 2)) + 1
+            end = result.source.index(';', start) + 1
+            replacement = rnd.choice(['', ' q = 7;', ' xyz = (1, (2));'])
+            result = self.assert_reparse(result, [(start, end, replacement)])
+
+    def test_failed_reparse(self):
+        source = 'a = 1;\nb = (2, 3);\nc = 4;'
+        result = self.grammar.parse_incremental(source)
+        offset = source.index('(2')
+        for edits in ([(offset, offset, '= ')], [(3, 6, '')], [(0, 0, 'x;')], [(offset, len(source), '?')]):
+            with self.assertRaises((ParseError, TokenizeError)):
+                self.grammar.reparse(result, edits)
+            # the previous result is unchanged and can be reparsed
+            self.assertEqual(result.source, source)
+            self.assertEqual(tree(result.tree), tree(self.grammar.parse(source)))
+        self.assert_reparse(result, [(0, 0, 'x = y;')])
+
+
+class IncrementalIndentionTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.assignment = g.name + '=' + g.name
+        g.block = g.name + ':' + drop(INDENT) + repeat(g.statement) + drop(DEDENT)
+        g.statement = g.block | g.assignment
+        g.statements = repeat(g.statement)
+        self.grammar = g(start=g.statements, tokenize=[indent(), ignore(g.whitespace)])
+
+    def test_reparse(self):
+        result = self.grammar.parse_incremental('a = b\nc:\n    d = e\n    f:\n        g = h\ni = j\n')
+        edits = [
+            ('f:', 0, 'x'),
+            ('    xf', 0, '    y = z\n'),
+            ('a', 0, 'k:\n    l = m\n'),
+            ('i', 0, '    '),
+            ('    i', 0, '    w = v\n'),
+            ('    w', 0, '    '),
+        ]
+        for before, length, text in edits:
+            offset = result.source.index(before)
+            result = self.grammar.reparse(result, [(offset, offset + length, text)])
+            self.assertEqual(tree(result.tree), tree(self.grammar.parse(result.source)))
+        self.assertEqual(result.source, (
+            'k:\n    l = m\na = b\nc:\n    d = e\n    y = z\n    xf:\n        g = h\n        w = v\n    i = j\n'
+        ))
+
+    def test_failed_reparse(self):
+        source = 'a = b\nc:\n    d = e\nf = g\n'
+        result = self.grammar.parse_incremental(source)
+        offset = source.index('    d')
+        end = len(source) - 2
+        for edits in ([(offset, offset + 4, '')], [(4, 6, '')], [(end, end + 1, '')]):
+            with self.assertRaises((ParseError, TokenizeError)):
+                self.grammar.reparse(result, edits)
+            self.assertEqual(tree(result.tree), tree(self.grammar.parse(source)))
+        result = self.grammar.reparse(result, [(offset, offset, '    y = z\n')])
+        self.assertEqual(tree(result.tree), tree(self.grammar.parse(result.source)))
@@ -0,0 +1,84 @@
+import unittest
+
+from rdp import GrammarBuilder, Regexp, repeat, ignore
+from rdp.memo import Memo, LRUMemo, WindowMemo
+
+
+class MemoTest(unittest.TestCase):
+    def test_peak_size(self):
+        memo = Memo()
+        for offset in range(4):
+            memo['a', offset] = offset
+        memo.release(3)
+        self.assertEqual(memo.stats(), (1, 4, 0))
+        memo.pop(('a', 3))
+        memo['b', 4] = 4
+        self.assertEqual(memo.stats(), (1, 4, 0))
+        for offset in range(5, 10):
+            memo['a', offset] = offset
+        self.assertEqual(memo.stats().peak_size, 6)
+
+
+class LRUMemoTest(unittest.TestCase):
+    def test_eviction(self):
+        memo = LRUMemo(2)
+        memo['a', 0] = 1
+        memo['b', 1] = 2
+        memo['a', 0]
+        memo['c', 2] = 3
+        self.assertEqual(set(memo), {('a', 0), ('c', 2)})
+        self.assertEqual(memo.stats(), (2, 2, 1))
+
+
+class WindowMemoTest(unittest.TestCase):
+    def test_eviction(self):
+        memo = WindowMemo(2)
+        for offset in range(5):
+            memo['a', offset] = offset
+            memo['b', offset] = offset
+        self.assertEqual(set(memo), {('a', 2), ('b', 2), ('a', 3), ('b', 3), ('a', 4), ('b', 4)})
+        self.assertEqual(memo.stats().evictions, 4)
+        memo['a', 0] = 0
+        self.assertNotIn(('a', 0), memo)
+
+    def test_removal(self):
+        memo = WindowMemo(2)
+        memo['a', 0] = 0
+        memo['b', 0] = 0
+        self.assertEqual(memo.pop(('a', 0)), 0)
+        self.assertIsNone(memo.pop(('a', 0), None))
+        del memo['b', 0]
+        # evicting offset 0 skips the removed entries
+        memo['a', 3] = 3
+        self.assertEqual(set(memo), {('a', 3)})
+        self.assertEqual(memo.stats().evictions, 0)
+
+
+class MemoPolicyParserTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.word = Regexp(r'[a-z]+')
+        g.number = Regexp(r'[0-9]+')
+        g.item = g.word + '=' + g.number | g.word + '=' + g.word
+        g.items = repeat(g.item + ';')
+        g.whitespace = Regexp(r'\s+')
+        self.grammar = g(start=g.items, tokenize=[ignore(g.whitespace)])
+        self.source = ' '.join('{0}=value; {0}={1};'.format('k' * (i % 5 + 1), i) for i in range(200))
+
+    def test_policies_build_the_same_tree(self):
+        expected = self.grammar.parse(self.source).tuple_tree()
+        for memo in [Memo(), LRUMemo(16), WindowMemo(8)]:
+            self.assertEqual(self.grammar.parse(self.source, memo=memo).tuple_tree(), expected)
+
+    def test_bounded_size(self):
+        unbounded = Memo()
+        self.grammar.parse(self.source, memo=unbounded)
+        lru = LRUMemo(16)
+        self.grammar.parse(self.source, memo=lru)
+        window = WindowMemo(8)
+        self.grammar.parse(self.source, memo=window)
+
+        self.assertLessEqual(lru.stats().peak_size, 16)
+        self.assertGreater(lru.stats().evictions, 0)
+        self.assertLess(window.stats().peak_size, unbounded.stats().size // 10)
+        self.assertGreater(window.stats().evictions, 0)
@@ -0,0 +1,102 @@
+import pickle
+import unittest
+
+from rdp import GrammarBuilder, Regexp, repeat, drop, flatten, TokenizeError
+from rdp.exceptions import UnexpectedToken
+
+
+def build_grammar(number_transform):
+    g = GrammarBuilder()
+    g.number = Regexp(r'[0-9]+') >= number_transform
+    g.list_ = '[' + flatten(repeat(g.value, separator=drop(','))) + ']' >= list
+    g.value = flatten(g.number | g.list_)
+    g.whitespace = Regexp(r'\s+')
+    return g(start=g.value, ignore=[g.whitespace], drop_terminals=True)
+
+
+grammar = build_grammar(int)
+lambda_grammar = build_grammar(lambda s: int(s) * 2)
+
+
+class ParseManyTest(unittest.TestCase):
+    sources = ['[{0}, [{1}], {2}]'.format(i, i * 2, i * 3) for i in range(40)]
+
+    def test_ordered(self):
+        results = list(grammar.parse_many(self.sources, workers=2, chunksize=3))
+        self.assertEqual(results, [[i, [i * 2], i * 3] for i in range(40)])
+
+    def test_as_completed(self):
+        results = list(grammar.parse_many(self.sources, workers=2, chunksize=3, ordered=False))
+        self.assertEqual(sorted(results), [(i, [i, [i * 2], i * 3]) for i in range(40)])
+
+    def test_trees(self):
+        trees = list(grammar.parse_many(self.sources[:5], workers=2, transform=False))
+        for source, tree in zip(self.sources, trees):
+            self.assertEqual(tree.tuple_tree(), grammar.parse(source).tuple_tree())
+            self.assertEqual(tree.transform(), grammar.parse(source).transform())
+            self.assertIs(tree.symbol, grammar.parse(source).symbol)
+
+    def test_reference(self):
+        with self.assertRaises(TypeError):
+            list(lambda_grammar.parse_many(self.sources, workers=1))
+        results = lambda_grammar.parse_many(self.sources[:3], workers=1, reference=__name__ + ':lambda_grammar')
+        self.assertEqual(list(results), [[0, [0], 0], [2, [4], 6], [4, [8], 12]])
+
+    def test_errors(self):
+        with self.assertRaises(UnexpectedToken) as cm:
+            list(grammar.parse_many(['[1]', '[1 2]'], workers=1))
+        self.assertEqual(cm.exception.offset, 3)
+        error = pickle.loads(pickle.dumps(cm.exception))
+        self.assertEqual((str(error), error.offset, error.token.lexeme), (str(cm.exception), 3, '2'))
+
+
+class ParallelTokenizerTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.string = Regexp(r'"[^"]*"')
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.start = repeat(g.number | g.string | g.name | ';')
+        self.grammar = g(start=g.start, ignore=[g.whitespace])
+        # strings span lines, so some newlines are not safe boundaries
+        self.source = ''.join(
+            'item{0} "line\n{1}\nx" {2};\n'.format(i, 'y' * (i % 7), i * 37) for i in range(300)
+        )
+
+    def assert_same_tokens(self, tokens, expected):
+        self.assertEqual(
+            [(t.symbol, t.lexeme, t.start) for t in tokens],
+            [(t.symbol, t.lexeme, t.start) for t in expected],
+        )
+        self.assertEqual(tokens.kinds[-1], -1)
+
+    def test_chunks(self):
+        expected = self.grammar.tokenize_array(self.source)
+        for chunk_size, overlap in ((40, 4096), (100, 3), (1000, 0), (10 ** 6, 10)):
+            tokens = self.grammar.tokenize_parallel(self.source, workers=2, chunk_size=chunk_size, overlap=overlap)
+            self.assert_same_tokens(tokens, expected)
+        tree = self.grammar.parse(self.source, tokens=tokens)
+        self.assertEqual(tree.tuple_tree(), self.grammar.parse(self.source).tuple_tree())
+
+    def test_boundary(self):
+        tokens = self.grammar.tokenize_parallel(self.source, workers=2, chunk_size=50, boundary=';\n')
+        self.assert_same_tokens(tokens, self.grammar.tokenize_array(self.source))
+
+    def test_transformed_terminals(self):
+        # the terminals are not sent to the workers, so their transforms need
+        # not be picklable
+        g = GrammarBuilder()
+        g.string = Regexp(r'"[^"]*"') >= (lambda s: s[1:-1])
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.start = repeat(g.string | g.name)
+        grammar = g(start=g.start, ignore=[g.whitespace])
+        source = 'a "b c"\n' * 200
+        tokens = grammar.tokenize_parallel(source, workers=2, chunk_size=100)
+        self.assert_same_tokens(tokens, grammar.tokenize_array(source))
+        self.assertEqual(grammar.parse(source, tokens=tokens).transform()[:2], ['a', 'b c'])
+
+    def test_error(self):
+        with self.assertRaises(TokenizeError):
+            self.grammar.tokenize_parallel(self.source + '"unterminated\n' + self.source, workers=2, chunk_size=100)
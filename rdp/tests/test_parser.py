@@ -1,17 +1,21 @@
+import io
 import unittest
 from operator import itemgetter
 
 from rdp import (GrammarBuilder, Grammar, flatten, drop, epsilon, repeat, Terminal,
-    Regexp, Parser, LeftRecursion, ParseError, Optional, Lookahead, ignore, keep)
+    Regexp, Parser, LeftRecursion, ParseError, InvalidGrammar, Optional, Lookahead, ignore, keep, Operators, prefix, infix, postfix, cut, recover)
+from rdp.ast import ErrorNode, ValueNode
+from rdp.indention import indent, NEWLINE
 from rdp.formatter import GrammarFormatter
 from rdp import builtins
 from rdp.utils import product, uncurry, const
+from rdp.memo import Memo, LRUMemo, WindowMemo
 
 
 class ParserTestCase(unittest.TestCase):
     def assert_tree_eq(self, node, spec):
         if isinstance(node, str):
-            node = self.grammar.parse(node)
+            node = self.parse(node)
         if isinstance(spec, str):
             self.assertTrue(node.token is not None, 'expected a terminal, found {0}'.format(node))
             self.assertEqual(node.token.lexeme, spec)
@@ -189,13 +193,249 @@ class LookaheadParserTest(ParserTestCase):
 
 
 class LeftRecursionTest(ParserTestCase):
+    def make_memo(self):
+        return Memo()
+
+    def parse(self, source, **kwargs):
+        return self.grammar.parse(source, memo=self.make_memo(), **kwargs)
+
     def test_direct_left_recursion_raises(self):
         g = GrammarBuilder()
-        g.foo = 'a' | g.foo + 'x'
+        g.foo = g.foo + 'x' | 'a'
         grammar = g(start=g.foo)
 
         with self.assertRaises(LeftRecursion):
-            grammar.parse('xx', detect_left_recursion=True)
+            grammar.parse('ax', detect_left_recursion=True)
+
+    def test_direct_left_recursion(self):
+        g = GrammarBuilder()
+        g.foo = g.foo + 'x' | 'a'
+        self.grammar = g(start=g.foo)
+
+        self.assert_tree_eq('a', ('foo', ['a']))
+        self.assert_tree_eq('axx', ('foo', [(None, [('foo', [(None, [('foo', ['a']), 'x'])]), 'x'])]))
+        with self.assertRaises(ParseError):
+            self.parse('xa')
+
+    def test_indirect_left_recursion(self):
+        g = GrammarBuilder()
+        g.a = g.b + 'x' | 'y'
+        g.b = g.a | 'z'
+        self.grammar = g(start=g.a)
+
+        self.assert_tree_eq('yxx', ('a', [(None, [('b', [(None, [('b', ['y']), 'x'])]), 'x'])]))
+        self.assert_tree_eq('zxx', ('a', [(None, [('b', [(None, [('b', ['z']), 'x'])]), 'x'])]))
+        with self.assertRaises(ParseError):
+            self.parse('xz')
+
+    def test_left_associative_expressions(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.expr = (g.expr + '-' + g.term >= (lambda v: v[0] - v[2])) | g.term
+        g.term = (g.term + '/' + g.number >= (lambda v: v[0] // v[2])) | g.number
+        self.grammar = g(start=g.expr)
+
+        self.assertEqual(self.parse('10-2-3').transform(), 5)
+        self.assertEqual(self.parse('100/5/2-1-3/3').transform(), 8)
+        self.assertEqual(self.parse('100/5/2-1-3/3', compact=True).transform(), 8)
+        source = '-'.join(['1'] * 5000)
+        self.assertEqual(self.parse(source).transform(), -4998)
+        self.assertEqual(self.parse('100/5/2-1-3/3', transform=True), 8)
+        self.assertEqual(self.parse(source, transform=True), -4998)
+
+
+class LRUMemoLeftRecursionTest(LeftRecursionTest):
+    def make_memo(self):
+        return LRUMemo(4)
+
+
+class WindowMemoLeftRecursionTest(LeftRecursionTest):
+    def make_memo(self):
+        return WindowMemo(4)
+
+
+class OperatorsParserTest(ParserTestCase):
+    def setUp(self):
+        super().setUp()
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.whitespace = Regexp(r'\s+')
+        g.atom = g.number | flatten(drop('(') + g.expr + drop(')'))
+        g.expr = Operators(g.atom, [
+            infix('+', 10) >= (lambda v: v[0] + v[2]),
+            infix('-', 10) >= (lambda v: v[0] - v[2]),
+            infix('*', 20) >= (lambda v: v[0] * v[2]),
+            prefix('-', 30) >= (lambda v: -v[1]),
+            infix('^', 40, right=True) >= (lambda v: v[0] ** v[2]),
+            postfix('!', 50) >= (lambda v: product(range(1, v[0] + 1))),
+        ])
+        self.grammar = g(start=g.expr, ignore=[g.whitespace])
+
+    def test_tree(self):
+        self.assert_tree_eq('1-2*3', ('expr', [
+            (None, [('atom', ['1']), '-', (None, [('atom', ['2']), '*', ('atom', ['3'])])]),
+        ]))
+        self.assert_tree_eq('-3!', ('expr', [(None, ['-', (None, [('atom', ['3']), '!'])])]))
+
+    def test_transform(self):
+        for source, value in [
+            ('42', 42),
+            ('1 - 2 - 3', -4),
+            ('2 ^ 3 ^ 2', 512),
+            ('-2 ^ 2', -4),
+            ('2 * -3! + 1', -11),
+            ('(1 + 2) * (3 - -4)', 21),
+            ('(2 ^ 3)!', 40320),
+        ]:
+            self.assertEqual(self.parse(source).transform(), value, source)
+            self.assertEqual(self.grammar.parse(source, compact=True).transform(), value, source)
+            self.assertEqual(self.grammar.parse(source, transform=True), value, source)
+
+    def test_errors(self):
+        for source in ['1 +', '-', '1 2', '(1 + 2']:
+            with self.assertRaises(ParseError):
+                self.parse(source)
+
+    def test_conflicting_operators(self):
+        for operators in [[infix('!', 10), postfix('!', 20)], [infix('+', 10), infix('+', 20)]]:
+            with self.assertRaises(InvalidGrammar):
+                Operators(Regexp(r'[0-9]+'), operators)
+
+    def test_format(self):
+        self.assertEqual(
+            GrammarFormatter()(self.grammar).splitlines()[-1],
+            "expr        ::=  atom with (infix '+' 10 / infix '-' 10 / infix '*' 20 / prefix '-' 30 / "
+            "infix '^' 40 right / postfix '!' 50)",
+        )
+
+
+class CutParserTest(ParserTestCase):
+    def build(self, commit):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.number = Regexp(r'[0-9]+')
+        g.whitespace = Regexp(r'\s+')
+        g.funcdef = 'def' + commit + g.name + '(' + ')' + ';'
+        g.constant = 'def' + g.number + ';'
+        g.assign = g.name + '=' + g.name + ';'
+        g.stmt = g.funcdef | g.constant | g.assign
+        g.module = repeat(g.stmt)
+        return g(start=g.module, ignore=[g.whitespace], literal_dispatch=True)
+
+    def test_no_backtracking_past_cut(self):
+        source = 'x = y; def 42;'
+        self.assertEqual(len(self.build(epsilon).parse(source).children), 2)
+        with self.assertRaises(ParseError) as cm:
+            self.build(cut).parse(source)
+        self.assertEqual(cm.exception.offset, 11)
+        self.assertIn('expected <name>', str(cm.exception))
+
+    def test_tree(self):
+        self.grammar = self.build(cut)
+        self.assert_tree_eq('def f(); x = y;', ('module', [
+            ('stmt', [('funcdef', ['def', 'f', '(', ')', ';'])]),
+            ('stmt', [('assign', ['x', '=', 'y', ';'])]),
+        ]))
+        self.assertIn("'def', ~, name", GrammarFormatter()(self.grammar))
+
+    def test_memo_release(self):
+        source = 'x = y; def f();' * 200
+        sizes = []
+        for commit in (epsilon, cut):
+            memo = Memo()
+            self.build(commit).parse(source, memo=memo)
+            sizes.append(len(memo))
+        self.assertGreater(sizes[0], 1000)
+        self.assertLess(sizes[1], 20)
+
+    def test_cut_scope(self):
+        # a cut only commits the innermost alternatives around it
+        g = GrammarBuilder()
+        g.name = Regexp(r'[A-Za-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.inner = 'def' + cut + g.name | 'def' + '=' | 'var' + g.name
+        g.start = g.inner + ';' | g.inner + '=' + g.name + ';'
+        grammar = g(start=g.start, ignore=[g.whitespace], literal_dispatch=True)
+        for source in ['def F;', 'def F = X;', 'var F = X;']:
+            self.assertEqual(len(grammar.parse(source).children), 1, source)
+        with self.assertRaises(ParseError) as cm:
+            grammar.parse('def =;')
+        self.assertIn('expected <name>', str(cm.exception))
+
+    def test_cut_in_lookahead(self):
+        g = GrammarBuilder()
+        g.start = Lookahead('a' + cut + 'b') + 'a' + 'b' | 'a' + 'c'
+        grammar = g(start=g.start)
+        self.assertEqual(len(grammar.parse('ab').children), 1)
+        self.assertEqual(len(grammar.parse('ac').children), 1)
+
+
+class RecoveryParserTest(ParserTestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.number = Regexp(r'[0-9]+')
+        g.whitespace = Regexp(r'\s+')
+        g.assign = g.name + '=' + (g.name | g.number) + ';'
+        g.block = '{' + g.stmts + '}'
+        g.stmts = repeat(recover(g.assign | g.block, ';'))
+        self.grammar = g(start=g.stmts, ignore=[g.whitespace])
+
+    def test_no_errors(self):
+        node, errors = self.grammar.parse_recovering('a = 1; { b = c; }')
+        self.assertEqual(errors, [])
+        self.assertEqual(len(node.children), 2)
+
+    def test_multiple_errors(self):
+        for compact in (False, True):
+            node, errors = self.grammar.parse_recovering('a = 1; b = = 2; c 3; d = 4;', compact=compact)
+            self.assertEqual([error.offset for error in errors], [11, 18])
+            self.assertIn('expected <name> or <number>', str(errors[0]))
+            self.assertEqual([type(child) for child in node.children], [type(node), ErrorNode, ErrorNode, type(node)])
+            self.assertIs(node.children[1].error, errors[0])
+            self.assertEqual([token.lexeme for token in node.children[2].tokens], ['3', ';'])
+
+    def test_nested_errors(self):
+        node, errors = self.grammar.parse_recovering('{ a = ; } x = 1; = y = 2; { b c;')
+        self.assertEqual([error.offset for error in errors], [6, 17, 30, 32])
+        self.assertEqual(len(node.children), 4)
+        self.assertIsInstance(node.children[3], ErrorNode)
+
+    def test_legitimate_end(self):
+        # '}' may follow a statement, so a stray one ends the statements
+        node, errors = self.grammar.parse_recovering('a = 1; } b = 2;')
+        self.assertEqual([error.offset for error in errors], [7])
+        self.assertEqual(len(node.children), 1)
+        with self.assertRaises(ParseError):
+            self.grammar.parse('a = 1; b = = 2;')
+
+    def test_transform(self):
+        node, errors = self.grammar.parse_recovering('a = 1; b = ; c = 2;')
+        values = node.transform()
+        self.assertIsInstance(values[1], ErrorNode)
+
+    def test_cut(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.funcdef = 'def' + cut + g.name + '(' + ')' + ';'
+        g.call = g.name + '(' + ')' + ';'
+        g.module = repeat(recover(g.funcdef | g.call, ';'))
+        grammar = g(start=g.module, ignore=[g.whitespace], literal_dispatch=True)
+        node, errors = grammar.parse_recovering('def f(); def (); g(); def h(;')
+        self.assertEqual([error.offset for error in errors], [13, 28])
+        self.assertEqual(len(node.children), 4)
+
+    def test_indention(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.line = g.name + '=' + g.name
+        g.lines = repeat(recover(g.line, NEWLINE), separator=NEWLINE)
+        grammar = g(start=g.lines, tokenize=[indent(yield_newlines=True), ignore(g.whitespace)])
+        node, errors = grammar.parse_recovering('a = b\nc = = d\ne = f\ng h\ni = j')
+        self.assertEqual([error.offset for error in errors], [10, 22])
+        self.assertEqual(len([child for child in node.children if isinstance(child, ErrorNode)]), 2)
 
 
 class JsonParserTest(ParserTestCase):
@@ -263,6 +503,43 @@ class TransformJsonParserTest(ParserTestCase):
             [0, 1, 42, 3.14, -1, -23., 0.001, 1e10, 13.5e-12]
         )
 
+    def test_eager_transform(self):
+        source = '{"foo": [1, 2, {"bar": null}], "baz": [true, false, "x"], "": {}}'
+        self.assertEqual(self.grammar.parse(source, transform=True), self.grammar.parse(source).transform())
+        self.assertEqual(self.grammar.parse('42', transform=True), 42.0)
+
+
+class EagerTransformTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.pair = '(' + g.number + ',' + g.number + ')' >= (lambda v: (v[1], v[3]))
+        g.item = flatten(g.pair | g.number)
+        g.items = repeat(g.item, separator=drop(','), min_matches=1) >= list
+        self.grammar = g(start=g.items)
+
+    def test_transform(self):
+        source = '(1,2),3,(4,5)'
+        self.assertEqual(self.grammar.parse(source).transform(), [(1, 2), 3, (4, 5)])
+        self.assertEqual(self.grammar.parse(source, transform=True), [(1, 2), 3, (4, 5)])
+
+    def test_alias(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+') >= int
+        g.pair = '(' + g.number + ',' + g.number + ')' >= (lambda v: (v[1], v[3]))
+        g.swapped = g.pair >= (lambda v: v[::-1])
+        g.items = repeat(g.swapped, separator=drop(','), min_matches=1) >= list
+        grammar = g(start=g.items)
+        self.assertEqual(grammar.parse('(1,2),(3,4)').transform(), [(2, 1), (4, 3)])
+        self.assertEqual(grammar.parse('(1,2),(3,4)', transform=True), [(2, 1), (4, 3)])
+
+    def test_memo_holds_values(self):
+        parser = Parser(self.grammar, '(1,2),3', transform=True)
+        self.assertEqual(parser.run(), [(1, 2), 3])
+        values = [node.value for node, end in parser._cache.values() if isinstance(node, ValueNode)]
+        self.assertIn((1, 2), values)
+        self.assertIn([(1, 2), 3], values)
+
 
 class CalculatorTest(unittest.TestCase):
     def setUp(self):
@@ -291,6 +568,34 @@ class CalculatorTest(unittest.TestCase):
         self.assertEqual(self.grammar.parse("6 + -6 * -6").transform(), 42)
 
 
+class CompactTokenParserTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'-?[0-9]+(?:\.[0-9]+)?') >= float
+        g.string = Regexp(r'"[^"]*"') >= (lambda s: s[1:-1])
+        g.array = '[' + flatten(repeat(g.value, separator=drop(','))) + ']' >= list
+        g.pair = g.string + drop(':') + g.value >= tuple
+        g.object_ = '{' + flatten(repeat(g.pair, separator=drop(','))) + '}' >= dict
+        g.value = flatten(g.number | g.string | g.array | g.object_)
+        g.whitespace = Regexp(r'\s+')
+        self.grammar = g(start=g.value, tokenize=[ignore(g.whitespace)], drop_terminals=True)
+
+    def test_same_tree(self):
+        source = '{"a": [1, 2.5, {"b": "c"}], "d": [], "e": -3}'
+        tree = self.grammar.parse(source, compact=True)
+        self.assertEqual(tree.tuple_tree(), self.grammar.parse(source).tuple_tree())
+        self.assertEqual(tree.transform(), {'a': [1, 2.5, {'b': 'c'}], 'd': [], 'e': -3})
+
+    def test_errors(self):
+        for source in ('[1, 2', '[1 2]', '[1] 2', '{"a" 1}'):
+            with self.assertRaises(ParseError) as expected:
+                self.grammar.parse(source)
+            with self.assertRaises(ParseError) as cm:
+                self.grammar.parse(source, compact=True)
+            self.assertEqual(str(cm.exception), str(expected.exception))
+            self.assertEqual(cm.exception.offset, expected.exception.offset)
+
+
 class TestErrorMessages(unittest.TestCase):
     def setUp(self):
         g = GrammarBuilder()
@@ -323,3 +628,125 @@ class TestErrorMessages(unittest.TestCase):
         with self.assertRaises(ParseError):
             self.grammar.parse(source)
 
+    def test_farthest_failure(self):
+        with self.assertRaises(ParseError) as cm:
+            self.grammar.parse('A C')
+        self.assertEqual(cm.exception.offset, 2)
+        self.assertIn("expected <ab>", str(cm.exception))
+
+    def test_end_of_file(self):
+        with self.assertRaises(ParseError) as cm:
+            self.grammar.parse('A ')
+        self.assertEqual(cm.exception.offset, 1)
+        self.assertIn("unexpected end of file", str(cm.exception))
+
+
+
+class PredictiveOneOfParserTest(ParserTestCase):
+    def setUp(self):
+        super().setUp()
+        g = GrammarBuilder()
+        g.x = Terminal('x')
+        g.xy = Terminal('x') + 'y'
+        g.z = Terminal('z')
+        g.alt = g.xy | g.x | g.z | g.opt
+        g.opt = Optional('w')
+        g.start = flatten(repeat(flatten(g.alt + drop(';')))) + 'end'
+        self.grammar = g(start=g.start)
+
+    def test_overlapping_alternatives(self):
+        self.assert_tree_eq('x;xy;end', ('start', [
+            ('alt', ['x']),
+            ('alt', [('xy', ['x', 'y'])]),
+            'end',
+        ]))
+
+    def test_nullable_fallback(self):
+        self.assert_tree_eq('z;w;;end', ('start', [
+            ('alt', ['z']),
+            ('alt', ['w']),
+            ('alt', []),
+            'end',
+        ]))
+
+    def test_unpredicted_token(self):
+        with self.assertRaises(ParseError):
+            self.parse('x;y;end')
+
+
+class TokenBufferTest(unittest.TestCase):
+    class RecordingParser(Parser):
+        max_buffer = 0
+
+        def read(self):
+            self.max_buffer = max(self.max_buffer, len(self.tokens.buffer))
+            return super().read()
+
+    def setUp(self):
+        g = GrammarBuilder()
+        g.word = Regexp(r'[a-z]+')
+        g.number = Regexp(r'[0-9]+')
+        g.item = g.word + '=' + g.number + ';' | g.word + '=' + g.word + ';'
+        g.items = repeat(g.item)
+        g.whitespace = Regexp(r'\s+')
+        self.grammar = g(start=g.items, tokenize=[ignore(g.whitespace)])
+        self.source = ' '.join('a=b; c=1;' for i in range(500))
+
+    def test_flat_input_releases_tokens(self):
+        parser = self.RecordingParser(self.grammar, self.source, buffer_size=16)
+        node = parser.run()
+        self.assertEqual(len(node), 1000)
+        self.assertLess(parser.max_buffer, 40)
+
+    def test_unbounded_buffer(self):
+        parser = self.RecordingParser(self.grammar, self.source, buffer_size=None)
+        node = parser.run()
+        self.assertEqual(parser.max_buffer, 4000)
+
+    def test_error_after_release(self):
+        with self.assertRaises(ParseError) as cm:
+            Parser(self.grammar, self.source + ' x=;', buffer_size=16).run()
+        self.assertEqual(cm.exception.offset, len(self.source) + 3)
+
+
+    def test_lookahead_longer_than_buffer(self):
+        g = GrammarBuilder()
+        g.word = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.words = repeat(g.word)
+        g.start = Lookahead(g.words) + g.words
+        grammar = g(start=g.start, tokenize=[ignore(g.whitespace)])
+        source = ' '.join(['ab'] * 3000)
+        self.assertEqual(len(grammar.parse(source).children[0]), 3000)
+        parser = self.RecordingParser(grammar, source, buffer_size=16)
+        self.assertEqual(len(parser.run().children[0]), 3000)
+
+
+class ParseIterTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.key = Regexp(r'[a-z]+')
+        g.value = Regexp(r'[0-9]+') >= int
+        g.record = g.key + drop('=') + g.value + drop(';') >= tuple
+        g.records = repeat(g.record)
+        g.whitespace = Regexp(r'\s+')
+        self.grammar = g(start=g.records, tokenize=[ignore(g.whitespace)])
+        self.record = g.record
+
+    def test_parse_iter(self):
+        source = io.StringIO(''.join('key{0}={1};\n'.format('x' * (i % 3), i) for i in range(100)))
+        items = self.grammar.parse_iter(source, item=self.record)
+        self.assertEqual(next(items).transform(), ('key', 0))
+        self.assertEqual([item.transform()[1] for item in items], list(range(1, 100)))
+
+    def test_chunks(self):
+        chunks = ['a=1', ';b', '=22;', ' c', '=3', ';']
+        items = [item.transform() for item in self.grammar.parse_iter(chunks, item=self.record)]
+        self.assertEqual(items, [('a', 1), ('b', 22), ('c', 3)])
+
+    def test_error(self):
+        items = self.grammar.parse_iter('a=1; b=; c=3;', item=self.record)
+        self.assertEqual(next(items).transform(), ('a', 1))
+        with self.assertRaises(ParseError) as cm:
+            next(items)
+        self.assertEqual(cm.exception.offset, 7)
@@ -0,0 +1,56 @@
+import unittest
+
+from rdp import GrammarBuilder, Regexp, ParseError
+from rdp.memo import LRUMemo
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.call = g.name + '(' + ')'
+        g.index = g.name + '[' + ']'
+        g.expr = g.call | g.index | g.name
+        self.grammar = g(start=g.expr)
+        self.g = g
+
+    def test_counters(self):
+        node, profile = self.grammar.parse_profiled('foo[]')
+        self.assertEqual(node.tuple_tree(), self.grammar.parse('foo[]').tuple_tree())
+        rules = {rule.name: rule for rule in profile.report()}
+
+        call = rules['call']
+        self.assertEqual((call.invocations, call.successes, call.failures), (1, 0, 1))
+        # `name` was read before `(` failed to match
+        self.assertEqual(call.backtracked_tokens, 1)
+
+        index = rules['index']
+        self.assertEqual((index.invocations, index.successes, index.failures), (1, 1, 0))
+        self.assertEqual(index.backtracked_tokens, 0)
+
+        name = rules['name']
+        self.assertEqual(name.invocations, 1)
+        self.assertEqual((name.memo_hits, name.memo_misses), (1, 1))
+        self.assertGreater(rules['expr'].time, 0)
+
+    def test_report(self):
+        node, profile = self.grammar.parse_profiled('foo', compact=True)
+        report = profile.report('failures')
+        self.assertEqual({rule.name for rule in report[:4]}, {'call', 'index', "'('", "'['"})
+        self.assertEqual([rule.failures for rule in report], [1, 1, 1, 1, 0, 0])
+        self.assertEqual(profile.report()[0].name, 'expr')
+
+        lines = profile.format(limit=3).splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0].split(), ['symbol'] + profile.columns)
+        self.assertTrue(lines[1].startswith('expr '))
+
+    def test_memo(self):
+        memo = LRUMemo(10)
+        node, profile = self.grammar.parse_profiled('foo()', memo=memo)
+        self.assertEqual(len(memo), 5)
+        self.assertEqual(profile.rule(self.g.call).successes, 1)
+
+    def test_error(self):
+        with self.assertRaises(ParseError):
+            self.grammar.parse_profiled('foo(')
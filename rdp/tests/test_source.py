@@ -0,0 +1,77 @@
+import pickle
+import unittest
+
+from rdp import GrammarBuilder, Regexp, ParseError, repeat
+from rdp.source import Source, LineNumberTable
+
+
+class LineNumberTableTest(unittest.TestCase):
+    def setUp(self):
+        self.source = 'ab\ncde\n\nf'
+        self.table = LineNumberTable(self.source)
+
+    def expected_position(self, offset):
+        return self.source.count('\n', 0, offset) + 1, offset - self.source.rfind('\n', 0, offset)
+
+    def test_position(self):
+        for offset in range(len(self.source) + 1):
+            self.assertEqual(self.table.position(offset), self.expected_position(offset), offset)
+        for offset in (-1, len(self.source) + 1):
+            with self.assertRaises(IndexError):
+                self.table.position(offset)
+
+    def test_get_line(self):
+        self.assertEqual(self.table.get_line(0), (0, range(0, 3)))
+        self.assertEqual(self.table.get_line(5), (1, range(3, 7)))
+        self.assertEqual(self.table.get_line(7), (2, range(7, 8)))
+        self.assertEqual(self.table.get_line(8), (3, range(8, 9)))
+        self.assertEqual(self.table[4], 2)
+        self.assertEqual(len(self.table), 4)
+
+    def test_positions(self):
+        offsets = [9, 0, 3, 7, 8, 2]
+        lines, columns = self.table.positions(offsets)
+        self.assertEqual(list(zip(lines, columns)), [self.expected_position(offset) for offset in offsets])
+        self.assertEqual([list(column) for column in self.table.positions([])], [[], []])
+
+
+class SourceTest(unittest.TestCase):
+    def setUp(self):
+        g = GrammarBuilder()
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.call = g.name + '(' + repeat(g.name, separator=',') + ')'
+        g.calls = repeat(g.call)
+        self.grammar = g(start=g.calls, ignore=[g.whitespace])
+        self.source = Source('foo(a, b)\n  bar(\n    c)\n')
+
+    def test_parse(self):
+        node = self.grammar.parse(self.source)
+        self.assertEqual(node.position, (1, 1))
+        bar = node.children[1]
+        self.assertEqual((bar.line, bar.column), (2, 3))
+        self.assertEqual(bar.children[2].position, (3, 5))
+        compact = self.grammar.parse(self.source, compact=True)
+        self.assertEqual(compact.children[1].position, (2, 3))
+        self.assertIsNone(self.grammar.parse(str(self.source)).line)
+
+    def test_token_positions(self):
+        tokens = list(self.grammar.tokenize(str(self.source)))
+        lines, columns = self.source.token_positions(tokens)
+        self.assertEqual(list(lines), [1, 1, 1, 1, 1, 1, 2, 2, 3, 3])
+        self.assertEqual(list(columns), [1, 4, 5, 6, 8, 9, 3, 6, 5, 6])
+        array_tokens = self.grammar.tokenize_array(str(self.source))
+        self.assertEqual(self.source.token_positions(array_tokens), (lines, columns))
+
+    def test_parse_error(self):
+        for source in ['foo(a)\nbar(b c)', Source('foo(a)\nbar(b c)')]:
+            with self.assertRaises(ParseError) as cm:
+                self.grammar.parse(source)
+            self.assertEqual(cm.exception.position, (2, 7))
+            self.assertEqual(cm.exception.token.lexeme, 'c')
+            error = pickle.loads(pickle.dumps(cm.exception))
+            self.assertEqual((error.line, error.column), (2, 7))
+        with self.assertRaises(ParseError) as cm:
+            self.grammar.parse('foo(a)\nbar(')
+        self.assertEqual(cm.exception.position, (2, 5))
+        self.assertIsNone(ParseError('test', 0).line)
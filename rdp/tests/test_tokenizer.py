@@ -1,8 +1,10 @@
 import unittest
 import textwrap
+import io
 import re
 
 from rdp import GrammarBuilder, flatten, drop, epsilon, repeat, Terminal, Regexp, Parser, epsilon, Optional, ignore
+from rdp.exceptions import TokenizeError
 from rdp.formatter import GrammarFormatter
 from rdp import builtins
 from rdp.indention import indent, INDENT, DEDENT
@@ -66,3 +68,122 @@ class TokenizerTest(unittest.TestCase):
             ]
         )
 
+
+    def test_stream_tokenizer(self):
+        g = GrammarBuilder()
+        g.string = builtins.double_quoted_string
+        g.number = Regexp(r'[0-9]+')
+        g.whitespace = Regexp(r'\s+')
+        g.start = repeat(g.string | g.number | '==' | '=')
+        grammar = g(start=g.start)
+
+        source = '"foo bar" 123 == = "a=b" ' * 50
+        expected = [(t.symbol, t.lexeme, t.start) for t in grammar.tokenize(source)]
+        for size in (1, 2, 3, 7, 64):
+            chunks = [source[i:i + size] for i in range(0, len(source), size)]
+            tokens = grammar.tokenizer.tokenize_stream(chunks, lookahead=10)
+            self.assertEqual([(t.symbol, t.lexeme, t.start) for t in tokens], expected)
+        tokens = grammar.tokenize(io.StringIO(source))
+        self.assertEqual([(t.symbol, t.lexeme, t.start) for t in tokens], expected)
+
+    def test_stream_junk(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.whitespace = Regexp(r'\s+')
+        grammar = g(start=repeat(g.number))
+        read = []
+
+        def chunks():
+            yield '1 2 ?? 3 '
+            for i in range(10000):
+                read.append(i)
+                yield '4 5 6 '
+
+        with self.assertRaises(TokenizeError):
+            list(grammar.tokenizer.tokenize_stream(chunks(), lookahead=16))
+        # the junk is found without reading the rest of the stream
+        self.assertLess(len(read), 5)
+        with self.assertRaises(TokenizeError):
+            list(grammar.tokenizer.tokenize_stream(['1 2 ??'], lookahead=16))
+
+    def test_token_array(self):
+        g = GrammarBuilder()
+        g.number = Regexp(r'[0-9]+')
+        g.name = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.start = repeat(g.number | g.name | ',')
+        grammar = g(start=g.start, tokenize=[ignore(g.whitespace)])
+
+        source = 'abc, 12,x 3'
+        tokens = grammar.tokenize_array(source)
+        expected = [(t.symbol, t.lexeme, t.start) for t in grammar.tokenize(source)]
+        self.assertEqual(len(tokens), 6)
+        self.assertEqual([(t.symbol, t.lexeme, t.start) for t in tokens], expected)
+        self.assertEqual(tokens.lexeme(1), ',')
+        self.assertEqual(list(tokens.kinds), [grammar.terminals.index(t[0]) for t in expected] + [-1])
+
+    def test_token_array_from_transformed_tokens(self):
+        g = GrammarBuilder()
+        g.whitespace = Regexp(r'\s+')
+        g.label = Regexp(r'\w+')
+        g.expr = g.label + Optional(INDENT + repeat(g.expr) + DEDENT)
+        grammar = g(start=g.expr, tokenize=[indent(), ignore(g.whitespace)])
+
+        source = 'foo\n    bar\n    baz'
+        tokens = grammar.tokenize_array(source)
+        self.assertEqual(
+            [(t.symbol, t.lexeme, t.start) for t in tokens],
+            [(t.symbol, t.lexeme, t.start) for t in grammar.tokenize(source)],
+        )
+
+    def test_literal_dispatch(self):
+        g = GrammarBuilder()
+        g.identifier = Regexp(r'[a-z]+')
+        g.whitespace = Regexp(r'\s+')
+        g.start = repeat(g.identifier | '=' | '==' | '=>' | 'if' | 'in' | 'int')
+        source = 'if iffy == in int inter=>x=y'
+
+        grammar = g(start=g.start, tokenize=[ignore(g.whitespace)], literal_dispatch=True)
+        self.assertEqual(
+            [(t.symbol.name or t.lexeme, t.lexeme) for t in grammar.tokenize(source)], [
+                ('if', 'if'), ('identifier', 'iffy'), ('==', '=='), ('in', 'in'), ('int', 'int'),
+                ('identifier', 'inter'), ('=>', '=>'), ('identifier', 'x'), ('=', '='), ('identifier', 'y'),
+            ]
+        )
+        self.assertEqual(
+            [t.lexeme for t in grammar.tokenize_array(source)],
+            [t.lexeme for t in grammar.tokenize(source)],
+        )
+
+        # by default, the first pattern in grammar order wins
+        grammar = g(start=g.start, tokenize=[ignore(g.whitespace)])
+        self.assertEqual([t.lexeme for t in grammar.tokenize('== if')], ['=', '=', 'if'])
+        self.assertEqual([t.symbol for t in grammar.tokenize('if')], [g.identifier])
+
+    def test_ignored_terminals(self):
+        g = GrammarBuilder()
+        g.comment = Regexp(r'#[^\n]*')
+        g.whitespace = Regexp(r'\s+')
+        g.number = Regexp(r'[0-9]+')
+        g.start = repeat(g.number)
+        source = '1 2 # three\n  4'
+
+        grammar = g(start=g.start, ignore=[g.whitespace, g.comment])
+        self.assertEqual(grammar.token_transforms, [])
+        self.assertEqual([(t.lexeme, t.start) for t in grammar.tokenizer.tokenize(source)], [('1', 0), ('2', 2), ('4', 14)])
+        self.assertEqual([t.lexeme for t in grammar.tokenize_array(source)], ['1', '2', '4'])
+        chunks = [source[i:i + 3] for i in range(0, len(source), 3)]
+        self.assertEqual([t.lexeme for t in grammar.tokenizer.tokenize_stream(chunks, lookahead=2)], ['1', '2', '4'])
+        self.assertEqual(grammar.parse(source).tuple_tree(), ('start', [('number', '1'), ('number', '2'), ('number', '4')]))
+
+        # leading ignore() transforms are fused into the tokenizer
+        grammar = g(start=g.start, tokenize=[ignore(g.whitespace), ignore(g.comment)])
+        self.assertEqual(grammar.token_transforms, [])
+        self.assertEqual([t.lexeme for t in grammar.tokenizer.tokenize(source)], ['1', '2', '4'])
+
+        grammar = g(start=g.start, tokenize=[indent(), ignore(g.whitespace, g.comment)])
+        self.assertEqual(len(grammar.token_transforms), 2)
+        self.assertEqual(
+            [t.lexeme or t.symbol.name for t in grammar.tokenize('1\n  2')],
+            ['1', 'INDENT', '2', 'DEDENT'],
+        )
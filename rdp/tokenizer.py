@@ -1,9 +1,26 @@
 import re
+from array import array
 
 from rdp.exceptions import TokenizeError
+from rdp.source import Positioned
 
 
-class Token:
+def terminal_kinds(terminals):
+    """
+    Maps each terminal to its kind, the index of the first equal terminal in
+    `terminals`. The mapping belongs to whoever owns `terminals`, as the same
+    terminal objects may be shared by several grammars.
+    """
+    kinds = {}
+    for kind, terminal in enumerate(terminals):
+        kinds.setdefault(terminal, kind)
+    return kinds
+
+
+class Token(Positioned):
+    # the `Source` of tokens parsed from one, see `position`
+    source = None
+
     def __init__(self, symbol, lexeme, start):
         self.symbol = symbol
         self.lexeme = lexeme
@@ -13,6 +30,16 @@ class Token:
     def end(self):
         return self.start + len(self.lexeme)
 
+    @property
+    def position(self):
+        """
+        The `(line, column)` of the start of the token, or None if it does not
+        come from a `Source`.
+        """
+        if self.source is None:
+            return None
+        return self.source.position(self.start)
+
     def __len__(self):
         return len(self.lexeme)
 
@@ -32,41 +59,258 @@ class Token:
 
     def split(self, offset):
         a, b = self.lexeme[:offset], self.lexeme[offset:]
-        yield self.__class__(self.symbol, a, self.start)
-        yield self.__class__(self.symbol, b, self.start + offset)
+        for lexeme, start in ((a, self.start), (b, self.start + offset)):
+            token = self.__class__(self.symbol, lexeme, start)
+            token.source = self.source
+            yield token
+
+
+class TokenArray(object):
+    """
+    A tokenized `source` stored as parallel arrays: the kind of each token,
+    an index into `terminals`, and its start and end offset. `Token` objects
+    and their lexemes are only created when a token is accessed.
+
+    `kinds` has an extra `-1` entry after the last token, so the kind at any
+    offset up to `len(self)` can be compared without a bounds check.
+    """
+    # the `Source` the created tokens get, see `Token.position`
+    token_source = None
+
+    def __init__(self, source, terminals, kinds, starts, ends):
+        self.source = source
+        self.terminals = terminals
+        self.kinds = kinds
+        self.starts = starts
+        self.ends = ends
+
+    @classmethod
+    def from_tokens(cls, source, terminals, tokens):
+        """
+        Packs `tokens` whose lexemes are slices of `source`, or empty.
+        """
+        kind_of = terminal_kinds(terminals)
+        kinds, starts, ends = array('i'), array('i'), array('i')
+        for token in tokens:
+            kinds.append(kind_of[token.symbol])
+            starts.append(token.start)
+            ends.append(token.end)
+        kinds.append(-1)
+        return cls(source, terminals, kinds, starts, ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        token = Token(self.terminals[self.kinds[index]], self.source[start:self.ends[index]], start)
+        if self.token_source is not None:
+            token.source = self.token_source
+        return token
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def lexeme(self, index):
+        return self.source[self.starts[index]:self.ends[index]]
+
+
+class LiteralDispatch(object):
+    """
+    A stand-in for the compiled alternation of all terminal patterns. Plain
+    literals are looked up by their first character and tried longest first,
+    the remaining patterns are matched by `regexp`. The longer match wins,
+    a literal wins a tie, so keywords take precedence over identifiers.
+    """
+    def __init__(self, literals, regexp):
+        by_first_char = {}
+        for group, lexeme in sorted(literals, key=lambda literal: -len(literal[1])):
+            by_first_char.setdefault(lexeme[0], []).append('(?P<{0}>{1})'.format(group, re.escape(lexeme)))
+        self.literals = {char: re.compile('|'.join(patterns)) for char, patterns in by_first_char.items()}
+        self.regexp = regexp
+
+    def match(self, source, pos):
+        literal_re = self.literals.get(source[pos:pos + 1])
+        literal = literal_re.match(source, pos) if literal_re is not None else None
+        match = self.regexp.match(source, pos) if self.regexp is not None else None
+        if match is None or literal is not None and literal.end() >= match.end():
+            return literal
+        return match
+
+
+def compile_patterns(pattern, literals=None):
+    """
+    Compiles the alternation `pattern` of all terminal patterns, or a
+    `LiteralDispatch` if `literals` is a list of `(group, lexeme)` pairs.
+    """
+    regexp = re.compile(pattern, re.MULTILINE) if pattern else None
+    if literals is not None:
+        return LiteralDispatch(literals, regexp)
+    return regexp
+
+
+def scan(match, group_kinds, source, pos, stop, columns, base=0, final=True):
+    """
+    The loop of `Tokenizer.scan()`, with `match` the match method of the
+    compiled patterns and `group_kinds` mapping the groups of the terminals
+    that become tokens to their kinds.
+    """
+    kinds, starts, ends = columns
+    source_len = len(source)
+    while pos < stop:
+        m = match(source, pos)
+        if m is None or not final and m.end() == source_len:
+            if final:
+                raise TokenizeError('unexpected junk: {0}'.format(
+                    repr(source[pos:pos + 10]),
+                ))
+            break
+        end = m.end()
+        kind = group_kinds.get(m.lastgroup)
+        if kind is not None:
+            kinds.append(kind)
+            starts.append(base + pos)
+            ends.append(base + end)
+        pos = end
+    return pos
 
 
 class Tokenizer(object):
-    def __init__(self, terminals):
+    def __init__(self, terminals, literal_dispatch=False, ignore=()):
         self.terminals = {}
+        self.symbols = list(terminals)
+        self.kinds = {}
+        # groups of terminals that are matched but never become tokens
+        self.ignored = set()
         patterns = []
-        for index, terminal in enumerate(terminals):
+        literals = []
+        for index, terminal in enumerate(self.symbols):
             if terminal.pattern is None:
                 continue
             group = '_t{0}'.format(index)
             self.terminals[group] = terminal
-            patterns.append('(?P<{0}>{1})'.format(group, terminal.pattern))
+            self.kinds[group] = index
+            if terminal in ignore:
+                self.ignored.add(group)
+            if literal_dispatch and terminal.pattern == re.escape(terminal.lexeme):
+                literals.append((group, terminal.lexeme))
+            else:
+                patterns.append('(?P<{0}>{1})'.format(group, terminal.pattern))
 
-        if not patterns:
+        if not patterns and not literals:
             raise TypeError("tokenizer needs at least one terminal symbol")
 
-        self._re = re.compile('|'.join(patterns), re.MULTILINE)
+        # the sources of the patterns, which can be compiled again without the
+        # terminals, see `rdp.parallel.tokenize()`
+        self.pattern = '|'.join(patterns)
+        self.literals = literals if literal_dispatch else None
+        self._re = compile_patterns(self.pattern, self.literals)
 
     def tokenize(self, source):
+        if not isinstance(source, str):
+            return self.tokenize_stream(source)
+        return self.tokenize_string(source)
+
+    def tokenize_string(self, source, pos=0):
+        ignored = self.ignored
         source_len = len(source)
-        pos = 0
         while pos < source_len:
             match = self._re.match(source, pos)
             if match is None:
                 raise TokenizeError('unexpected junk: {0}'.format(
                     repr(source[pos:pos + 10]),
                 ))
-            symbol = self.terminals[match.lastgroup]
+            group = match.lastgroup
+            if group in ignored:
+                pos = match.end()
+                continue
             lexeme = match.group(0)
-            start, end = match.span()
             yield Token(
-                symbol=symbol,
+                symbol=self.terminals[group],
                 lexeme=lexeme,
                 start=pos,
             )
             pos += len(lexeme)
+
+    def tokenize_array(self, source, ignore=()):
+        """
+        Tokenizes the string `source` into a `TokenArray`, leaving out tokens
+        of ignored terminals and of the terminals in `ignore`.
+        """
+        kinds, starts, ends = array('i'), array('i'), array('i')
+        self.scan(source, 0, len(source), (kinds, starts, ends), ignore=ignore)
+        kinds.append(-1)
+        return TokenArray(source, self.symbols, kinds, starts, ends)
+
+    def scan(self, source, pos, stop, columns, base=0, final=True, ignore=()):
+        """
+        Appends the kinds, starts and ends of the tokens in `source` from
+        `pos` up to the first token that starts at or after `stop` to the
+        `columns` arrays, with `base` added to the offsets. Returns the
+        position where scanning stopped.
+
+        If `final` is false, `source` is a prefix of the input: scanning stops
+        early at a token that does not match or reaches the end of `source`,
+        as it might match differently with more input.
+        """
+        return scan(self._re.match, self.group_kinds(ignore), source, pos, stop, columns, base=base, final=final)
+
+    def group_kinds(self, ignore=()):
+        """
+        Maps the groups of the terminals that become tokens, except for the
+        ones in `ignore`, to their kinds.
+        """
+        return {
+            group: kind for group, kind in self.kinds.items()
+            if group not in self.ignored and self.terminals[group] not in ignore
+        }
+
+    def tokenize_stream(self, source, chunk_size=65536, lookahead=1024):
+        """
+        Tokenizes a file-like object or an iterable of strings without reading
+        it into memory as a whole. A token is only matched when at least
+        `lookahead` characters are buffered after its start (or the input is
+        exhausted). Matches that reach the end of the buffer are retried with
+        more input, so tokens may span chunk boundaries. If nothing matches
+        there, junk is reported right away instead of reading on to the end,
+        so `lookahead` must cover the longest text a pattern needs to see
+        before it matches, e.g. of a string literal.
+        """
+        if hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunk_size), '')
+        else:
+            chunks = iter(source)
+        buffer = ''
+        base = 0
+        pos = 0
+        eof = False
+        while True:
+            if eof or len(buffer) - pos >= lookahead:
+                if pos == len(buffer):
+                    break
+                match = self._re.match(buffer, pos)
+                if match is None:
+                    raise TokenizeError('unexpected junk: {0}'.format(
+                        repr(buffer[pos:pos + 10]),
+                    ))
+                # a token may still match more with the next chunk
+                if eof or match.end() < len(buffer):
+                    if match.lastgroup in self.ignored:
+                        pos = match.end()
+                        continue
+                    lexeme = match.group(0)
+                    yield Token(
+                        symbol=self.terminals[match.lastgroup],
+                        lexeme=lexeme,
+                        start=base + pos,
+                    )
+                    pos += len(lexeme)
+                    continue
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buffer = buffer[pos:] + chunk
+                base += pos
+                pos = 0
@@ -1,25 +1,51 @@
 import functools
+import importlib
 import operator
 
 
+# uncurry(), chain() and const() return partials of module-level functions
+# rather than closures, so that grammars using them can be pickled
+
+
+def identity(x):
+    return x
+
+
 def product(factors):
     return functools.reduce(operator.__mul__, factors, 1)
 
 
+def apply_uncurried(func, seq):
+    return func(*seq)
+
+
 def uncurry(func):
-    @functools.wraps(func)
-    def uncurried(seq):
-        return func(*seq)
+    uncurried = functools.partial(apply_uncurried, func)
+    functools.update_wrapper(uncurried, func)
     return uncurried
 
 
+def compose(f, g, arg):
+    return f(g(arg))
+
+
 def chain(f, g):
-    def chained(arg):
-        return f(g(arg))
-    return chained
+    return functools.partial(compose, f, g)
+
+
+def constant(value, *args, **kwargs):
+    return value
 
 
 def const(value):
-    def _const(*args, **kwargs):
-        return value
-    return _const
+    return functools.partial(constant, value)
+
+
+def load_grammar(reference):
+    module_name, _, attr = reference.partition(':')
+    if not attr:
+        raise ValueError("grammar reference must look like 'package.module:name', got {0!r}".format(reference))
+    grammar = importlib.import_module(module_name)
+    for name in attr.split('.'):
+        grammar = getattr(grammar, name)
+    return grammar
@@ -9,7 +9,12 @@ setup(
     author='Johannes Dollinger',
     author_email='emulbreh@googlemail.com',
     url='http://github.com/emulbreh/rdp',
-    packages=['rdp'],
+    packages=['rdp', 'rdp.benchmarks'],
+    entry_points={
+        'console_scripts': [
+            'rdp-compile = rdp.compiler:main',
+        ],
+    },
     classifiers = [
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",